@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+'''
+Dictionary of the AS paths observed in an experiment.
+
+Each distinct AS path (as received, a string such as '3333 3333 1103 12654')
+gets an integer id, and it is parsed only once. For each path id:
+- its ASes, in a flat integer array 'ases': the ASes of path i are
+  ases[offsets[i]:offsets[i+1]]
+- noprep_ids: id of the path without prepending (ASes repeated later in the
+  path are removed, as in as_path_remove_prepending()); two paths have
+  the same noprep_id if they are equal once prepending is removed
+- distinct_counts: number of different ASes of the path
+
+Then distinct-path counts, distinct-AS counts, prepending removal and path
+lengths are computed with integer arrays (see update_df2extremes() in
+downloaded2per_path_event.py).
+
+The dictionary of each collector is kept between runs in
+'as_path_dictionary/COLLECTOR.npz', so that paths repeated across events
+(most beacon paths) are parsed once per experiment. The scripts that add 
+paths (downloaded2per_path_event.py, downloaded2path_sequence_index.py) 
+lock it ('COLLECTOR.npz.lock') from read_as_path_dictionary() to 
+write_as_path_dictionary(), so runs for the same collector (e.g., 
+started by execute_for_each_collector.sh) wait for each other instead 
+of losing the paths (and ids) added by the other one.
+
+Shows the size of the dictionary of a collector:
+    ./as_path_dictionary.py 20181001_30d rrc00
+'''
+
+from argparse import ArgumentParser
+import fcntl
+import os
+from typing import IO, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from filenames_directories import as_path_dictionary_filename
+
+
+def parse_as_path(as_path: str) -> List[int]:
+    return [int(x) for x in as_path.strip().split(' ')]
+
+
+class ASPathDictionary:
+    def __init__(self):
+        # as_path -> path id
+        self.index = {}  # type: dict[str, int]
+        # tuple of ASes without prepending -> noprep id
+        self.noprep_index = {}  # type: dict[Tuple[int, ...], int]
+        self.paths = []  # type: List[str]
+        self.ases = np.zeros(0, dtype='i8')
+        self.offsets = np.zeros(1, dtype='i8')
+        self.noprep_ids = np.zeros(0, dtype='i8')
+        self.distinct_counts = np.zeros(0, dtype='i8')
+        # lock file, from read_as_path_dictionary(lock=True) to write_as_path_dictionary()
+        self.lock_file = None  # type: Optional[IO]
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    # Adds the paths not in the dictionary, parsing each of them once
+    def add_paths(self, as_paths):
+        new_paths = [as_path for as_path in as_paths if as_path not in self.index]
+        if len(new_paths) == 0:
+            return
+        new_ases = []
+        new_noprep_ids = []
+        new_distinct_counts = []
+        for as_path in new_paths:
+            self.index[as_path] = len(self.paths)
+            self.paths.append(as_path)
+            ases = parse_as_path(as_path)
+            noprep = tuple(dict.fromkeys(ases))
+            new_ases.append(ases)
+            new_noprep_ids.append(self.noprep_index.setdefault(noprep, len(self.noprep_index)))
+            new_distinct_counts.append(len(noprep))
+        lengths = np.array([len(ases) for ases in new_ases], dtype='i8')
+        self.ases = np.concatenate((self.ases, np.array([asn for ases in new_ases for asn in ases], dtype='i8')))
+        self.offsets = np.concatenate((self.offsets, self.offsets[-1] + np.cumsum(lengths)))
+        self.noprep_ids = np.concatenate((self.noprep_ids, np.array(new_noprep_ids, dtype='i8')))
+        self.distinct_counts = np.concatenate((self.distinct_counts, np.array(new_distinct_counts, dtype='i8')))
+
+    # Returns the path id of each AS path (strings, no NaN), adding new paths
+    def encode(self, as_paths: np.ndarray) -> np.ndarray:
+        codes, uniques = pd.factorize(as_paths)
+        self.add_paths(uniques)
+        unique_ids = np.array([self.index[as_path] for as_path in uniques], dtype='i8')
+        return unique_ids[codes]
+
+    def path_lengths(self, path_ids: np.ndarray) -> np.ndarray:
+        return self.offsets[path_ids + 1] - self.offsets[path_ids]
+
+    # The ASes of the paths, concatenated, and the position in path_ids of
+    # the path of each AS
+    def explode(self, path_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        lengths = self.path_lengths(path_ids)
+        starts = np.cumsum(lengths) - lengths
+        positions = np.repeat(self.offsets[path_ids] - starts, lengths) + np.arange(lengths.sum())
+        return self.ases[positions], np.repeat(np.arange(len(path_ids)), lengths)
+
+    def save(self, filename: str):
+        tmp_filename = filename + '.tmp.npz'
+        np.savez(tmp_filename, paths=np.array(self.paths, dtype=str), ases=self.ases, offsets=self.offsets,
+            noprep_ids=self.noprep_ids, distinct_counts=self.distinct_counts)
+        os.replace(tmp_filename, filename)
+
+    @classmethod
+    def load(cls, filename: str) -> 'ASPathDictionary':
+        path_dictionary = cls()
+        with np.load(filename) as data:
+            path_dictionary.paths = [str(as_path) for as_path in data['paths']]
+            path_dictionary.ases = data['ases']
+            path_dictionary.offsets = data['offsets']
+            path_dictionary.noprep_ids = data['noprep_ids']
+            path_dictionary.distinct_counts = data['distinct_counts']
+        path_dictionary.index = {as_path: i for i, as_path in enumerate(path_dictionary.paths)}
+        for path_id, noprep_id in enumerate(path_dictionary.noprep_ids):
+            ases = path_dictionary.ases[path_dictionary.offsets[path_id]:path_dictionary.offsets[path_id+1]]
+            path_dictionary.noprep_index.setdefault(tuple(dict.fromkeys(ases.tolist())), int(noprep_id))
+        return path_dictionary
+
+
+# The dictionary of the collector, empty if it did not exist. With lock, 
+# waits until no other process has it locked, and keeps it locked until 
+# write_as_path_dictionary() (or the end of the process)
+def read_as_path_dictionary(exp_name:str, collector:str, lock:bool = False) -> ASPathDictionary:
+    filename = as_path_dictionary_filename(exp_name, collector)
+    lock_file = None
+    if lock:
+        lock_file = open(filename + '.lock', 'a')
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+    if os.path.isfile(filename):
+        path_dictionary = ASPathDictionary.load(filename)
+    else:
+        path_dictionary = ASPathDictionary()
+    path_dictionary.lock_file = lock_file
+    return path_dictionary
+
+
+# Writes the dictionary, and releases its lock
+def write_as_path_dictionary(path_dictionary: ASPathDictionary, exp_name:str, collector:str):
+    path_dictionary.save(as_path_dictionary_filename(exp_name, collector))
+    if path_dictionary.lock_file is not None:
+        fcntl.flock(path_dictionary.lock_file, fcntl.LOCK_UN)
+        path_dictionary.lock_file.close()
+        path_dictionary.lock_file = None
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("exp_name")
+    parser.add_argument("collector")
+
+    args= parser.parse_args()
+    path_dictionary = read_as_path_dictionary(args.exp_name, args.collector)
+    print('{} {}: {} AS paths, {} without prepending, {} ASes'.format(args.exp_name, args.collector,
+        len(path_dictionary), len(path_dictionary.noprep_index), len(np.unique(path_dictionary.ases))))
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+'''
+Merges the HyperLogLog sketches (from path_sequence_index2distinct_sketches.py)
+of all the collectors of one or more experiments, and estimates, for each
+(monitor_ip, prefix), the number of distinct AS paths (without prepending)
+and of distinct ASes observed in all of them.
+
+Unlike as_path_count_DOWN and ases_different_one_event_DOWN of quantiles/,
+which add the distinct values of each event, a path or AS observed in
+many events (or experiments) is counted once.
+
+Generates 'distinct_counts_EXP1_EXP2.csv' in the directory of the first experiment:
+monitor_ip,prefix,distinct_paths,distinct_ases
+12.0.1.63,84.205.64.0/24,7.0,11.0
+
+Estimates have a relative standard error of about 1.04/sqrt(2^precision).
+With --down, merges the sketches of DOWN events.
+
+    ./distinct_sketches2distinct_counts.py 20181001_30d
+    ./distinct_sketches2distinct_counts.py 20121001_30d 20181001_30d --down
+'''
+
+from argparse import ArgumentParser
+import os
+from typing import List, Optional
+
+from experiments import collector_list
+from filenames_directories import distinct_counts_filename, distinct_sketches_filename
+from hyperloglog import HyperLogLogSketches
+from schemas import DISTINCT_COUNTS_SCHEMA, write_typed_csv
+
+
+# Merge of the sketches of kind of all the collectors of the experiments
+# (None if there are none)
+def merged_sketches(exp_names: List[str], kind: str) -> Optional[HyperLogLogSketches]:
+    merged = None
+    for exp_name in exp_names:
+        for collector in collector_list(exp_name):
+            filename = distinct_sketches_filename(exp_name, collector, kind)
+            if not os.path.isfile(filename):
+                continue
+            sketches = HyperLogLogSketches.load(filename)
+            merged = sketches if merged is None else merged.merge(sketches)
+    return merged
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("exp_names", nargs='+')
+    parser.add_argument("--down", help="merges the sketches of DOWN events", action='store_true')
+
+    args= parser.parse_args()
+    suffix = '_DOWN' if args.down else ''
+
+    path_sketches = merged_sketches(args.exp_names, 'paths' + suffix)
+    as_sketches = merged_sketches(args.exp_names, 'ases' + suffix)
+    if path_sketches is None:
+        print('no sketches for ', args.exp_names)
+        exit(0)
+
+    counts_df = path_sketches.keys.copy()
+    counts_df['distinct_paths'] = path_sketches.estimate()
+    counts_df['distinct_ases'] = as_sketches.estimate()[as_sketches.key_ids(counts_df['monitor_ip'], counts_df['prefix'])]
+    counts_df = counts_df.sort_values(['monitor_ip', 'prefix'])
+    write_typed_csv(counts_df, distinct_counts_filename(args.exp_names), DISTINCT_COUNTS_SCHEMA, index=False)
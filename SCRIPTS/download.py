@@ -4,14 +4,29 @@
 Downloads traces for 
     beacons (by default) and 
     anchors (if started with --anchor) 
+    both beacons and anchors in a single pass over the stream (if started with --both)
 Uses pybgpstream.
+With --replay REPLAY_DIRECTORY, elems are read from local fixture files 
+instead (see replay_stream.py).
+With --local_updates, elems are read from the RIS update files (MRT) 
+previously placed in 'download_updates/COLLECTOR/' (see mrt_reader.py).
 Downloads data for a single beacon_event (2 hour period), identified 
 by a number (0..MAX_EVENT) related to the experiment init_time and end_time.
-If the file already existed (and has more than 0 bytes), 
-it does not attempt to download it.
+With --last_event (or --day), a single stream is opened for all the events 
+from event_number to last_event (or for the 6 events of the day of event_number), 
+and each elem is written to the file of the event containing its timestamp.
+If the file already existed and is registered as complete in the manifest of 
+the collector (see download_manifest.py), it does not attempt to download it. 
+Files are written with a temporary name and renamed once complete.
+
+With --per_path_event, beacon updates are not written to 'download/': 
+per_path_event_EVENT_NUMBER.csv files (see downloaded2per_path_event.py) 
+are computed while reading the stream, keeping only the beacon prefixes 
+(0.0.0.0/0, etc. are discarded). Anchors are written as usual.
 
 Generates a different file per collector, beacon/anchor and event_number.
-The resulting file is a csv, goes to '../download/' directory.
+The resulting file is a csv (or a compressed binary file with --format gz/zst,
+see download_format.py), goes to '../download/' directory.
 .../download/COLLECTOR/beacon_EVENT_NUMBER.csv
                       /anchor_EVENT_NUMBER.csv
 .../download/rrc00/beacon_0.csv
@@ -28,12 +43,15 @@ A,1270094409,145.125.80.5,196613,84.205.79.0/24,196613 1125 1103 11537 1916 1916
 
 '''
 
-from _pybgpstream import BGPStream, BGPRecord
 from argparse import ArgumentParser
 import os
+from typing import Dict, Iterator, List, Optional, Set
 
-from experiments import anchor_list, beacon_list, event_number2timestamp_tuple 
-from filenames_directories import download_filename
+from experiments import anchor_list, beacon_list, event_number2timestamp_tuple, event_boundaries, timestamp2event_number, events_in_experiment
+from filenames_directories import download_filename, download_updates_basedir, per_path_event_filename, DOWNLOAD_FORMAT_EXTENSIONS
+from download_format import DownloadWriter
+from download_manifest import is_complete, read_manifest, record_download
+from downloaded2per_path_event import PerPathEventAccumulator, write_per_path_event
 
 
 def dump_elem(output_file, elem):
@@ -50,52 +68,211 @@ def dump_elem(output_file, elem):
         output_file.write('\n')
 
 
-# ./download.py 20181001_30d rrc00 0
-if __name__ == "__main__":
-    parser = ArgumentParser()
-    parser.add_argument("exp_name")
-    parser.add_argument("collector")
-    parser.add_argument("event_number", type=int)
-    parser.add_argument("--anchors", help="if set, downloads the anchor, otherwise downloads beacons", action='store_true')
+# With --both, a single stream is filtered by beacon and anchor prefixes.
+# Each elem goes to the anchor file if its prefix is an anchor, otherwise to
+# the beacon file (as when downloading beacons alone, unexpected prefixes such
+# as 0.0.0.0/0 end up in the beacon file and are removed later on).
+def select_output_file(output_files: Dict[bool, DownloadWriter], anchors: Set[str], elem) -> Optional[DownloadWriter]:
+    is_anchor = elem.fields.get('prefix') in anchors
+    return output_files.get(is_anchor)
 
-    args= parser.parse_args()
-    exp_name = args.exp_name
-    collector = args.collector
-    event_number = args.event_number
 
-    stream = BGPStream()
-    rec = BGPRecord()
-    stream.add_filter('collector', collector)
+# Used instead of DownloadWriter for beacons with --per_path_event
+class PerPathEventWriter:
+    def __init__(self, exp_name:str, collector:str, event_number:int):
+        self.exp_name = exp_name
+        self.collector = collector
+        self.event_number = event_number
+        self.name = per_path_event_filename(exp_name, collector, event_number)
+        first_ts, _ = event_number2timestamp_tuple(exp_name, event_number)
+        self.accumulator = PerPathEventAccumulator(first_ts, set(beacon_list(exp_name)))
+
+    def write_elem(self, elem):
+        self.accumulator.add_elem(elem)
 
-    if args.anchors:
-        prefixes = anchor_list(exp_name)
+    def close(self):
+        write_per_path_event(self.accumulator.per_path_event(self.event_number), self.exp_name, self.collector, self.event_number)
+
+    def abort(self):
+        pass
+
+
+# pybgpstream is imported only when used, so that the replay stream can be
+# used in systems without it
+def new_stream(replay_directory: Optional[str] = None):
+    if replay_directory is None:
+        from _pybgpstream import BGPStream, BGPRecord
+        return BGPStream(), BGPRecord()
     else:
-        prefixes = beacon_list(exp_name)
+        from replay_stream import BGPStream, BGPRecord
+        return BGPStream(replay_directory), BGPRecord()
+
+
+# Stream of the collector for the beacons (anchor = False) and/or anchors 
+# (anchor = True) of events first_event..last_event
+def new_event_stream(exp_name:str, collector:str, first_event:int, last_event:int, anchor_kinds, 
+        replay_directory: Optional[str] = None):
+    stream, rec = new_stream(replay_directory)
+    stream.add_filter('collector', collector)
+
+    prefixes = []
+    if False in anchor_kinds:
+        prefixes += beacon_list(exp_name)
+    if True in anchor_kinds:
+        prefixes += anchor_list(exp_name)
     
     for prefix in prefixes:
         # print('Adding filter for prefix {}'.format(prefix))
         stream.add_filter('prefix', prefix)
 
-    fn = download_filename(exp_name, collector, args.anchors, event_number)
-    if os.path.isfile(fn) and os.stat(fn).st_size > 0:
-        # To debug
-        # print('File {} already exists, with size larger than 0, exiting'.format(fn))
-        exit(1)
+    init_timestamp, _ = event_number2timestamp_tuple(exp_name, first_event)
+    _, end_timestamp = event_number2timestamp_tuple(exp_name, last_event)
+    stream.add_interval_filter(init_timestamp, end_timestamp -1)
+    return stream, rec
 
-    output_file = open(fn, 'w')
 
-    init_timestamp, end_timestamp = event_number2timestamp_tuple(exp_name, event_number)
-    stream.add_interval_filter(init_timestamp, end_timestamp -1)
+# Starts the stream and returns the elems of its valid records
+def stream_elems(stream, rec, collector:str) -> Iterator:
     stream.start()
 
     while(stream.get_next_record(rec)):
         if rec is None:
             print('None type read while processing {}'.format(collector))
         elif rec.status != "valid":
-            print("{} {} {} {} {}".format(rec.project, rec.collector, rec.type, rec.time, rec.status, rec))
+            print("{} {} {} {} {}".format(rec.project, rec.collector, rec.type, rec.time, rec.status))
         else:
             elem = rec.get_next_elem()
 
             while(elem):
-                dump_elem(output_file,  elem)
+                yield elem
                 elem = rec.get_next_elem()
+
+
+# Files not yet downloaded for events first_event..last_event, as 
+# result[event_number][anchor] = filename
+# If verify is set, the checksum of the files in the manifest is checked.
+# If per_path_event is set, beacons are pending if there is no per_path_event file.
+def pending_files(exp_name:str, collector:str, first_event:int, last_event:int, anchor_kinds: List[bool], 
+        download_format:str = 'csv', verify:bool = False, per_path_event:bool = False) -> Dict[int, Dict[bool, str]]:
+    manifest = read_manifest(exp_name, collector)
+    result = {}
+    for event_number in range(first_event, last_event+1):
+        for anchor in anchor_kinds:
+            if per_path_event and not anchor:
+                fn = per_path_event_filename(exp_name, collector, event_number)
+                if not os.path.isfile(fn):
+                    result.setdefault(event_number, {})[anchor] = fn
+                continue
+            fn = download_filename(exp_name, collector, anchor, event_number, download_format)
+            if not is_complete(fn, manifest, verify):
+                result.setdefault(event_number, {})[anchor] = fn
+    return result
+
+
+# Downloads events first_event..last_event (both included) of a collector 
+# with a single stream, for beacons (anchor = False) and/or anchors (anchor = True).
+# Events (and kinds) already downloaded are not downloaded again.
+# If replay_directory is set, reads from local fixtures instead of pybgpstream.
+# If per_path_event is set, per_path_event files are generated instead of beacon files.
+# Returns the number of event files written.
+def download(exp_name:str, collector:str, first_event:int, last_event:int, anchor_kinds: List[bool], 
+        replay_directory: Optional[str] = None, download_format:str = 'csv', verify:bool = False, 
+        per_path_event:bool = False) -> int:
+    # output_files[event_number][anchor]
+    output_files = pending_files(exp_name, collector, first_event, last_event, anchor_kinds, download_format, verify, per_path_event)
+    if len(output_files) == 0:
+        # To debug
+        # print('Files for events {}..{} already exist, with size larger than 0'.format(first_event, last_event))
+        return 0
+
+    # Only the events (and kinds) still missing are requested to the stream
+    pending_events = sorted(output_files.keys())
+    pending_kinds = set([anchor for files in output_files.values() for anchor in files])
+
+    stream, rec = new_event_stream(exp_name, collector, pending_events[0], pending_events[-1], pending_kinds, replay_directory)
+
+    for event_number in output_files:
+        for anchor in output_files[event_number]:
+            if per_path_event and not anchor:
+                output_files[event_number][anchor] = PerPathEventWriter(exp_name, collector, event_number)
+            else:
+                output_files[event_number][anchor] = DownloadWriter(output_files[event_number][anchor], download_format)
+    anchors = set(anchor_list(exp_name))
+
+    boundaries = event_boundaries(exp_name, first_event, last_event)
+    try:
+        for elem in stream_elems(stream, rec, collector):
+            # Elems between events (e.g., 08:00 to 12:00) are discarded
+            event_number = timestamp2event_number(exp_name, elem.time, first_event, last_event, boundaries)
+            if event_number in output_files:
+                output_file = select_output_file(output_files[event_number], anchors, elem)
+                if output_file is not None:
+                    output_file.write_elem(elem)
+    except:
+        # Do not leave partial files
+        for files in output_files.values():
+            for output_file in files.values():
+                output_file.abort()
+        raise
+
+    written = 0
+    for event_number, files in output_files.items():
+        for anchor, output_file in files.items():
+            output_file.close()
+            if isinstance(output_file, DownloadWriter):
+                record_download(exp_name, collector, output_file.name, event_number, anchor, download_format, output_file.records)
+            written += 1
+    return written
+
+
+# ./download.py 20181001_30d rrc00 0
+# ./download.py 20181001_30d rrc00 0 --both
+# Events 0..5 (the first day) with a single stream:
+# ./download.py 20181001_30d rrc00 0 --both --day
+# ./download.py 20181001_30d rrc00 0 --both --last_event 5
+# From local fixtures:
+# ./download.py 20181001_30d rrc00 0 --both --replay /data/fixtures/
+# ./download.py 20181001_30d rrc00 0 --both --day --local_updates
+# ./download.py 20181001_30d rrc00 0 --both --day --format zst
+# ./download.py 20181001_30d rrc00 0 --both --day --per_path_event
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("exp_name")
+    parser.add_argument("collector")
+    parser.add_argument("event_number", type=int)
+    parser.add_argument("--anchors", help="if set, downloads the anchor, otherwise downloads beacons", action='store_true')
+    parser.add_argument("--both", help="if set, downloads beacons and anchors reading the stream once", action='store_true')
+    parser.add_argument("--last_event", help="downloads events from event_number to last_event with a single stream", type=int)
+    parser.add_argument("--day", help="downloads the 6 events of the day of event_number with a single stream", action='store_true')
+    parser.add_argument("--replay", help="reads elems from fixtures in REPLAY/COLLECTOR/ instead of pybgpstream")
+    parser.add_argument("--local_updates", help="reads elems from the RIS update files in download_updates/COLLECTOR/", action='store_true')
+    parser.add_argument("--format", help="format of the resulting files (see download_format.py)", choices=list(DOWNLOAD_FORMAT_EXTENSIONS), default='csv')
+    parser.add_argument("--verify", help="checks the checksum of files already downloaded, downloads them again if it differs", action='store_true')
+    parser.add_argument("--per_path_event", help="generates per_path_event files instead of beacon files", action='store_true')
+
+    args= parser.parse_args()
+    exp_name = args.exp_name
+    collector = args.collector
+    event_number = args.event_number
+
+    if args.both:
+        anchor_kinds = [False, True]
+    else:
+        anchor_kinds = [args.anchors]
+
+    if args.day:
+        first_event = event_number - event_number % 6
+        last_event = min(first_event + 5, events_in_experiment(exp_name) - 1)
+    elif args.last_event is not None:
+        first_event = event_number
+        last_event = args.last_event
+    else:
+        first_event = event_number
+        last_event = event_number
+
+    replay_directory = args.replay
+    if args.local_updates:
+        replay_directory = download_updates_basedir(exp_name)
+
+    if download(exp_name, collector, first_event, last_event, anchor_kinds, replay_directory, args.format, args.verify, args.per_path_event) == 0:
+        exit(1)
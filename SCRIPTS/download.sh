@@ -1,6 +1,6 @@
 #!/usr/bin/env bash
 
-# Downloads all beacon and anchors for one experiment
+# Downloads all beacon and anchors for one experiment, with download_scheduler.py
 
 # To debug this file, 
 # bash -x ./donwload.sh
@@ -23,33 +23,8 @@ if [ $# -ne 1 ]; then
 fi
 
 EXP_NAME=$1
-COLLECTOR_NAMES="rrc00 rrc01 rrc04 rrc05 rrc06 rrc07 rrc10 rrc11 rrc12 rrc13 rrc14 rrc15"
-
-
-# Ensure a maximum of K processes at the same time with 'max K'
-# max 20        - K=20 processes
-function max () {
-   # Check running jobs only (not Done), show pids, count number of pids
-   while [ `jobs -rp| wc -w` -gt $1 ]
-   do
-      sleep 5
-   done
-}
-
-for collector in $COLLECTOR_NAMES
-do
-    for i in {0..179}
-    do
-    echo "./download.py $EXP_NAME $collector $i"
-    max $CONCURRENT_PROCESSES; ./download.py $EXP_NAME $collector $i &
-    done
-done
-
-for collector in $COLLECTOR_NAMES
-do
-    for i in {0..179}
-    do
-    echo "./download.py $EXP_NAME $collector $i --anchors"
-    max $CONCURRENT_PROCESSES; ./download.py $EXP_NAME $collector $i --anchors &
-    done
-done
\ No newline at end of file
+
+# Beacons and anchors of every collector are downloaded by download_scheduler.py
+# (one stream per collector and day, for beacons and anchors, with retries),
+# with CONCURRENT_PROCESSES concurrent downloads
+./download_scheduler.py $EXP_NAME --processes $CONCURRENT_PROCESSES
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+
+'''
+Writes and reads the files of the 'download/' directory.
+
+Three formats are supported (selected with --format in download.py):
+- 'csv': one text line per elem, without header (the original format)
+    A,1270094405,2001:610:1e08:4::5,196613,2001:7fb:fe03::/48,196613 1125 1103 12859 12654
+  File: beacon_EVENT_NUMBER.csv
+- 'gz', 'zst': compressed binary files, with typed columns. 
+  The file is a sequence of numpy structured arrays (.npy format) of up to 
+  BATCH_SIZE elems each, compressed with gzip or zstd (zstd requires the 
+  'zstandard' package). Timestamps and AS numbers are stored as integers, 
+  so they are not parsed again when the file is read.
+  Files: beacon_EVENT_NUMBER.npy.gz, beacon_EVENT_NUMBER.npy.zst
+
+Files are written as FILENAME.tmp and renamed to FILENAME by close(), so a 
+download interrupted before close() leaves no file that could be taken as complete.
+
+read_download() returns the same DataFrame for any format, with columns
+AW,timestamp,monitor_ip,monitor_as,prefix,as_path 
+(as_path is NaN for withdrawals).
+
+Datasets: all the events of a collector in a single file (see 
+stream2event_dataset.py), with an additional column event_number, 
+using the 'gz' or 'zst' format:
+    download/COLLECTOR/beacon_dataset.npy.gz
+                      /anchor_dataset.npy.gz
+read_dataset() reads the whole dataset, and read_dataset_events() splits it 
+by event; the stages read it only when asked to (--dataset), read_download() 
+only reads the file of an event.
+iter_download() reads a file in chunks of bounded size.
+'''
+
+import gzip
+import io
+import os
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from filenames_directories import DOWNLOAD_FORMAT_EXTENSIONS, download_dataset_filename, download_filename
+from schemas import DATASET_SCHEMA, DOWNLOAD_SCHEMA, apply_schema, concat_typed, read_typed_csv
+
+DOWNLOAD_COLUMNS = ['AW', 'timestamp', 'monitor_ip', 'monitor_as', 'prefix', 'as_path']
+DATASET_COLUMNS = DOWNLOAD_COLUMNS + ['event_number']
+STRING_COLUMNS = ['AW', 'monitor_ip', 'prefix', 'as_path']
+
+# Elems written at once
+BATCH_SIZE = 50000
+
+# Level 3 is the default of zstd; gzip default (9) is too slow for the download stage
+ZSTD_LEVEL = 3
+GZIP_LEVEL = 6
+
+
+def import_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise Exception("Format 'zst' requires the 'zstandard' package (pip install zstandard)")
+    return zstandard
+
+
+def open_binary_writer(filename: str, download_format: str):
+    if download_format == 'gz':
+        return gzip.open(filename, 'wb', compresslevel=GZIP_LEVEL)
+    elif download_format == 'zst':
+        zstandard = import_zstandard()
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(open(filename, 'wb'))
+    raise Exception('Unknown download format ' + download_format)
+
+
+# zstandard readers have no fileno() (numpy requires it to fail with OSError) nor peek()
+class ZstdRawReader(io.RawIOBase):
+    def __init__(self, reader):
+        self.reader = reader
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        return self.reader.readinto(buffer)
+
+    def close(self):
+        self.reader.close()
+        super().close()
+
+
+def open_binary_reader(filename: str, download_format: str):
+    if download_format == 'gz':
+        return gzip.open(filename, 'rb')
+    elif download_format == 'zst':
+        zstandard = import_zstandard()
+        return io.BufferedReader(ZstdRawReader(zstandard.ZstdDecompressor().stream_reader(open(filename, 'rb'), closefd=True)))
+    raise Exception('Unknown download format ' + download_format)
+
+
+# Writes elems for a single download file, in batches of BATCH_SIZE elems
+class DownloadWriter:
+    def __init__(self, filename: str, download_format: str = 'csv'):
+        if download_format not in DOWNLOAD_FORMAT_EXTENSIONS:
+            raise Exception('Unknown download format ' + download_format)
+        self.name = filename
+        self.tmp_name = filename + '.tmp'
+        self.download_format = download_format
+        self.rows = []
+        self.records = 0
+        if download_format == 'csv':
+            self.output_file = open(self.tmp_name, 'w')
+        else:
+            self.output_file = open_binary_writer(self.tmp_name, download_format)
+
+    def write_elem(self, elem):
+        if elem.type == 'rib':
+            raise Exception('Found RIB info')
+        elif elem.type == 'A':
+            self.rows.append((elem.type, elem.time, elem.peer_address, elem.peer_asn, elem.fields['prefix'], elem.fields['as-path']))
+        elif elem.type == 'W':
+            self.rows.append((elem.type, elem.time, elem.peer_address, elem.peer_asn, elem.fields['prefix'], ''))
+        else:
+            return
+        self.records += 1
+        if len(self.rows) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if len(self.rows) == 0:
+            return
+        if self.download_format == 'csv':
+            self.output_file.write(''.join(','.join((t, str(ts), ip, str(asn), p, path)) + '\n' 
+                for t, ts, ip, asn, p, path in self.rows))
+        else:
+            np.lib.format.write_array(self.output_file, rows2array(self.rows), allow_pickle=False)
+        self.rows = []
+
+    # The file gets its final name only when it is complete
+    def close(self):
+        self.flush()
+        self.output_file.close()
+        os.replace(self.tmp_name, self.name)
+
+    # Discards the file (e.g., the stream failed)
+    def abort(self):
+        self.output_file.close()
+        os.remove(self.tmp_name)
+
+
+# Fixed width strings, as wide as the longest value in the batch
+def rows2array(rows: List[Tuple]) -> np.ndarray:
+    columns = list(zip(*rows))
+    string_width = lambda values: max(1, max(len(v) for v in values))
+    dtype = [('AW', 'U1'), ('timestamp', 'i8'), 
+        ('monitor_ip', 'U{}'.format(string_width(columns[2]))), ('monitor_as', 'i8'), 
+        ('prefix', 'U{}'.format(string_width(columns[4]))), ('as_path', 'U{}'.format(string_width(columns[5])))]
+    return np.array(rows, dtype=dtype)
+
+
+# columns: DATASET_COLUMNS -> values. Strings as wide as the longest value.
+def columns2array(columns) -> np.ndarray:
+    dtype = []
+    for column in DATASET_COLUMNS:
+        if column in STRING_COLUMNS:
+            width = max([1] + [len(v) for v in columns[column]])
+            dtype.append((column, 'U{}'.format(width)))
+        else:
+            dtype.append((column, 'i8'))
+    array = np.empty(len(columns['timestamp']), dtype=dtype)
+    for column in DATASET_COLUMNS:
+        array[column] = columns[column]
+    return array
+
+
+def array2df(array: np.ndarray) -> pd.DataFrame:
+    df = pd.DataFrame({column: array[column] for column in array.dtype.names})
+    for column in STRING_COLUMNS:
+        df[column] = df[column].astype(object)
+    # Same as reading the csv file: no as_path for withdrawals
+    df.loc[df['as_path'] == '', 'as_path'] = np.nan
+    return df
+
+
+# Writes a dataset file (all the events of a collector) in batches
+class DatasetWriter:
+    def __init__(self, filename: str, download_format: str = 'gz'):
+        self.name = filename
+        self.tmp_name = filename + '.tmp'
+        self.records = 0
+        self.output_file = open_binary_writer(self.tmp_name, download_format)
+
+    # columns: DATASET_COLUMNS -> array or list of values (the same length for all)
+    def write_batch(self, columns):
+        if len(columns['timestamp']) == 0:
+            return
+        np.lib.format.write_array(self.output_file, columns2array(columns), allow_pickle=False)
+        self.records += len(columns['timestamp'])
+
+    def close(self):
+        self.output_file.close()
+        os.replace(self.tmp_name, self.name)
+
+    def abort(self):
+        self.output_file.close()
+        os.remove(self.tmp_name)
+
+
+# Returns (filename, format) of the existing download file, trying all formats
+def find_download_file(exp_name:str, collector:str, anchor:bool, event_number:int) -> Tuple[str, str]:
+    for download_format in DOWNLOAD_FORMAT_EXTENSIONS:
+        filename = download_filename(exp_name, collector, anchor, event_number, download_format)
+        if os.path.isfile(filename):
+            return filename, download_format
+    raise FileNotFoundError('No download file for {} {} event {} (anchor: {})'.format(exp_name, collector, event_number, anchor))
+
+
+def iter_binary_chunks(filename: str, download_format: str) -> Iterator[pd.DataFrame]:
+    with open_binary_reader(filename, download_format) as f:
+        while len(f.peek(1)) > 0:
+            yield array2df(np.lib.format.read_array(f, allow_pickle=False))
+
+
+def find_dataset_file(exp_name:str, collector:str, anchor:bool) -> Tuple[str, str]:
+    for download_format in ['gz', 'zst']:
+        filename = download_dataset_filename(exp_name, collector, anchor, download_format)
+        if os.path.isfile(filename):
+            return filename, download_format
+    raise FileNotFoundError('No dataset file for {} {} (anchor: {})'.format(exp_name, collector, anchor))
+
+
+# Returns a DataFrame with DATASET_COLUMNS, all the events of the collector
+def read_dataset(exp_name:str, collector:str, anchor:bool) -> pd.DataFrame:
+    filename, download_format = find_dataset_file(exp_name, collector, anchor)
+    frames = list(iter_binary_chunks(filename, download_format))
+    if len(frames) == 0:
+        return pd.DataFrame(columns=DATASET_COLUMNS)
+    return concat_typed(frames, DATASET_SCHEMA)
+
+
+# The dataset split by event: event_number -> DataFrame with DOWNLOAD_COLUMNS
+# (only the events with updates)
+def read_dataset_events(exp_name:str, collector:str, anchor:bool) -> Dict[int, pd.DataFrame]:
+    dataset_df = read_dataset(exp_name, collector, anchor)
+    return {event_number: event_df[DOWNLOAD_COLUMNS].reset_index(drop=True)
+        for event_number, event_df in dataset_df.groupby('event_number')}
+
+
+# Reads the file of a download file in any format, returns a DataFrame 
+# with DOWNLOAD_COLUMNS. Raises FileNotFoundError (an IOError) if there 
+# is no file for the event.
+def read_download(exp_name:str, collector:str, anchor:bool, event_number:int) -> pd.DataFrame:
+    filename, download_format = find_download_file(exp_name, collector, anchor, event_number)
+    if download_format == 'csv':
+        if os.stat(filename).st_size == 0:
+            return pd.DataFrame(columns=DOWNLOAD_COLUMNS)
+        return read_typed_csv(filename, DOWNLOAD_SCHEMA, names=DOWNLOAD_COLUMNS)
+
+    frames = list(iter_binary_chunks(filename, download_format))
+    if len(frames) == 0:
+        return pd.DataFrame(columns=DOWNLOAD_COLUMNS)
+    return concat_typed(frames, DOWNLOAD_SCHEMA)
+
+
+# As read_download(), in DataFrames of at most chunksize rows, so that the
+# memory used does not depend on the size of the file. Binary files are 
+# read in the batches they were written in (BATCH_SIZE rows).
+def iter_download(exp_name:str, collector:str, anchor:bool, event_number:int, chunksize:int) -> Iterator[pd.DataFrame]:
+    filename, download_format = find_download_file(exp_name, collector, anchor, event_number)
+    if download_format == 'csv':
+        if os.stat(filename).st_size == 0:
+            return
+        with pd.read_csv(filename, names=DOWNLOAD_COLUMNS, chunksize=chunksize) as reader:
+            for chunk in reader:
+                yield apply_schema(chunk, DOWNLOAD_SCHEMA)
+        return
+
+    for chunk in iter_binary_chunks(filename, download_format):
+        yield apply_schema(chunk, DOWNLOAD_SCHEMA)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+'''
+Manifest of the completed files of 'download/COLLECTOR/'.
+
+download.py writes each file with a temporary name (FILENAME.tmp) and renames 
+it when the stream has been completely read; then a line is appended to 
+'download/COLLECTOR/download.manifest' (csv format, with another extension so 
+that the directory can be read as a REPLAY_DIRECTORY, see replay_stream.py):
+
+filename,event_number,anchor,download_format,records,size,sha256
+beacon_0.csv,0,False,csv,2731,175432,5f0c...
+anchor_0.csv,0,True,csv,0,0,e3b0...
+
+A file is complete if it has an entry in the manifest and its size is the 
+recorded one (and, if verify is set, also its sha256). 
+Files without entry (e.g., truncated by a killed process) are downloaded again.
+If a file appears several times, the last entry is used.
+
+Checks the files of a collector:
+    ./download_manifest.py 20181001_30d rrc00 --verify
+Adds to the manifest the non-empty files downloaded before manifests were used:
+    ./download_manifest.py 20181001_30d rrc00 --adopt
+'''
+
+from argparse import ArgumentParser
+import csv
+import fcntl
+import hashlib
+import os
+from typing import Dict
+
+from filenames_directories import DOWNLOAD_FORMAT_EXTENSIONS, download_directory, download_manifest_filename
+
+MANIFEST_COLUMNS = ['filename', 'event_number', 'anchor', 'download_format', 'records', 'size', 'sha256']
+
+
+def file_sha256(filename: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+# Returns {filename (without directory): entry}, entry is a dict with MANIFEST_COLUMNS
+def read_manifest(exp_name:str, collector:str) -> Dict[str, Dict[str, str]]:
+    manifest_fn = download_manifest_filename(exp_name, collector)
+    entries = {}
+    if not os.path.isfile(manifest_fn):
+        return entries
+    with open(manifest_fn) as f:
+        for entry in csv.DictReader(f):
+            entries[entry['filename']] = entry
+    return entries
+
+
+# Appends an entry for a complete file. Several processes may be downloading
+# events of the same collector, the manifest is locked while writing.
+def record_download(exp_name:str, collector:str, filename:str, event_number:int, anchor:bool, download_format:str, records:int):
+    manifest_fn = download_manifest_filename(exp_name, collector)
+    entry = [os.path.basename(filename), event_number, anchor, download_format, records, 
+        os.stat(filename).st_size, file_sha256(filename)]
+    with open(manifest_fn, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        if f.tell() == 0:
+            csv.writer(f).writerow(MANIFEST_COLUMNS)
+        csv.writer(f).writerow(entry)
+        f.flush()
+        fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def is_complete(filename: str, manifest: Dict[str, Dict[str, str]], verify:bool = False) -> bool:
+    entry = manifest.get(os.path.basename(filename))
+    if entry is None or not os.path.isfile(filename):
+        return False
+    if os.stat(filename).st_size != int(entry['size']):
+        return False
+    if verify and file_sha256(filename) != entry['sha256']:
+        return False
+    return True
+
+
+# 'beacon_12.npy.gz' -> (False, 12, 'gz'), None if it is not a download file
+def parse_download_basename(basename: str):
+    for download_format, extension in DOWNLOAD_FORMAT_EXTENSIONS.items():
+        if not basename.endswith(extension):
+            continue
+        kind, _, number = basename[:-len(extension)].partition('_')
+        if kind in ('beacon', 'anchor') and number.isdigit():
+            return kind == 'anchor', int(number), download_format
+    return None
+
+
+# ./download_manifest.py 20181001_30d rrc00 --verify
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("exp_name")
+    parser.add_argument("collector")
+    parser.add_argument("--verify", help="also checks the sha256 of the files", action='store_true')
+    parser.add_argument("--adopt", help="adds to the manifest non-empty files without entry", action='store_true')
+
+    args= parser.parse_args()
+    exp_name = args.exp_name
+    collector = args.collector
+
+    directory = download_directory(exp_name, collector)
+    manifest = read_manifest(exp_name, collector)
+
+    complete = 0
+    incomplete = []
+    for basename in sorted(os.listdir(directory)):
+        parsed = parse_download_basename(basename)
+        if parsed is None:
+            continue
+        filename = directory + basename
+        if is_complete(filename, manifest, args.verify):
+            complete += 1
+        elif args.adopt and basename not in manifest and os.stat(filename).st_size > 0:
+            anchor, event_number, download_format = parsed
+            # Number of records is unknown
+            record_download(exp_name, collector, filename, event_number, anchor, download_format, -1)
+            complete += 1
+        else:
+            incomplete.append(basename)
+
+    print('{} {}: {} complete files, {} incomplete'.format(exp_name, collector, complete, len(incomplete)))
+    for basename in incomplete:
+        print('    incomplete: {}'.format(basename))
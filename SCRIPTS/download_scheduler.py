@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+'''
+Downloads all beacons and anchors of an experiment (download.sh runs it
+with 2 processes).
+
+Runs download.download() for every collector in collector_list() and every
+event in events_in_experiment() on a pool of PROCESSES worker processes.
+Each task downloads EVENTS_PER_TASK consecutive events (6 by default, one day) 
+of a collector, for beacons and anchors, with a single stream.
+
+- Tasks whose files are already downloaded (complete in the manifest, see
+  download_manifest.py) are skipped; with --verify, checksums are also checked.
+- A failed task is retried up to RETRIES times, waiting BACKOFF, 2*BACKOFF, 
+  4*BACKOFF... seconds between attempts. Tasks still failing are listed at the end.
+- Prints progress (tasks done, files written, tasks per minute and 
+  estimated remaining time) as tasks finish.
+'''
+
+from argparse import ArgumentParser
+from multiprocessing import Pool
+import time
+import traceback
+from typing import List, Optional, Tuple
+
+from download import download, pending_files
+from experiments import collector_list, events_in_experiment
+from filenames_directories import download_updates_basedir, DOWNLOAD_FORMAT_EXTENSIONS
+
+# (exp_name, collector, first_event, last_event)
+Task = Tuple[str, str, int, int]
+
+
+def experiment_tasks(exp_name:str, events_per_task:int) -> List[Task]:
+    num_events = events_in_experiment(exp_name)
+    tasks = []
+    for collector in sorted(collector_list(exp_name)):
+        for first_event in range(0, num_events, events_per_task):
+            last_event = min(first_event + events_per_task, num_events) - 1
+            tasks.append((exp_name, collector, first_event, last_event))
+    return tasks
+
+
+def is_task_pending(task: Task, download_format:str, verify:bool, per_path_event:bool) -> bool:
+    exp_name, collector, first_event, last_event = task
+    return len(pending_files(exp_name, collector, first_event, last_event, [False, True], download_format, verify, per_path_event)) > 0
+
+
+# Executed in the worker processes
+# Returns task, number of files written, attempts, error (None if it succeeded)
+def run_task(task: Task, retries:int, backoff:float, replay_directory: Optional[str], download_format:str, verify:bool, 
+        per_path_event:bool) -> Tuple[Task, int, int, str]:
+    exp_name, collector, first_event, last_event = task
+    error = None
+    for attempt in range(retries + 1):
+        if attempt > 0:
+            time.sleep(backoff * 2**(attempt-1))
+        try:
+            written = download(exp_name, collector, first_event, last_event, [False, True], replay_directory, download_format, verify, per_path_event)
+            return task, written, attempt + 1, None
+        except Exception:
+            error = traceback.format_exc(limit=1)
+    return task, 0, retries + 1, error
+
+
+def run_task_star(arguments) -> Tuple[Task, int, int, str]:
+    return run_task(*arguments)
+
+
+# ./download_scheduler.py 20181001_30d
+# ./download_scheduler.py 20181001_30d --processes 8 --retries 5
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("exp_name")
+    parser.add_argument("--processes", help="number of concurrent downloads", type=int, default=2)
+    parser.add_argument("--retries", help="retries for a failed task", type=int, default=3)
+    parser.add_argument("--backoff", help="seconds to wait before the first retry (doubles with each retry)", type=float, default=30)
+    parser.add_argument("--events_per_task", help="consecutive events downloaded with the same stream", type=int, default=6)
+    parser.add_argument("--replay", help="reads elems from fixtures in REPLAY/COLLECTOR/ instead of pybgpstream")
+    parser.add_argument("--local_updates", help="reads elems from the RIS update files in download_updates/COLLECTOR/", action='store_true')
+    parser.add_argument("--format", help="format of the resulting files (see download_format.py)", choices=list(DOWNLOAD_FORMAT_EXTENSIONS), default='csv')
+    parser.add_argument("--verify", help="checks the checksum of files already downloaded", action='store_true')
+    parser.add_argument("--per_path_event", help="generates per_path_event files instead of beacon files", action='store_true')
+
+    args= parser.parse_args()
+    exp_name = args.exp_name
+
+    replay_directory = args.replay
+    if args.local_updates:
+        replay_directory = download_updates_basedir(exp_name)
+
+    all_tasks = experiment_tasks(exp_name, args.events_per_task)
+    tasks = [task for task in all_tasks if is_task_pending(task, args.format, args.verify, args.per_path_event)]
+    print('{} tasks, {} already downloaded, {} pending'.format(len(all_tasks), len(all_tasks) - len(tasks), len(tasks)))
+
+    start_time = time.time()
+    done = 0
+    files_written = 0
+    failed = []
+    with Pool(args.processes) as pool:
+        arguments = [(task, args.retries, args.backoff, replay_directory, args.format, args.verify, args.per_path_event) for task in tasks]
+        for task, written, attempts, error in pool.imap_unordered(run_task_star, arguments):
+            done += 1
+            files_written += written
+            if error is not None:
+                failed.append(task)
+                print('Failed {} after {} attempts: {}'.format(task, attempts, error.strip()))
+
+            elapsed = time.time() - start_time
+            rate = done / elapsed * 60
+            remaining = (len(tasks) - done) / rate if rate > 0 else 0
+            print('{}/{} tasks ({} events {}..{}), {} files, {:.1f} tasks/min, {:.0f} min remaining'.format(
+                done, len(tasks), *task[1:], files_written, rate, remaining))
+
+    print('Finished in {:.0f} s, {} files written, {} failed tasks'.format(time.time() - start_time, files_written, len(failed)))
+    for task in failed:
+        print('    failed: {} {} events {}..{}'.format(*task))
+    if len(failed) > 0:
+        exit(1)
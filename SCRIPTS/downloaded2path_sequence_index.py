@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+'''
+Reads 'download/' data of the beacons of a collector (as downloaded2per_path_event.py)
+and generates the index of the ordered sequence of updates of each
+(monitor_ip, prefix, event), in 'path_sequence_index/COLLECTOR.npz'
+(see path_sequence_index.py).
+
+While per_path_event/ keeps the number of paths and the last one,
+the index keeps the order in which paths were explored, and when.
+
+AS paths are encoded with the dictionary of the collector (see as_path_dictionary.py),
+which is updated with the new paths at the end.
+
+With --dataset, reads the dataset of the collector (see stream2event_dataset.py)
+once, instead of a file per event.
+
+    ./downloaded2path_sequence_index.py 20181001_30d rrc00
+'''
+
+from argparse import ArgumentParser
+
+from as_path_dictionary import read_as_path_dictionary, write_as_path_dictionary
+from download_format import read_dataset_events, read_download
+from experiments import event_number2timestamp_tuple, events_in_experiment
+from path_sequence_index import PathSequenceIndex, write_path_sequence_index
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("exp_name")
+    parser.add_argument("collector")
+    parser.add_argument("--dataset", help="reads the dataset of the collector (from stream2event_dataset.py) instead of a file per event", action='store_true')
+
+    args= parser.parse_args()
+    exp_name = args.exp_name
+    collector = args.collector
+
+    if args.dataset:
+        event_dfs = read_dataset_events(exp_name, collector, False)
+
+    # Locked until written, see as_path_dictionary.py
+    path_dictionary = read_as_path_dictionary(exp_name, collector, lock=True)
+
+    indexes = []
+    for event_number in range(events_in_experiment(exp_name)):
+        first_ts, _ = event_number2timestamp_tuple(exp_name, event_number)
+
+        if args.dataset:
+            if event_number not in event_dfs:
+                continue
+            update_df = event_dfs.pop(event_number)
+        else:
+            try:
+                update_df = read_download(exp_name, collector, False, event_number)
+            except:
+                # debug
+                # print('download file does not exist for event: ', event_number)
+                continue
+        if len(update_df) == 0:
+            continue
+
+        update_df['timestamp'] = update_df['timestamp'] - first_ts
+        indexes.append(PathSequenceIndex.from_updates(update_df, event_number, path_dictionary))
+
+    # The dictionary first, so that the index never refers to unknown paths
+    write_as_path_dictionary(path_dictionary, exp_name, collector)
+    write_path_sequence_index(PathSequenceIndex.concat(indexes), exp_name, collector)
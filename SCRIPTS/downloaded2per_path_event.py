@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 
 '''
-Reads 'download/' data, resulting from download.py (one line per BGP message).
+Reads 'download/' data, resulting from download.py (one line per BGP message),
+in any of the formats of download_format.py.
 
 Generates single file per collector, in 'per_path_event/' directory.
 Files are named as: /per_path_event_0.csv
@@ -28,16 +29,39 @@ monitor_ip,prefix,min_ts_A,max_ts_A,count_A,min_ts_W,max_ts_W,count_W,as_path_co
 12.0.1.63,84.205.65.0/24,3,108,9,275,275,1,4,9,4,1
 12.0.1.63,84.205.68.0/24,18,31,4,35,35,1,1,4,4,1
 
+With --initial_state, an additional column 'initial_state' is 1 if the 
+monitor had a route for the prefix in the RIB dump before the event, 0 otherwise
+(requires the result of rib2initial_state.py).
+
+The same files can be generated while downloading, without writing the 
+beacon updates to 'download/' (download.py --per_path_event), with 
+PerPathEventAccumulator.
+
+With --dataset, reads the dataset of the collector (see stream2event_dataset.py)
+once, and splits it by event_number, instead of reading a file per event.
+
+With --chunksize N, each download file is read in chunks of N updates, and 
+partial aggregates are merged (see ExtremesAccumulator), so that an event 
+with millions of updates (e.g., a route leak) does not need to fit in memory.
+
+AS paths are encoded with the dictionary of the collector (see as_path_dictionary.py),
+which is updated with the new paths at the end.
 
 '''
 
 from argparse import ArgumentParser
 from experiment_specs import result_directory
+import numpy as np
 import pandas as pd
-from typing import List
+import os
+from typing import List, Optional, Set
 
-from filenames_directories import download_directory, per_path_event_filename
+from filenames_directories import initial_state_filename, per_path_event_filename
+from download_format import iter_download, read_dataset_events, read_download
+from as_path_dictionary import ASPathDictionary, read_as_path_dictionary, write_as_path_dictionary
 from experiments import event_number2timestamp_tuple, events_in_experiment
+from ip_keys import PATH_KEY_COLUMNS, add_path_keys
+from schemas import INITIAL_STATE_SCHEMA, PER_PATH_EVENT_SCHEMA, read_typed_csv, write_typed_csv
 from collections import OrderedDict
 
 
@@ -59,106 +83,273 @@ def get_as_path_set(as_path: str) -> List:
     return result
 
 
-def count_aspaths(df: pd.DataFrame) -> int:
-    dfna=df.dropna()
-    as_path_wo_prepending = dfna.apply(as_path_remove_prepending)
-    count = len(as_path_wo_prepending.unique())
-    return count
-    
-def count_different_ases(df: pd.DataFrame) -> int:
-    dfna=df.dropna()
-    as_paths= dfna.apply(get_as_path_set)
-    # operate elements of series to get a single Set    
+# Number of distinct values per group, for pairs (group_id, value)
+def count_distinct_per_group(group_ids: np.ndarray, values: np.ndarray, ngroups: int) -> np.ndarray:
+    pairs = pd.DataFrame({'group_id': group_ids, 'value': values}).drop_duplicates()
+    return np.bincount(pairs['group_id'].to_numpy(), minlength=ngroups)
+
+
+# Per (monitor_ip, prefix, AW): distinct AS paths (without prepending), 
+# distinct ASes and length of the last AS path, with a single groupby and no 
+# per-group callbacks: 
+# AS paths are encoded with path_dictionary (each distinct AS path is parsed 
+# once, see as_path_dictionary.py), and the rest are vectorized operations 
+# over integer arrays.
+# Returns one row per (monitor_ip, prefix, AW), with EXTREMES_COLUMNS
+def update_df2extremes(update_df: pd.DataFrame, path_dictionary: Optional[ASPathDictionary] = None) -> pd.DataFrame:
+    if path_dictionary is None:
+        path_dictionary = ASPathDictionary()
+    grouped = update_df.groupby(['monitor_ip', 'prefix', 'AW'], sort=True, observed=True)
+    extremes = grouped['timestamp'].agg(min_ts='min', max_ts='max', count='size')
+    ngroups = len(extremes)
+    group_ids = grouped.ngroup().to_numpy()
+
+    # Only advertisements have AS paths
+    with_path = update_df['as_path'].notna().to_numpy()
+    path_group_ids = group_ids[with_path]
+    path_ids = path_dictionary.encode(update_df['as_path'].to_numpy()[with_path])
+
+    # as_path_count: distinct paths once prepending is removed
+    extremes['as_path_count'] = count_distinct_per_group(path_group_ids, path_dictionary.noprep_ids[path_ids], ngroups)
+
+    # different_ases_count: distinct ASes of the distinct paths of each group
+    pairs = pd.DataFrame({'group_id': path_group_ids, 'path_id': path_ids}).drop_duplicates()
+    ases, pair_positions = path_dictionary.explode(pairs['path_id'].to_numpy())
+    extremes['different_ases_count'] = count_distinct_per_group(pairs['group_id'].to_numpy()[pair_positions], ases, ngroups)
+
+    # last_as_path_length: ASes (without repetitions) of the last path of each group
+    last_path_ids = pd.Series(path_ids).groupby(path_group_ids).last()
+    last_as_path_length = np.zeros(ngroups, dtype=int)
+    last_as_path_length[last_path_ids.index.to_numpy()] = path_dictionary.distinct_counts[last_path_ids.to_numpy()]
+    extremes['last_as_path_length'] = last_as_path_length
+
+    return extremes[EXTREMES_COLUMNS]
+
+
+GROUP_COLUMNS = ['monitor_ip', 'prefix', 'AW']
+
+
+# Computes the same values as update_df2extremes(), reading the updates of 
+# an event in chunks. For each chunk, partial aggregates per (monitor_ip, prefix, AW) 
+# are merged with those of the previous chunks: min, max and count of the 
+# timestamps, the distinct (path without prepending) and the distinct ASes, 
+# and the last path. The memory used depends on the number of distinct 
+# paths and ASes of each group, not on the number of updates.
+class ExtremesAccumulator:
+    def __init__(self, path_dictionary: Optional[ASPathDictionary] = None):
+        if path_dictionary is None:
+            path_dictionary = ASPathDictionary()
+        self.path_dictionary = path_dictionary
+        # indexed by GROUP_COLUMNS: min_ts, max_ts, count
+        self.totals = None  # type: Optional[pd.DataFrame]
+        # GROUP_COLUMNS + noprep_id, without duplicates
+        self.noprep = None  # type: Optional[pd.DataFrame]
+        # GROUP_COLUMNS + asn, without duplicates
+        self.ases = None  # type: Optional[pd.DataFrame]
+        # indexed by GROUP_COLUMNS: path id of the last path
+        self.last_path_ids = None  # type: Optional[pd.Series]
+
+    def add_chunk(self, update_df: pd.DataFrame):
+        if len(update_df) == 0:
+            return
+        totals = update_df.groupby(GROUP_COLUMNS, sort=False, observed=True)['timestamp'].agg(min_ts='min', max_ts='max', count='size')
+        if self.totals is not None:
+            totals = pd.concat([self.totals, totals]).groupby(level=GROUP_COLUMNS, sort=False, observed=True).agg(
+                {'min_ts': 'min', 'max_ts': 'max', 'count': 'sum'})
+        self.totals = totals
+
+        # Only advertisements have AS paths
+        with_path = update_df['as_path'].notna().to_numpy()
+        if not with_path.any():
+            return
+        paths = update_df.loc[with_path, GROUP_COLUMNS].reset_index(drop=True)
+        paths['path_id'] = self.path_dictionary.encode(update_df['as_path'].to_numpy()[with_path])
+
+        noprep = paths[GROUP_COLUMNS].assign(noprep_id=self.path_dictionary.noprep_ids[paths['path_id'].to_numpy()])
+        self.noprep = pd.concat([self.noprep, noprep]).drop_duplicates()
+
+        pairs = paths.drop_duplicates()
+        ases, pair_positions = self.path_dictionary.explode(pairs['path_id'].to_numpy())
+        pair_ases = pairs[GROUP_COLUMNS].iloc[pair_positions].assign(asn=ases)
+        self.ases = pd.concat([self.ases, pair_ases]).drop_duplicates()
+
+        last_path_ids = paths.groupby(GROUP_COLUMNS, sort=False, observed=True)['path_id'].last()
+        if self.last_path_ids is not None:
+            last_path_ids = pd.concat([self.last_path_ids, last_path_ids]).groupby(level=GROUP_COLUMNS, sort=False, observed=True).last()
+        self.last_path_ids = last_path_ids
+
+    # Returns one row per (monitor_ip, prefix, AW), with EXTREMES_COLUMNS
+    # (None if no update was added)
+    def extremes(self) -> Optional[pd.DataFrame]:
+        if self.totals is None:
+            return None
+        extremes = self.totals.sort_index()
+        if self.noprep is None:
+            for column in ['as_path_count', 'different_ases_count', 'last_as_path_length']:
+                extremes[column] = 0
+            return extremes[EXTREMES_COLUMNS]
+        extremes['as_path_count'] = self.noprep.groupby(GROUP_COLUMNS, observed=True).size().reindex(extremes.index, fill_value=0)
+        extremes['different_ases_count'] = self.ases.groupby(GROUP_COLUMNS, observed=True).size().reindex(extremes.index, fill_value=0)
+        last_as_path_length = pd.Series(self.path_dictionary.distinct_counts[self.last_path_ids.to_numpy()], index=self.last_path_ids.index)
+        extremes['last_as_path_length'] = last_as_path_length.reindex(extremes.index, fill_value=0)
+        return extremes[EXTREMES_COLUMNS]
+
+
+PER_PATH_EVENT_COLUMNS = ['monitor_ip', 'prefix' , 
+        'min_ts_A', 'max_ts_A', 'count_A', 
+        'min_ts_W', 'max_ts_W', 'count_W', 
+        'as_path_count_A', 'different_ases_count_A', 'last_as_path_length_A',
+        'event_number']
+
+EXTREMES_COLUMNS = ['min_ts', 'max_ts', 'count', 'as_path_count', 'different_ases_count', 'last_as_path_length']
+
+
+# extremes: one row per (monitor_ip, prefix, AW), with EXTREMES_COLUMNS
+# Returns one row per (monitor_ip, prefix) with advertisements, 
+# with the values of the withdrawals of the same path.
+def extremes2per_path_event(extremes: pd.DataFrame, event_number: int) -> pd.DataFrame:
+    extremes = extremes.reset_index()
+
+    extremes_A = extremes[extremes['AW']=='A']
+    extremes_W = extremes[extremes['AW']=='W']
     
-    # nested list
-    # transform
-    # 86     6667 3257 29208 6881 12654
-    # 87          6667 29208 6881 12654
-    # into
-    # [6667, 3257, 29208, 6881, 12654, 6667, 29208, 6881, 12654,...
-
-    as_paths_set = set([element for list_ in as_paths for element in list_])
-
-    return len(as_paths_set)
-
-def length_last_path_observed(df: pd.DataFrame) -> int:
-    dfna=df.dropna()
-    if len(dfna) > 0:
-        # Take last path
-        last_as_path = dfna.iloc[-1]
-        last_as_path = str(last_as_path).strip()
-        elements = last_as_path.split(' ')
-        last_as_path_no_prep = set(elements)
-        result = len(last_as_path_no_prep)
 
-    else:
-        result = 0
-    return result
+    merged = extremes_A.merge(extremes_W[['monitor_ip', 'prefix'] + EXTREMES_COLUMNS], 
+    left_on=['monitor_ip', 'prefix'], 
+    right_on=['monitor_ip', 'prefix'],
+    how='left', suffixes=('_A', '_W'), copy=True)
+
+    merged['event_number']=event_number
+
+    # Remove as_path_count_W, different_ases_count_W, last_as_path_length_W:
+    # aspaths only appear in advertisement, i.e., 'A' messages
+    return merged[PER_PATH_EVENT_COLUMNS]
+
+
+# Adds 'initial_state' column: 1 if (monitor_ip, prefix) was in the RIB dump before the event
+# initial_state_df: result of rib2initial_state.py
+def add_initial_state(per_path_event_df: pd.DataFrame, initial_state_df: pd.DataFrame) -> pd.DataFrame:
+    present = add_path_keys(initial_state_df[['monitor_ip', 'prefix', 'event_number']])[PATH_KEY_COLUMNS + ['event_number']]
+    present['initial_state'] = 1
+    merged = add_path_keys(per_path_event_df).merge(present, on=PATH_KEY_COLUMNS + ['event_number'], how='left')
+    merged['initial_state'] = merged['initial_state'].fillna(0).astype(int)
+    return merged.drop(columns=PATH_KEY_COLUMNS)
+
+
+# Written with a temporary name, a partial file is never left with the final name
+def write_per_path_event(per_path_event_df: pd.DataFrame, exp_name:str, collector:str, event_number:int):
+    filename = per_path_event_filename(exp_name, collector, event_number)
+    write_typed_csv(per_path_event_df, filename + '.tmp', PER_PATH_EVENT_SCHEMA, index=False)
+    os.replace(filename + '.tmp', filename)
+
+
+# Computes the per_path_event values incrementally, one elem at a time, 
+# for a single event (the same values as the aggregation of the download file).
+# If prefixes is set, other prefixes are ignored (e.g., 0.0.0.0/0 sometimes 
+# received from pybgpstream, which is later removed in 
+# per_path_event2per_path_event_filtered.py)
+class PerPathEventAccumulator:
+    def __init__(self, first_ts: int, prefixes: Optional[Set[str]] = None):
+        self.first_ts = first_ts
+        self.prefixes = prefixes
+        # (monitor_ip, prefix, AW) -> [min_ts, max_ts, count, as_paths (w/o prepending), ases, last_as_path_length]
+        self.groups = {}
+
+    def add_elem(self, elem):
+        if elem.type not in ('A', 'W'):
+            return
+        prefix = elem.fields['prefix']
+        if self.prefixes is not None and prefix not in self.prefixes:
+            return
+
+        timestamp = elem.time - self.first_ts
+        key = (elem.peer_address, prefix, elem.type)
+        group = self.groups.get(key)
+        if group is None:
+            group = [timestamp, timestamp, 0, set(), set(), 0]
+            self.groups[key] = group
+        else:
+            group[0] = min(group[0], timestamp)
+            group[1] = max(group[1], timestamp)
+        group[2] += 1
+
+        as_path = elem.fields.get('as-path', '') if elem.type == 'A' else ''
+        if as_path.strip():
+            group[3].add(as_path_remove_prepending(as_path))
+            group[4].update(get_as_path_set(as_path))
+            group[5] = len(set(as_path.strip().split(' ')))
+
+    def extremes(self) -> pd.DataFrame:
+        rows = [key + (group[0], group[1], group[2], len(group[3]), len(group[4]), group[5]) 
+            for key, group in self.groups.items()]
+        extremes = pd.DataFrame(rows, columns=['monitor_ip', 'prefix', 'AW'] + EXTREMES_COLUMNS)
+        # Same order as groupby
+        return extremes.set_index(['monitor_ip', 'prefix', 'AW']).sort_index()
+
+    def per_path_event(self, event_number: int) -> pd.DataFrame:
+        return extremes2per_path_event(self.extremes(), event_number)
+
 
 # ./downloaded2per_path_event.py 20120101_30d rrc00
 if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("exp_name")
     parser.add_argument("collector")
+    parser.add_argument("--initial_state", help="adds the state of the path in the RIB before the event (from rib2initial_state.py)", action='store_true')
+    parser.add_argument("--chunksize", help="reads each download file in chunks of CHUNKSIZE updates, with bounded memory (not used with --dataset)", type=int)
+    parser.add_argument("--dataset", help="reads the dataset of the collector (from stream2event_dataset.py) instead of a file per event", action='store_true')
 
     args= parser.parse_args()
     exp_name = args.exp_name
     collector = args.collector
 
-    directory = download_directory(exp_name, collector)
-    
-    for event_number in range(events_in_experiment(exp_name)):
-        filename = directory + 'beacon_'+str(event_number)+'.csv'
-
-        first_ts, _ = event_number2timestamp_tuple(exp_name, event_number)
-
-        try:
-            update_df = pd.read_csv(filename, names=['AW', 'timestamp','monitor_ip', 'monitor_as', 'prefix', 'as_path'])
-        except:
-            # debug
-            # print('filename does not exist: ', filename)
-            continue
-        if len(update_df) == 0:
-            # debug
-            # print('Warning, empty file {}, exiting (can continue with further processing steps)'.format(filename))
-            continue
-
-        update_df['timestamp'] = update_df['timestamp'] - first_ts
-        
-        grouped = update_df.groupby(['monitor_ip', 'prefix', 'AW'])
-
-        extremes = grouped.aggregate({'timestamp': lambda serie: serie.min()})
-        extremes.rename(index=str, columns={'timestamp': 'min_ts'}, inplace = True)
-        extremes['max_ts'] = grouped.aggregate({'timestamp': lambda serie: serie.max()})
-        extremes['count'] = grouped.aggregate({'timestamp': lambda serie: len(serie)})
-
+    if args.initial_state:
+        initial_state_df = read_typed_csv(initial_state_filename(exp_name, collector), INITIAL_STATE_SCHEMA)
 
-        extremes['as_path_count'] = grouped.aggregate({'as_path': count_aspaths})
-        extremes['different_ases_count'] = grouped.aggregate({'as_path': count_different_ases})
-        extremes['last_as_path_length'] = grouped.aggregate({'as_path': length_last_path_observed})
-        
-        extremes.reset_index(inplace = True)
+    if args.dataset:
+        event_dfs = read_dataset_events(exp_name, collector, False)
 
+    # Locked until written, see as_path_dictionary.py
+    path_dictionary = read_as_path_dictionary(exp_name, collector, lock=True)
 
-        extremes_A = extremes[extremes['AW']=='A']
-        extremes_W = extremes[extremes['AW']=='W']
-        
-
-        merged = extremes_A.merge(extremes_W[['monitor_ip', 'prefix' , 'min_ts', 'max_ts', 'count', 'as_path_count', 'different_ases_count', 'last_as_path_length']], 
-        left_on=['monitor_ip', 'prefix'], 
-        right_on=['monitor_ip', 'prefix'],
-        how='left', suffixes=('_A', '_W'), copy=True)
-
-        merged['event_number']=event_number
-       
-
-        filename = per_path_event_filename(exp_name, collector, event_number)
-        # Remove as_path_count_W, different_ases_count_W, last_as_path_length_W:
-        # aspaths only appear in advertisement, i.e., 'A' messages
-        merged[['monitor_ip', 'prefix' , 
-        'min_ts_A', 'max_ts_A', 'count_A', 
-        'min_ts_W', 'max_ts_W', 'count_W', 
-        'as_path_count_A', 'different_ases_count_A', 'last_as_path_length_A',
-        'event_number']].to_csv(filename, index=False)
+    for event_number in range(events_in_experiment(exp_name)):
+        first_ts, _ = event_number2timestamp_tuple(exp_name, event_number)
 
-        #print(merged[['event_number', 'as_path_count_A', 'as_path_count_W']])
\ No newline at end of file
+        if args.chunksize and not args.dataset:
+            accumulator = ExtremesAccumulator(path_dictionary)
+            try:
+                for chunk in iter_download(exp_name, collector, False, event_number, args.chunksize):
+                    accumulator.add_chunk(chunk.assign(timestamp=chunk['timestamp'] - first_ts))
+            except FileNotFoundError:
+                # debug
+                # print('download file does not exist for event: ', event_number)
+                continue
+            extremes = accumulator.extremes()
+            if extremes is None:
+                continue
+        else:
+            if args.dataset:
+                if event_number not in event_dfs:
+                    continue
+                update_df = event_dfs.pop(event_number)
+            else:
+                try:
+                    update_df = read_download(exp_name, collector, False, event_number)
+                except:
+                    # debug
+                    # print('download file does not exist for event: ', event_number)
+                    continue
+            if len(update_df) == 0:
+                # debug
+                # print('Warning, empty file for event {}, exiting (can continue with further processing steps)'.format(event_number))
+                continue
+
+            update_df['timestamp'] = update_df['timestamp'] - first_ts
+            
+            extremes = update_df2extremes(update_df, path_dictionary)
+        per_path_event_df = extremes2per_path_event(extremes, event_number)
+        if args.initial_state:
+            per_path_event_df = add_initial_state(per_path_event_df, initial_state_df)
+        write_per_path_event(per_path_event_df, exp_name, collector, event_number)
+
+    write_as_path_dictionary(path_dictionary, exp_name, collector)
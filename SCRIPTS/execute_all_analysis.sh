@@ -26,6 +26,9 @@ EXP_NAME=$1
 # execute   ./plot_error_per_collector_pair.py
 
 # analysis
+./execute_for_each_collector.sh zombie_rfd_classifier.py $EXP_NAME
 ./execute_for_each_collector.sh per_path_event_filtered2quantiles.py $EXP_NAME
 ./quantiles2quantiles_with_clock.py $EXP_NAME
+# Sensitivity to the thresholds, e.g.
+# ./per_path_event2threshold_sweep.py $EXP_NAME --rfd_thr 600 900 1200 1800 2400 --zombie_thr 3600 4500 5400 6300 7200 --anchor_lookback 300 600 900
 # ./plot_quantiles_with_clock.py 20121001_30d 20181001_30d
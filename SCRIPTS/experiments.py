@@ -10,40 +10,80 @@ initial and final day of the experiment.
 '''
 
 
-from typing import List, Tuple
+from typing import List, Optional, Tuple
+import bisect
 import calendar
+from functools import lru_cache
+import numpy as np
 import pandas as pd
 
 from experiment_specs import experiments, beacons_2009
 
 
 def beacon_list(exp_name:str) -> List[str]:
-    return [x[0][0] for x in beacons_2009]
+    return list(experiment_catalog(exp_name).beacons)
 
 
 def anchor_list(exp_name:str) -> List[str]:
-    # position [1] is anchor
-    return [x[1] for x in beacons_2009]
+    return list(experiment_catalog(exp_name).anchors)
 
 
 def collector_list(exp_name:str) -> List[str]:
-    unique = set([x[2].lower() for x in beacons_2009])
-    return list(unique)
-
-def beacons_corresponding_to_anchor(exp_name, anchor):
-    for pair in  beacons_2009:
-        if pair[1] == anchor:
-            return pair[0][0]
-
-
-# beacon2collector('20100401_30d', '84.205.71.0/24') -> rrc07
-def beacon2collector(exp_name, beacon) -> str:
-    df = pd.DataFrame(list(beacons_2009))
-    # remove the tuple in ('xxxx/pp',)
-    df[0] = df[0].map(lambda x: x[0])
-    # df[df[0] == '2001:7fb:fe04::/48'][2].values
-    # array(['RRC04'], dtype=object)
-    return df[df[0] == beacon][2].values[0].lower()
+    return list(experiment_catalog(exp_name).collectors)
+
+
+# Beacons, anchors, collectors and events of an experiment, computed once 
+# (see experiment_catalog()), with vectorized methods for Series.
+class ExperimentCatalog:
+    def __init__(self, exp_name:str):
+        self.exp_name = exp_name
+        # position [0][0] is beacon, [1] is anchor, [2] is collector
+        self.beacons = tuple(x[0][0] for x in beacons_2009)
+        self.anchors = tuple(x[1] for x in beacons_2009)
+        self.collectors = tuple(sorted(set(x[2].lower() for x in beacons_2009)))
+
+        self.anchor2beacon = {x[1]: x[0][0] for x in beacons_2009}
+
+        self._event_boundaries = None
+        self._prefix_classifier = None
+
+    def is_anchor(self, prefixes: pd.Series) -> pd.Series:
+        return prefixes.isin(self.anchors)
+
+    # NaN for prefixes that are not anchors
+    def anchors2beacons(self, prefixes: pd.Series) -> pd.Series:
+        return prefixes.map(self.anchor2beacon)
+
+    # Events are computed when first used (beacons and anchors do not
+    # depend on the dates of the experiment)
+    @property
+    def num_events(self) -> int:
+        return len(self.event_boundaries) // 2
+
+    # init, end timestamps of each event, as event_boundaries()
+    @property
+    def event_boundaries(self) -> np.ndarray:
+        if self._event_boundaries is None:
+            self._event_boundaries = np.array(event_boundaries(self.exp_name, 0, events_in_experiment(self.exp_name) - 1), dtype='i8')
+        return self._event_boundaries
+
+    # init, end timestamps of an event
+    def event_timestamps(self, event_number:int) -> Tuple[int, int]:
+        return (int(self.event_boundaries[2*event_number]), int(self.event_boundaries[2*event_number+1]))
+
+    # See prefix_classifier.py
+    @property
+    def prefix_classifier(self):
+        if self._prefix_classifier is None:
+            from prefix_classifier import prefix_classifier
+            self._prefix_classifier = prefix_classifier(self.exp_name)
+        return self._prefix_classifier
+
+
+# The catalog is built once per experiment (and process)
+@lru_cache(maxsize=None)
+def experiment_catalog(exp_name:str) -> ExperimentCatalog:
+    return ExperimentCatalog(exp_name)
 
 # split('20181002')
 #       (2018, 10, 2)
@@ -112,6 +152,48 @@ def event_number2timestamp_tuple(exp_name:str, event_number:int) -> Tuple[int, i
         int(calendar.timegm((year, month, day, hour+2, 0, 0, 0))))
 
 
+# Flat, sorted list with the init and end timestamps of events 
+# first_event..last_event (both included):
+# [init_first, end_first, init_first+1, end_first+1, ...]
+def event_boundaries(exp_name:str, first_event:int, last_event:int) -> List[int]:
+    boundaries = []
+    for event_number in range(first_event, last_event+1):
+        boundaries.extend(event_number2timestamp_tuple(exp_name, event_number))
+    return boundaries
+
+
+# Returns the event (first_event..last_event) whose 2h period contains the timestamp, 
+# or None if it is not in any of them (e.g., 08:00 to 12:00).
+# Use 'boundaries' from event_boundaries(exp_name, first_event, last_event)
+# to avoid computing them for each call.
+def timestamp2event_number(exp_name:str, timestamp:int, first_event:int, last_event:int, boundaries:Optional[List[int]] = None) -> Optional[int]:
+    if boundaries is None:
+        boundaries = event_boundaries(exp_name, first_event, last_event)
+    # Consecutive events share the boundary (end of one is init of the next), 
+    # bisect_right places the timestamp after both, i.e., in the next event.
+    position = bisect.bisect_right(boundaries, timestamp)
+    if position % 2 == 0:
+        return None
+    return first_event + int(position / 2)
+
+
+# Vectorized timestamp2event_number(): returns an array with the event 
+# (first_event..last_event) of each timestamp, -1 if it is not in any event
+def timestamps2event_numbers(exp_name:str, timestamps: np.ndarray, first_event:int, last_event:int) -> np.ndarray:
+    boundaries = experiment_catalog(exp_name).event_boundaries[2*first_event:2*(last_event+1)]
+    positions = np.searchsorted(boundaries, timestamps, side='right')
+    return np.where(positions % 2 == 1, first_event + positions // 2, -1)
+
+
+# RIS collectors dump their RIB every 8 hours (00:00, 08:00, 16:00)
+RIB_DUMP_PERIOD = 8*3600
+
+# Timestamp of the last RIB dump started before the event
+def event_number2rib_timestamp(exp_name:str, event_number:int) -> int:
+    init_timestamp, _ = event_number2timestamp_tuple(exp_name, event_number)
+    return init_timestamp - init_timestamp % RIB_DUMP_PERIOD
+
+
 # returns first update filename for a given event
 # 	updates.20121001.0600
 # Without .gz
@@ -45,12 +45,30 @@ def download_directory(exp_name:str, collector:str) -> str:
     collector_dwn_dir = test_and_create_dir_absolute_path(download_dir, collector)
     return collector_dwn_dir
 
-def download_filename(exp_name:str, collector:str, anchor:bool, event_number:int) -> str:
+# File extension for each format of the download files (see download_format.py)
+DOWNLOAD_FORMAT_EXTENSIONS = {'csv': '.csv', 'gz': '.npy.gz', 'zst': '.npy.zst'}
+
+def download_filename(exp_name:str, collector:str, anchor:bool, event_number:int, download_format:str = 'csv') -> str:
     directory = download_directory(exp_name, collector)
+    extension = DOWNLOAD_FORMAT_EXTENSIONS[download_format]
     if anchor:
-        return(directory + 'anchor_'+str(event_number)+'.csv')
+        return(directory + 'anchor_'+str(event_number)+extension)
     else:
-        return(directory + 'beacon_'+str(event_number)+'.csv')
+        return(directory + 'beacon_'+str(event_number)+extension)
+
+# All the events of a collector in a single file (see stream2event_dataset.py)
+def download_dataset_filename(exp_name:str, collector:str, anchor:bool, download_format:str = 'gz') -> str:
+    directory = download_directory(exp_name, collector)
+    extension = DOWNLOAD_FORMAT_EXTENSIONS[download_format]
+    if anchor:
+        return(directory + 'anchor_dataset'+extension)
+    else:
+        return(directory + 'beacon_dataset'+extension)
+
+# Completed download files of a collector (see download_manifest.py)
+def download_manifest_filename(exp_name:str, collector:str) -> str:
+    directory = download_directory(exp_name, collector)
+    return directory + 'download.manifest'
 
 def state_filename(exp_name:str, collector:str, anchor:bool, event_number:int) -> str:
     directory = download_directory(exp_name, collector)
@@ -88,6 +106,42 @@ def per_path_event_filtered_filename(exp_name:str, collector:str, event_number:i
     return directory + 'per_path_event_filtered_' + str(event_number) + '.csv'
 
     
+####
+# A single file per collector, with the (monitor_ip, prefix) present in 
+# the RIB dump before each event
+def initial_state_filename(exp_name:str, collector:str) -> str:
+    directory = test_and_create_dir(exp_name, 'initial_state/')
+    return directory + collector + '.csv'
+
+####
+# A single file per collector, with the AS paths observed (see as_path_dictionary.py)
+def as_path_dictionary_filename(exp_name:str, collector:str) -> str:
+    directory = test_and_create_dir(exp_name, 'as_path_dictionary/')
+    return directory + collector + '.npz'
+
+####
+# A single file per collector, with the ordered sequence of paths of each 
+# (monitor_ip, prefix, event) (see path_sequence_index.py)
+def path_sequence_index_filename(exp_name:str, collector:str) -> str:
+    directory = test_and_create_dir(exp_name, 'path_sequence_index/')
+    return directory + collector + '.npz'
+
+def path_exploration_filename(exp_name:str, collector:str) -> str:
+    directory = test_and_create_dir(exp_name, 'path_exploration/')
+    return directory + collector + '.csv'
+
+####
+# A file per collector and kind ('paths', 'ases'), with HyperLogLog sketches
+# per (monitor_ip, prefix) (see hyperloglog.py)
+def distinct_sketches_filename(exp_name:str, collector:str, kind:str) -> str:
+    directory = test_and_create_dir(exp_name, 'distinct_sketches/')
+    return directory + collector + '_' + kind + '.npz'
+
+# A single file for the experiments (in the directory of the first one)
+def distinct_counts_filename(exp_names) -> str:
+    directory = experiment_base_result_dir(exp_names[0])
+    return directory + 'distinct_counts_' + '_'.join(exp_names) + '.csv'
+
 ####
 def per_collector_event_mins_filename(exp_name:str, collector) -> str:
     base_directory = test_and_create_dir(exp_name, 'per_collector_event_mins')
@@ -117,6 +171,17 @@ def quantile_filename(exp_name: str, collector:str) -> str:
     directory  = test_and_create_dir(exp_name, 'quantiles/')
     return directory + collector + '.csv'
 
+# State of per_path_event_filtered2quantiles.py --incremental, kind is 'counts', 'sketches' or 'events'
+def quantiles_state_filename(exp_name: str, collector:str, kind:str) -> str:
+    directory  = test_and_create_dir(exp_name, 'quantiles_state/')
+    return directory + collector + '_' + kind + '.csv'
+
+# Counts or sketches of an event in the state, kept with --window to remove the event later
+def quantiles_state_event_filename(exp_name: str, collector:str, kind:str, event_number:int) -> str:
+    base_directory = test_and_create_dir(exp_name, 'quantiles_state/')
+    directory = test_and_create_dir_absolute_path(base_directory, collector)
+    return directory + kind + '_' + str(event_number) + '.csv'
+
 def zombies_filename(exp_name: str, collector:str) -> str:
     directory  = test_and_create_dir(exp_name, 'zombies/')
     return directory + collector + '.csv'
@@ -130,9 +195,17 @@ def quantiles_with_clock_filename(exp_name: str) -> str:
     directory = experiment_base_result_dir(exp_name)
     return directory + 'quantiles_with_clock.csv'
 
+# Results of per_path_event2threshold_sweep.py
+def threshold_sweep_filename(exp_name: str) -> str:
+    directory = experiment_base_result_dir(exp_name)
+    return directory + 'threshold_sweep.csv'
+
 # Directory containing ris update files
+def download_updates_basedir(exp_name:str) -> str:
+    return test_and_create_dir(exp_name, 'download_updates/')
+
 def download_updates_directory(exp_name:str, collector:str) -> str:
-    download_dir = test_and_create_dir(exp_name, 'download_updates/')
+    download_dir = download_updates_basedir(exp_name)
     collector_dwn_dir = test_and_create_dir_absolute_path(download_dir, collector)
     return collector_dwn_dir
 
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+'''
+HyperLogLog sketches, one per (monitor_ip, prefix), to estimate the number
+of distinct values (AS paths, ASes) observed for a path over an experiment
+or several experiments, in constant memory per path.
+
+Each sketch has 2^precision registers (uint8); the relative standard error
+of the estimate is about 1.04/sqrt(2^precision) (3.3% for precision 10).
+The sketch of a union is the register-wise maximum of the sketches, so that
+per-event sketches merge into per-experiment sketches, and these into
+multi-experiment sketches, with the same result as adding all the values to
+a single sketch.
+
+Values are hashed with pandas.util.hash_array(), which does not depend on the
+run (unlike hash()), so sketches of different runs and experiments can be merged:
+- AS paths are hashed without prepending, as a string ('3333 1103 12654'),
+  so that they do not depend on the ids of the dictionary of a collector
+- ASes are hashed as uint64
+
+    sketches = HyperLogLogSketches(keys_df)
+    sketches.add(key_ids, hash_values(values))
+    total = total.merge(sketches)
+    total.estimate()
+'''
+
+import os
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from ip_keys import path_key_index
+from schemas import DISTINCT_COUNTS_SCHEMA, apply_schema, concat_typed
+
+DEFAULT_PRECISION = 10
+
+KEY_COLUMNS = ['monitor_ip', 'prefix']
+
+
+# 64 bit hash of each value (strings or integers)
+def hash_values(values) -> np.ndarray:
+    values = np.asarray(values)
+    if values.dtype.kind in 'iu':
+        return pd.util.hash_array(values.astype('u8'))
+    return pd.util.hash_array(values.astype(object))
+
+
+# Number of bits needed to represent each value (0 for 0), exact for uint64
+def bit_lengths(values: np.ndarray) -> np.ndarray:
+    values = values.astype('u8')
+    high = (values >> np.uint64(32)).astype('f8')
+    low = (values & np.uint64(0xFFFFFFFF)).astype('f8')
+    # frexp(x) = (mantissa, exponent) with x = mantissa * 2**exponent, 0.5 <= mantissa < 1
+    return np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+
+
+class HyperLogLogSketches:
+    # keys: a row per sketch, with KEY_COLUMNS
+    def __init__(self, keys: pd.DataFrame, precision: int = DEFAULT_PRECISION, registers: Optional[np.ndarray] = None):
+        self.keys = apply_schema(keys[KEY_COLUMNS].reset_index(drop=True), DISTINCT_COUNTS_SCHEMA)
+        self.precision = precision
+        if registers is None:
+            registers = np.zeros((len(self.keys), 1 << precision), dtype='u1')
+        self.registers = registers
+        self.key_index = path_key_index(self.keys['monitor_ip'], self.keys['prefix'])
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    # Position of the sketch of each (monitor_ip, prefix), -1 if there is none
+    def key_ids(self, monitor_ips, prefixes) -> np.ndarray:
+        return self.key_index.get_indexer(path_key_index(monitor_ips, prefixes))
+
+    # Adds the hash of each value to the sketch of key_ids (as many as hashes)
+    def add(self, key_ids: np.ndarray, hashes: np.ndarray):
+        suffix_bits = 64 - self.precision
+        hashes = hashes.astype('u8')
+        buckets = (hashes >> np.uint64(suffix_bits)).astype('i8')
+        suffixes = hashes & np.uint64((1 << suffix_bits) - 1)
+        # Position of the leftmost 1 in the suffix (suffix_bits + 1 if it is 0)
+        ranks = (suffix_bits + 1 - bit_lengths(suffixes)).astype('u1')
+        np.maximum.at(self.registers, (key_ids, buckets), ranks)
+
+    # Sketches of the union: keys of both, registers of the same key merged
+    def merge(self, other: 'HyperLogLogSketches') -> 'HyperLogLogSketches':
+        if other.precision != self.precision:
+            raise Exception('Cannot merge sketches with precision {} and {}'.format(self.precision, other.precision))
+        keys = concat_typed([self.keys, other.keys], DISTINCT_COUNTS_SCHEMA)
+        key_index = path_key_index(keys['monitor_ip'], keys['prefix'])
+        unique_positions = np.flatnonzero(~key_index.duplicated())
+        merged = HyperLogLogSketches(keys.iloc[unique_positions], self.precision)
+        for sketches, start in ((self, 0), (other, len(self))):
+            target_ids = merged.key_index.get_indexer(key_index[start:start + len(sketches)])
+            merged.registers[target_ids] = np.maximum(merged.registers[target_ids], sketches.registers)
+        return merged
+
+    # Estimated number of distinct values of each sketch
+    def estimate(self) -> np.ndarray:
+        m = 1 << self.precision
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype('i4')), axis=1)
+        # Small range correction (linear counting): with 64 bit hashes,
+        # no large range correction is needed
+        zeros = np.count_nonzero(self.registers == 0, axis=1)
+        linear = m * np.log(m / np.maximum(zeros, 1))
+        return np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+
+    def save(self, filename: str):
+        tmp_filename = filename + '.tmp.npz'
+        np.savez_compressed(tmp_filename,
+            monitor_ips=np.array(self.keys['monitor_ip'], dtype=str),
+            prefixes=np.array(self.keys['prefix'], dtype=str),
+            precision=self.precision, registers=self.registers)
+        os.replace(tmp_filename, filename)
+
+    @classmethod
+    def load(cls, filename: str) -> 'HyperLogLogSketches':
+        with np.load(filename) as data:
+            keys = pd.DataFrame({'monitor_ip': data['monitor_ips'].astype(object), 'prefix': data['prefixes'].astype(object)})
+            return cls(keys, int(data['precision']), data['registers'])
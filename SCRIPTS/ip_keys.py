@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+'''
+Fixed-width integer keys for monitor addresses and prefixes, so that joins
+of frames with different categories (e.g., the labels of zombie_rfd_classifier.py,
+the initial state, the anchor activity) and IPv4/IPv6 splits are integer 
+operations instead of string ones. Groupbys within a frame use the codes of 
+the (monitor_ip, prefix) categoricals (see schemas.py), which are cheaper.
+
+An address is two uint64, (hi, lo): the 64 most and least significant bits
+of the IPv6 address, or hi = 0 and lo = the IPv4 address. Since an IPv4
+address and an IPv6 address can have the same (hi, lo) (e.g., ::1.2.3.4),
+keys include the address family (4 or 6).
+A prefix is the key of its network address plus its length.
+
+Each distinct value is parsed once (the categories, for categoricals);
+the keys are then mapped to all the rows.
+
+    df = add_path_keys(df)
+    df.merge(other_df, on=PATH_KEY_COLUMNS)
+    df[families(df['prefix']) == FAMILY_IPV4]
+'''
+
+import ipaddress
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+FAMILY_IPV4 = 4
+FAMILY_IPV6 = 6
+
+# Keys of the (monitor_ip, prefix) pair: the family is the family of the prefix,
+# monitors can send routes of both families through the same session
+MONITOR_KEY_COLUMNS = ['monitor_family', 'monitor_hi', 'monitor_lo']
+PREFIX_KEY_COLUMNS = ['family', 'prefix_hi', 'prefix_lo', 'prefix_length']
+PATH_KEY_COLUMNS = MONITOR_KEY_COLUMNS + PREFIX_KEY_COLUMNS
+
+MASK_64 = (1 << 64) - 1
+
+
+# codes (-1 for NaN) and distinct values, using the categories of categoricals
+def factorize(values) -> Tuple[np.ndarray, np.ndarray]:
+    if isinstance(values, pd.Series) and isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), np.asarray(values.cat.categories, dtype=object)
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    return codes, np.asarray(uniques, dtype=object)
+
+
+# Returns (family, hi, lo, length) of each distinct value; 0 for values that cannot be parsed
+def parse_networks(uniques: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # the last position is used for NaN (code -1)
+    family = np.zeros(len(uniques) + 1, dtype='u1')
+    hi = np.zeros(len(uniques) + 1, dtype='u8')
+    lo = np.zeros(len(uniques) + 1, dtype='u8')
+    length = np.zeros(len(uniques) + 1, dtype='u1')
+    for i, value in enumerate(uniques):
+        try:
+            network = ipaddress.ip_network(value, strict=False)
+        except ValueError:
+            continue
+        address = int(network.network_address)
+        family[i] = network.version
+        hi[i] = address >> 64
+        lo[i] = address & MASK_64
+        length[i] = network.prefixlen
+    return family, hi, lo, length
+
+
+# Returns (family, hi, lo) of each address
+def address_keys(addresses) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    codes, uniques = factorize(addresses)
+    family, hi, lo, _ = parse_networks(uniques)
+    return family[codes], hi[codes], lo[codes]
+
+
+# Returns (family, hi, lo, length) of each prefix
+def prefix_keys(prefixes) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    codes, uniques = factorize(prefixes)
+    family, hi, lo, length = parse_networks(uniques)
+    return family[codes], hi[codes], lo[codes], length[codes]
+
+
+# Address family (4 or 6, the family key) of each prefix (or address), 0 if it cannot be parsed
+def families(prefixes) -> np.ndarray:
+    codes, uniques = factorize(prefixes)
+    family, _, _, _ = parse_networks(uniques)
+    return family[codes]
+
+
+# Adds PATH_KEY_COLUMNS, the keys of monitor_ip and prefix
+def add_path_keys(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df['monitor_family'], df['monitor_hi'], df['monitor_lo'] = address_keys(df['monitor_ip'])
+    df['family'], df['prefix_hi'], df['prefix_lo'], df['prefix_length'] = prefix_keys(df['prefix'])
+    return df
+
+
+# The key of each (monitor_ip, prefix) as a MultiIndex, e.g., for get_indexer()
+def path_key_index(monitor_ips, prefixes) -> pd.MultiIndex:
+    return pd.MultiIndex.from_arrays(list(address_keys(monitor_ips)) + list(prefix_keys(prefixes)), names=PATH_KEY_COLUMNS)
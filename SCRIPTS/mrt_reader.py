@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+
+'''
+Reads RIS update files (MRT format, BGP4MP messages) without pybgpstream.
+Files are the ones published by RIS, e.g., 'updates.20181001.0400.gz', 
+placed in 'download_updates/COLLECTOR/' (see download_updates_directory()).
+Also reads RIB dumps ('bview.20181001.0000.gz', TABLE_DUMP_V2 or TABLE_DUMP
+format), producing elems of type 'R'; prefixes are checked before decoding 
+the entries of each prefix, so only the selected prefixes are decoded.
+
+Produces the same elems as pybgpstream (only the attributes used by 
+download.dump_elem): type ('A' or 'W'), time, peer_address, peer_asn, 
+fields['prefix'] and, for 'A', fields['as-path'].
+
+Prefixes are checked before decoding the path attributes, so updates 
+for other prefixes are discarded with little work. As in pybgpstream, 
+a prefix filter selects the prefix and its more specific prefixes.
+Several files are decompressed and decoded in parallel (one file per process).
+
+Debug usage, prints the elems of the files in the download.py format:
+./mrt_reader.py updates.20181001.0400.gz updates.20181001.0405.gz --prefix 84.205.64.0/24
+'''
+
+from argparse import ArgumentParser
+import bz2
+import gzip
+import ipaddress
+import multiprocessing
+import os
+import socket
+import struct
+import sys
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# MRT types and subtypes
+TABLE_DUMP = 12
+TABLE_DUMP_V2 = 13
+PEER_INDEX_TABLE = 1
+# TABLE_DUMP_V2 subtype -> AFI
+RIB_SUBTYPES = {2: 1, 4: 2}
+BGP4MP = 16
+BGP4MP_ET = 17
+# subtype -> size of the AS numbers in the BGP4MP header and AS_PATH
+BGP4MP_MESSAGE_SUBTYPES = {1: 2, 4: 4, 6: 2, 7: 4}
+
+BGP_UPDATE = 2
+
+# Path attribute types
+AS_PATH = 2
+MP_REACH_NLRI = 14
+MP_UNREACH_NLRI = 15
+AS4_PATH = 17
+
+AS_SET = 1
+AS_SEQUENCE = 2
+AS_CONFED_SEQUENCE = 3
+AS_CONFED_SET = 4
+AS_TRANS = 23456
+
+AFI_IPV4 = 1
+AFI_IPV6 = 2
+
+# (type, time, peer_address, peer_asn, prefix, as_path)
+# as_path is '' for withdrawals
+ElemTuple = Tuple[str, int, str, int, str, str]
+
+
+class BGPElem:
+    def __init__(self, elem_type:str, time:int, peer_address:str, peer_asn:int, fields:Dict[str, str]):
+        self.type = elem_type
+        self.time = time
+        self.peer_address = peer_address
+        self.peer_asn = peer_asn
+        self.fields = fields
+
+
+def tuple2elem(elem_tuple: ElemTuple) -> BGPElem:
+    elem_type, time, peer_address, peer_asn, prefix, as_path = elem_tuple
+    fields = {'prefix': prefix}
+    if elem_type in ('A', 'R'):
+        fields['as-path'] = as_path
+    return BGPElem(elem_type, time, peer_address, peer_asn, fields)
+
+
+# Selects prefixes equal or more specific than any of the filter prefixes
+# (all prefixes if there is no filter). Results are cached, the same few 
+# prefixes appear again and again.
+class PrefixMatcher:
+    def __init__(self, prefixes: Optional[List[str]] = None):
+        self.networks = [ipaddress.ip_network(p) for p in (prefixes or [])]
+        self.cache = {}
+
+    def __call__(self, prefix: str) -> bool:
+        if len(self.networks) == 0:
+            return True
+        selected = self.cache.get(prefix)
+        if selected is None:
+            network = ipaddress.ip_network(prefix, strict=False)
+            selected = any(network.version == n.version and network.subnet_of(n) for n in self.networks)
+            self.cache[prefix] = selected
+        return selected
+
+
+def open_mrt_file(filename: str):
+    if filename.endswith('.gz'):
+        return gzip.open(filename, 'rb')
+    elif filename.endswith('.bz2'):
+        return bz2.open(filename, 'rb')
+    return open(filename, 'rb')
+
+
+def ip2str(afi: int, data: bytes) -> str:
+    if afi == AFI_IPV4:
+        return socket.inet_ntop(socket.AF_INET, data)
+    return socket.inet_ntop(socket.AF_INET6, data)
+
+
+# Decodes the NLRI encoding (length in bits, then the minimum number of bytes)
+def decode_prefixes(afi: int, data: bytes) -> List[str]:
+    result = []
+    address_len = 4 if afi == AFI_IPV4 else 16
+    i = 0
+    while i < len(data):
+        bits = data[i]
+        nbytes = (bits + 7) >> 3
+        address = data[i+1:i+1+nbytes] + bytes(address_len - nbytes)
+        result.append(ip2str(afi, address) + '/' + str(bits))
+        i += 1 + nbytes
+    return result
+
+
+# Returns the segments of the path as a list of (segment_type, [asn, ...])
+def decode_as_path(data: bytes, asn_size: int) -> List[Tuple[int, List[int]]]:
+    segments = []
+    asn_format = '!H' if asn_size == 2 else '!I'
+    i = 0
+    while i + 2 <= len(data):
+        segment_type = data[i]
+        count = data[i+1]
+        i += 2
+        asns = [struct.unpack_from(asn_format, data, i + k*asn_size)[0] for k in range(count)]
+        i += count*asn_size
+        segments.append((segment_type, asns))
+    return segments
+
+
+def path_length(segments: List[Tuple[int, List[int]]]) -> int:
+    length = 0
+    for segment_type, asns in segments:
+        if segment_type == AS_SEQUENCE:
+            length += len(asns)
+        elif segment_type == AS_SET:
+            length += 1
+    return length
+
+
+# Reconstructs the path from AS_PATH and AS4_PATH (RFC 6793, 4.2.3)
+def merge_as4_path(segments, as4_segments):
+    length = path_length(segments)
+    length4 = path_length(as4_segments)
+    if length4 > length:
+        return segments
+    # Keep the first (length - length4) ASes of AS_PATH
+    keep = length - length4
+    result = []
+    for segment_type, asns in segments:
+        if keep <= 0:
+            break
+        if segment_type == AS_SEQUENCE:
+            result.append((segment_type, asns[:keep]))
+            keep -= len(asns[:keep])
+        elif segment_type == AS_SET:
+            result.append((segment_type, asns))
+            keep -= 1
+        else:
+            result.append((segment_type, asns))
+    return result + as4_segments
+
+
+# Same format as pybgpstream: 
+# sequences separated by spaces, sets as {a,b}, confederations as (a b) and [a,b]
+def as_path2str(segments: List[Tuple[int, List[int]]]) -> str:
+    elements = []
+    for segment_type, asns in segments:
+        if segment_type == AS_SEQUENCE:
+            elements.extend(str(asn) for asn in asns)
+        elif segment_type == AS_SET:
+            elements.append('{' + ','.join(str(asn) for asn in asns) + '}')
+        elif segment_type == AS_CONFED_SEQUENCE:
+            elements.append('(' + ' '.join(str(asn) for asn in asns) + ')')
+        elif segment_type == AS_CONFED_SET:
+            elements.append('[' + ','.join(str(asn) for asn in asns) + ']')
+    return ' '.join(elements)
+
+
+# Splits the path attributes, returns {type: value}
+def split_attributes(data: bytes) -> Dict[int, bytes]:
+    attributes = {}
+    i = 0
+    while i < len(data):
+        flags = data[i]
+        attribute_type = data[i+1]
+        if flags & 0x10:
+            length = struct.unpack_from('!H', data, i+2)[0]
+            i += 4
+        else:
+            length = data[i+2]
+            i += 3
+        attributes[attribute_type] = data[i:i+length]
+        i += length
+    return attributes
+
+
+# Decodes a BGP UPDATE message, returns the elems selected by is_selected()
+def decode_update(time: int, peer_address: str, peer_asn: int, asn_size: int, 
+        message: bytes, is_selected: PrefixMatcher) -> List[ElemTuple]:
+    result = []
+    withdrawn_len = struct.unpack_from('!H', message, 0)[0]
+    withdrawn = decode_prefixes(AFI_IPV4, message[2:2+withdrawn_len])
+    attributes_len = struct.unpack_from('!H', message, 2+withdrawn_len)[0]
+    attributes_start = 4 + withdrawn_len
+    announced = decode_prefixes(AFI_IPV4, message[attributes_start+attributes_len:])
+    attributes = split_attributes(message[attributes_start:attributes_start+attributes_len])
+
+    if MP_UNREACH_NLRI in attributes:
+        mp_unreach = attributes[MP_UNREACH_NLRI]
+        afi = struct.unpack_from('!H', mp_unreach, 0)[0]
+        withdrawn += decode_prefixes(afi, mp_unreach[3:])
+    if MP_REACH_NLRI in attributes:
+        mp_reach = attributes[MP_REACH_NLRI]
+        afi = struct.unpack_from('!H', mp_reach, 0)[0]
+        next_hop_len = mp_reach[3]
+        announced += decode_prefixes(afi, mp_reach[5+next_hop_len:])
+
+    for prefix in withdrawn:
+        if is_selected(prefix):
+            result.append(('W', time, peer_address, peer_asn, prefix, ''))
+
+    announced = [prefix for prefix in announced if is_selected(prefix)]
+    if len(announced) > 0:
+        # The AS path is decoded only if some prefix is selected
+        segments = decode_as_path(attributes.get(AS_PATH, b''), asn_size)
+        if AS4_PATH in attributes:
+            segments = merge_as4_path(segments, decode_as_path(attributes[AS4_PATH], 4))
+        as_path = as_path2str(segments)
+        for prefix in announced:
+            result.append(('A', time, peer_address, peer_asn, prefix, as_path))
+    return result
+
+
+# Iterates over the MRT records of a file as (type, subtype, timestamp, data)
+def mrt_records(filename: str) -> Iterator[Tuple[int, int, int, bytes]]:
+    with open_mrt_file(filename) as f:
+        while True:
+            header = f.read(12)
+            if len(header) < 12:
+                return
+            timestamp, mrt_type, subtype, length = struct.unpack('!IHHI', header)
+            data = f.read(length)
+            if len(data) < length:
+                print('Truncated MRT record in {}'.format(filename))
+                return
+            yield mrt_type, subtype, timestamp, data
+
+
+# Reads an update file. Returns the selected elems, in file order, as ElemTuple
+def read_update_file(filename: str, prefixes: Optional[List[str]] = None, 
+        init_timestamp: Optional[int] = None, end_timestamp: Optional[int] = None) -> List[ElemTuple]:
+    is_selected = PrefixMatcher(prefixes)
+    result = []
+    for mrt_type, subtype, timestamp, data in mrt_records(filename):
+        if mrt_type not in (BGP4MP, BGP4MP_ET) or subtype not in BGP4MP_MESSAGE_SUBTYPES:
+            # State changes, RIB dumps, add-path messages, etc.
+            continue
+        if (init_timestamp is not None and timestamp < init_timestamp) or (end_timestamp is not None and timestamp > end_timestamp):
+            continue
+        if mrt_type == BGP4MP_ET:
+            # microseconds
+            data = data[4:]
+
+        asn_size = BGP4MP_MESSAGE_SUBTYPES[subtype]
+        if asn_size == 2:
+            peer_asn, _, _, afi = struct.unpack_from('!HHHH', data, 0)
+        else:
+            peer_asn, _, _, afi = struct.unpack_from('!IIHH', data, 0)
+        i = 2*asn_size + 4
+        address_len = 4 if afi == AFI_IPV4 else 16
+        peer_address = ip2str(afi, data[i:i+address_len])
+        # skip local address
+        i += 2*address_len
+
+        # BGP message: marker (16), length (2), type (1)
+        if data[i+18] != BGP_UPDATE:
+            continue
+        result.extend(decode_update(timestamp, peer_address, peer_asn, asn_size, data[i+19:], is_selected))
+    return result
+
+
+def read_update_file_star(arguments) -> List[ElemTuple]:
+    return read_update_file(*arguments)
+
+
+# Returns the peers of a TABLE_DUMP_V2 PEER_INDEX_TABLE as a list of (peer_address, peer_asn)
+def decode_peer_index_table(data: bytes) -> List[Tuple[str, int]]:
+    view_name_len = struct.unpack_from('!H', data, 4)[0]
+    i = 6 + view_name_len
+    peer_count = struct.unpack_from('!H', data, i)[0]
+    i += 2
+    peers = []
+    for _ in range(peer_count):
+        peer_type = data[i]
+        # skip BGP ID
+        i += 5
+        if peer_type & 0x01:
+            peer_address = ip2str(AFI_IPV6, data[i:i+16])
+            i += 16
+        else:
+            peer_address = ip2str(AFI_IPV4, data[i:i+4])
+            i += 4
+        if peer_type & 0x02:
+            peer_asn = struct.unpack_from('!I', data, i)[0]
+            i += 4
+        else:
+            peer_asn = struct.unpack_from('!H', data, i)[0]
+            i += 2
+        peers.append((peer_address, peer_asn))
+    return peers
+
+
+def rib_as_path(attributes_data: bytes, asn_size: int) -> str:
+    attributes = split_attributes(attributes_data)
+    segments = decode_as_path(attributes.get(AS_PATH, b''), asn_size)
+    if AS4_PATH in attributes:
+        segments = merge_as4_path(segments, decode_as_path(attributes[AS4_PATH], 4))
+    return as_path2str(segments)
+
+
+# Reads a RIB dump. Returns the entries of the selected prefixes as 
+# ElemTuple of type 'R' (time is the time of the MRT record)
+def read_rib_file(filename: str, prefixes: Optional[List[str]] = None) -> List[ElemTuple]:
+    is_selected = PrefixMatcher(prefixes)
+    peers = []
+    result = []
+    for mrt_type, subtype, timestamp, data in mrt_records(filename):
+        if mrt_type == TABLE_DUMP_V2 and subtype == PEER_INDEX_TABLE:
+            peers = decode_peer_index_table(data)
+
+        elif mrt_type == TABLE_DUMP_V2 and subtype in RIB_SUBTYPES:
+            # sequence number (4), prefix length (1), prefix
+            bits = data[4]
+            nbytes = (bits + 7) >> 3
+            prefix = decode_prefixes(RIB_SUBTYPES[subtype], data[4:5+nbytes])[0]
+            if not is_selected(prefix):
+                continue
+            i = 5 + nbytes
+            entry_count = struct.unpack_from('!H', data, i)[0]
+            i += 2
+            for _ in range(entry_count):
+                peer_index, _, attributes_len = struct.unpack_from('!HIH', data, i)
+                i += 8
+                peer_address, peer_asn = peers[peer_index]
+                as_path = rib_as_path(data[i:i+attributes_len], 4)
+                i += attributes_len
+                result.append(('R', timestamp, peer_address, peer_asn, prefix, as_path))
+
+        elif mrt_type == TABLE_DUMP and subtype in (AFI_IPV4, AFI_IPV6):
+            # view (2), sequence (2), prefix, prefix length (1), status (1), originated (4), 
+            # peer address, peer AS (2), attribute length (2)
+            address_len = 4 if subtype == AFI_IPV4 else 16
+            bits = data[4+address_len]
+            prefix = ip2str(subtype, data[4:4+address_len]) + '/' + str(bits)
+            if not is_selected(prefix):
+                continue
+            i = 10 + address_len
+            peer_address = ip2str(subtype, data[i:i+address_len])
+            i += address_len
+            peer_asn, attributes_len = struct.unpack_from('!HH', data, i)
+            i += 4
+            as_path = rib_as_path(data[i:i+attributes_len], 2)
+            result.append(('R', timestamp, peer_address, peer_asn, prefix, as_path))
+    return result
+
+
+def read_rib_file_star(arguments) -> List[ElemTuple]:
+    return read_rib_file(*arguments)
+
+
+# Reads several RIB dumps, decoding them in parallel.
+def read_rib_files(filenames: List[str], prefixes: Optional[List[str]] = None, 
+        processes: Optional[int] = None) -> Iterator[BGPElem]:
+    if processes is None:
+        processes = os.cpu_count()
+    if multiprocessing.current_process().daemon:
+        processes = 1
+    processes = min(processes, len(filenames))
+
+    arguments = [(fn, prefixes) for fn in filenames]
+    if processes <= 1:
+        for file_elems in map(read_rib_file_star, arguments):
+            for elem_tuple in file_elems:
+                yield tuple2elem(elem_tuple)
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            for file_elems in pool.imap(read_rib_file_star, arguments):
+                for elem_tuple in file_elems:
+                    yield tuple2elem(elem_tuple)
+
+
+# Reads several update files, decoding them in parallel. 
+# Elems are returned in the order of the files.
+def read_update_files(filenames: List[str], prefixes: Optional[List[str]] = None, 
+        init_timestamp: Optional[int] = None, end_timestamp: Optional[int] = None, 
+        processes: Optional[int] = None) -> Iterator[BGPElem]:
+    if processes is None:
+        processes = os.cpu_count()
+    # Processes of a multiprocessing.Pool (e.g., download_scheduler.py) cannot start new processes
+    if multiprocessing.current_process().daemon:
+        processes = 1
+    processes = min(processes, len(filenames))
+
+    arguments = [(fn, prefixes, init_timestamp, end_timestamp) for fn in filenames]
+    if processes <= 1:
+        for file_elems in map(read_update_file_star, arguments):
+            for elem_tuple in file_elems:
+                yield tuple2elem(elem_tuple)
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            for file_elems in pool.imap(read_update_file_star, arguments):
+                for elem_tuple in file_elems:
+                    yield tuple2elem(elem_tuple)
+
+
+# ./mrt_reader.py updates.20181001.0400.gz --prefix 84.205.64.0/24 --prefix 84.205.80.0/24
+# ./mrt_reader.py bview.20181001.0000.gz --ribs --prefix 84.205.64.0/24
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("filenames", nargs='+')
+    parser.add_argument("--prefix", help="prefix to select (can be repeated), all prefixes if not set", action='append')
+    parser.add_argument("--processes", type=int)
+    parser.add_argument("--ribs", help="files are RIB dumps", action='store_true')
+
+    args= parser.parse_args()
+
+    from download import dump_elem
+
+    if args.ribs:
+        for elem in read_rib_files(args.filenames, args.prefix, processes=args.processes):
+            print(','.join((elem.type, str(elem.time), elem.peer_address, str(elem.peer_asn), elem.fields['prefix'], elem.fields['as-path'])))
+    else:
+        for elem in read_update_files(args.filenames, args.prefix, processes=args.processes):
+            dump_elem(sys.stdout, elem)
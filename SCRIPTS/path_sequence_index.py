@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+'''
+Ordered sequence of the updates received for each (monitor_ip, prefix, event),
+as integer arrays, so that path exploration can be analysed for a whole
+experiment without reading the download files again.
+
+Sequences are stored as in a CSR matrix: the updates of sequence i are
+positions offsets[i]:offsets[i+1] of
+- path_ids: path id of each advertisement in the AS path dictionary of the
+  collector (see as_path_dictionary.py), WITHDRAWAL (-1) for withdrawals
+- arrivals: timestamp of the update, relative to the start of the event
+and keys has a row per sequence with monitor_ip, prefix and event_number.
+Updates of a sequence are in order of arrival (for the same timestamp, in
+the order of the download file).
+
+Path ids refer to the dictionary of the collector, which only grows: the
+index remains valid after the dictionary is updated by other runs (but do
+not run downloaded2path_sequence_index.py and downloaded2per_path_event.py
+for the same collector at the same time).
+
+The index of each collector is in 'path_sequence_index/COLLECTOR.npz',
+generated by downloaded2path_sequence_index.py; metrics() computes the
+path exploration of each sequence (see path_sequence_index2path_exploration.py).
+
+Shows the size of the index of a collector:
+    ./path_sequence_index.py 20181001_30d rrc00
+'''
+
+from argparse import ArgumentParser
+import os
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from as_path_dictionary import ASPathDictionary
+from downloaded2per_path_event import count_distinct_per_group
+from filenames_directories import path_sequence_index_filename
+from schemas import PATH_EXPLORATION_SCHEMA, apply_schema, concat_typed
+
+WITHDRAWAL = -1
+
+KEY_COLUMNS = ['monitor_ip', 'prefix', 'event_number']
+
+
+class PathSequenceIndex:
+    def __init__(self, keys: pd.DataFrame, offsets: np.ndarray, path_ids: np.ndarray, arrivals: np.ndarray):
+        self.keys = apply_schema(keys[KEY_COLUMNS].reset_index(drop=True), PATH_EXPLORATION_SCHEMA)
+        self.offsets = offsets.astype('i8')
+        self.path_ids = path_ids.astype('i4')
+        self.arrivals = arrivals.astype('i4')
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def sequence_lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    # Sequence of each update
+    def sequence_ids(self) -> np.ndarray:
+        return np.repeat(np.arange(len(self)), self.sequence_lengths())
+
+    # The updates of an event (update_df, timestamps relative to the start
+    # of the event); AS paths are encoded with path_dictionary
+    @classmethod
+    def from_updates(cls, update_df: pd.DataFrame, event_number: int, path_dictionary: ASPathDictionary) -> 'PathSequenceIndex':
+        # Stable sort: updates with the same timestamp keep the order of the file
+        update_df = update_df.sort_values(['monitor_ip', 'prefix', 'timestamp'], kind='mergesort')
+        grouped = update_df.groupby(['monitor_ip', 'prefix'], sort=True, observed=True)
+        keys = grouped.size().reset_index()[['monitor_ip', 'prefix']]
+        keys['event_number'] = event_number
+        offsets = np.concatenate(([0], np.cumsum(grouped.size().to_numpy())))
+
+        # Only advertisements have AS paths
+        path_ids = np.full(len(update_df), WITHDRAWAL, dtype='i8')
+        with_path = update_df['as_path'].notna().to_numpy()
+        path_ids[with_path] = path_dictionary.encode(update_df['as_path'].to_numpy()[with_path])
+        return cls(keys, offsets, path_ids, update_df['timestamp'].to_numpy())
+
+    @classmethod
+    def concat(cls, indexes: List['PathSequenceIndex']) -> 'PathSequenceIndex':
+        if len(indexes) == 0:
+            return cls(pd.DataFrame(columns=KEY_COLUMNS), np.zeros(1), np.zeros(0), np.zeros(0))
+        starts = np.cumsum([0] + [len(index.path_ids) for index in indexes])
+        offsets = np.concatenate([[0]] + [index.offsets[1:] + start for index, start in zip(indexes, starts)])
+        return cls(concat_typed([index.keys for index in indexes], PATH_EXPLORATION_SCHEMA), offsets,
+            np.concatenate([index.path_ids for index in indexes]), np.concatenate([index.arrivals for index in indexes]))
+
+    # Path exploration of each sequence, one row per sequence (keys plus):
+    # - announcements, withdrawals: number of updates of each type
+    # - path_hunting_length: paths announced, counting consecutive
+    #   advertisements of the same path (e.g., duplicates) once
+    # - distinct_paths: different paths announced
+    # - oscillations: times a path announced before is announced again after
+    #   other paths or a withdrawal (path_hunting_length - distinct_paths)
+    # - first_arrival, last_arrival
+    # - time_to_final_path: arrival of the first update of the final state (the
+    #   last path announced, without further changes, or the final withdrawal)
+    # - final_withdrawn: 1 if the sequence ends with a withdrawal
+    # With no_prepending, paths that only differ in prepending are the same path.
+    def metrics(self, path_dictionary: Optional[ASPathDictionary] = None, no_prepending: bool = False) -> pd.DataFrame:
+        states = self.path_ids.astype('i8')
+        if no_prepending:
+            announced = states != WITHDRAWAL
+            states = np.where(announced, path_dictionary.noprep_ids[np.where(announced, states, 0)], WITHDRAWAL)
+        num_sequences = len(self)
+        sequence_ids = self.sequence_ids()
+        announced = states != WITHDRAWAL
+
+        # An update starts a run if its state differs from the previous update of the sequence
+        run_starts = np.ones(len(states), dtype=bool)
+        run_starts[1:] = (states[1:] != states[:-1]) | (sequence_ids[1:] != sequence_ids[:-1])
+        run_positions = np.flatnonzero(run_starts)
+        last_run_positions = run_positions[np.searchsorted(sequence_ids[run_positions], np.arange(num_sequences), side='right') - 1]
+        last_positions = self.offsets[1:] - 1
+
+        metrics_df = self.keys.copy()
+        metrics_df['announcements'] = np.bincount(sequence_ids[announced], minlength=num_sequences)
+        metrics_df['withdrawals'] = np.bincount(sequence_ids[~announced], minlength=num_sequences)
+        metrics_df['path_hunting_length'] = np.bincount(sequence_ids[run_starts & announced], minlength=num_sequences)
+        metrics_df['distinct_paths'] = count_distinct_per_group(sequence_ids[announced], states[announced], num_sequences)
+        metrics_df['oscillations'] = metrics_df['path_hunting_length'] - metrics_df['distinct_paths']
+        metrics_df['first_arrival'] = self.arrivals[self.offsets[:-1]]
+        metrics_df['last_arrival'] = self.arrivals[last_positions]
+        metrics_df['time_to_final_path'] = self.arrivals[last_run_positions]
+        metrics_df['final_withdrawn'] = (states[last_positions] == WITHDRAWAL).astype(int)
+        return apply_schema(metrics_df, PATH_EXPLORATION_SCHEMA)
+
+    def save(self, filename: str):
+        tmp_filename = filename + '.tmp.npz'
+        np.savez_compressed(tmp_filename,
+            monitor_ip_categories=np.array(self.keys['monitor_ip'].cat.categories, dtype=str),
+            monitor_ip_codes=self.keys['monitor_ip'].cat.codes.to_numpy(),
+            prefix_categories=np.array(self.keys['prefix'].cat.categories, dtype=str),
+            prefix_codes=self.keys['prefix'].cat.codes.to_numpy(),
+            event_numbers=self.keys['event_number'].to_numpy(),
+            offsets=self.offsets, path_ids=self.path_ids, arrivals=self.arrivals)
+        os.replace(tmp_filename, filename)
+
+    @classmethod
+    def load(cls, filename: str) -> 'PathSequenceIndex':
+        with np.load(filename) as data:
+            keys = pd.DataFrame({
+                'monitor_ip': pd.Categorical.from_codes(data['monitor_ip_codes'], [str(value) for value in data['monitor_ip_categories']]),
+                'prefix': pd.Categorical.from_codes(data['prefix_codes'], [str(value) for value in data['prefix_categories']]),
+                'event_number': data['event_numbers']})
+            return cls(keys, data['offsets'], data['path_ids'], data['arrivals'])
+
+
+def read_path_sequence_index(exp_name:str, collector:str) -> PathSequenceIndex:
+    return PathSequenceIndex.load(path_sequence_index_filename(exp_name, collector))
+
+
+def write_path_sequence_index(index: PathSequenceIndex, exp_name:str, collector:str):
+    index.save(path_sequence_index_filename(exp_name, collector))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("exp_name")
+    parser.add_argument("collector")
+
+    args= parser.parse_args()
+    index = read_path_sequence_index(args.exp_name, args.collector)
+    print('{} {}: {} sequences, {} updates, {} events'.format(args.exp_name, args.collector,
+        len(index), len(index.path_ids), index.keys['event_number'].nunique()))
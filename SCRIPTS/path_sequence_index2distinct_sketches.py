@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+'''
+Reads the path sequence index of a collector (from downloaded2path_sequence_index.py)
+and generates HyperLogLog sketches (see hyperloglog.py) per (monitor_ip, prefix)
+of the distinct AS paths (without prepending) and of the distinct ASes
+announced over the whole experiment, in
+'distinct_sketches/COLLECTOR_paths.npz' and 'distinct_sketches/COLLECTOR_ases.npz'.
+
+The values of each event are added to the sketches of the experiment one
+event at a time (the same as merging per-event sketches), so memory does
+not grow with the number of events.
+With --down, only DOWN events (odd event numbers), as the _DOWN columns of
+quantiles/ ('COLLECTOR_paths_DOWN.npz', 'COLLECTOR_ases_DOWN.npz').
+
+The sketches of several collectors and experiments are merged by
+distinct_sketches2distinct_counts.py.
+
+    ./path_sequence_index2distinct_sketches.py 20181001_30d rrc00
+'''
+
+from argparse import ArgumentParser
+
+import numpy as np
+import pandas as pd
+
+from as_path_dictionary import ASPathDictionary, read_as_path_dictionary
+from filenames_directories import distinct_sketches_filename
+from hyperloglog import DEFAULT_PRECISION, HyperLogLogSketches, hash_values
+from path_sequence_index import WITHDRAWAL, read_path_sequence_index
+
+
+# Hash of each path (ids of path_dictionary), once prepending is removed
+def noprep_path_hashes(path_dictionary: ASPathDictionary, path_ids: np.ndarray) -> np.ndarray:
+    noprep_paths = [' '.join(str(asn) for asn in dict.fromkeys(path_dictionary.ases[path_dictionary.offsets[path_id]:path_dictionary.offsets[path_id+1]].tolist()))
+        for path_id in path_ids]
+    return hash_values(np.array(noprep_paths, dtype=object))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("exp_name")
+    parser.add_argument("collector")
+    parser.add_argument("--down", help="only DOWN events", action='store_true')
+    parser.add_argument("--precision", help="2^PRECISION registers per sketch", type=int, default=DEFAULT_PRECISION)
+
+    args= parser.parse_args()
+    exp_name = args.exp_name
+    collector = args.collector
+
+    index = read_path_sequence_index(exp_name, collector)
+    path_dictionary = read_as_path_dictionary(exp_name, collector)
+
+    keys = index.keys[['monitor_ip', 'prefix']].drop_duplicates()
+    path_sketches = HyperLogLogSketches(keys, args.precision)
+    as_sketches = HyperLogLogSketches(keys, args.precision)
+
+    # Sketch of each sequence, and the (sketch, path id) of each announcement
+    sequence_key_ids = path_sketches.key_ids(index.keys['monitor_ip'], index.keys['prefix'])
+    announced = index.path_ids != WITHDRAWAL
+    update_key_ids = sequence_key_ids[index.sequence_ids()][announced]
+    update_event_numbers = np.repeat(index.keys['event_number'].to_numpy(), index.sequence_lengths())[announced]
+    update_path_ids = index.path_ids[announced].astype('i8')
+
+    # Each distinct path is hashed once
+    unique_path_ids, path_codes = np.unique(update_path_ids, return_inverse=True)
+    path_hashes = noprep_path_hashes(path_dictionary, unique_path_ids)
+
+    event_numbers = np.unique(update_event_numbers)
+    if args.down:
+        event_numbers = event_numbers[event_numbers % 2 == 1]
+    for event_number in event_numbers:
+        in_event = update_event_numbers == event_number
+        pairs = pd.DataFrame({'key_id': update_key_ids[in_event], 'path_code': path_codes[in_event]}).drop_duplicates()
+        key_ids = pairs['key_id'].to_numpy()
+        path_sketches.add(key_ids, path_hashes[pairs['path_code'].to_numpy()])
+
+        ases, positions = path_dictionary.explode(unique_path_ids[pairs['path_code'].to_numpy()])
+        as_pairs = pd.DataFrame({'key_id': key_ids[positions], 'asn': ases}).drop_duplicates()
+        as_sketches.add(as_pairs['key_id'].to_numpy(), hash_values(as_pairs['asn'].to_numpy()))
+
+    suffix = '_DOWN' if args.down else ''
+    path_sketches.save(distinct_sketches_filename(exp_name, collector, 'paths' + suffix))
+    as_sketches.save(distinct_sketches_filename(exp_name, collector, 'ases' + suffix))
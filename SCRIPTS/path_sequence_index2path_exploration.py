@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+
+'''
+Reads the path sequence index of a collector (from downloaded2path_sequence_index.py)
+and computes the path exploration of each (monitor_ip, prefix, event),
+vectorized for all the events of the experiment (see PathSequenceIndex.metrics()).
+
+Generates a single file per collector, 'path_exploration/COLLECTOR.csv':
+monitor_ip,prefix,event_number,announcements,withdrawals,path_hunting_length,distinct_paths,oscillations,first_arrival,last_arrival,time_to_final_path,final_withdrawn
+12.0.1.63,84.205.64.0/24,1,3,1,2,2,0,7,41,41,1
+
+Timestamps are relative to the start of the event.
+With --no_prepending, paths that only differ in prepending count as the same path.
+
+    ./path_sequence_index2path_exploration.py 20181001_30d rrc00
+'''
+
+from argparse import ArgumentParser
+
+from as_path_dictionary import read_as_path_dictionary
+from filenames_directories import path_exploration_filename
+from path_sequence_index import read_path_sequence_index
+from schemas import PATH_EXPLORATION_SCHEMA, write_typed_csv
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("exp_name")
+    parser.add_argument("collector")
+    parser.add_argument("--no_prepending", help="paths that only differ in prepending are the same path", action='store_true')
+
+    args= parser.parse_args()
+    exp_name = args.exp_name
+    collector = args.collector
+
+    index = read_path_sequence_index(exp_name, collector)
+    path_dictionary = read_as_path_dictionary(exp_name, collector) if args.no_prepending else None
+    metrics_df = index.metrics(path_dictionary, args.no_prepending)
+    write_typed_csv(metrics_df, path_exploration_filename(exp_name, collector), PATH_EXPLORATION_SCHEMA, index=False)
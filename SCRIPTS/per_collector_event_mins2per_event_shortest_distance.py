@@ -32,6 +32,7 @@ import networkx as nx
 
 from experiments import collector_list
 from filenames_directories import per_collector_event_mins_filename, per_event_shortest_distance_filename
+from schemas import PER_COLLECTOR_EVENT_MINS_SCHEMA, PER_EVENT_SHORTEST_DISTANCE_SCHEMA, read_typed_csv, write_typed_csv
 
 
 
@@ -63,8 +64,8 @@ def max_time_collector_pair_df(collector1: str, collector2:str) -> pd.DataFrame:
     clock_synch_fn_2 = per_collector_event_mins_filename(args.exp_name, collector2)
 
     try:
-        min_collector_1 = pd.read_csv(clock_synch_fn_1)
-        min_collector_2 = pd.read_csv(clock_synch_fn_2)
+        min_collector_1 = read_typed_csv(clock_synch_fn_1, PER_COLLECTOR_EVENT_MINS_SCHEMA)
+        min_collector_2 = read_typed_csv(clock_synch_fn_2, PER_COLLECTOR_EVENT_MINS_SCHEMA)
     except:
         print('no data for either {} or {}'.format(clock_synch_fn_1, clock_synch_fn_2))
         return pd.DataFrame()
@@ -142,11 +143,15 @@ if __name__ == "__main__":
 
     by_event_number = direct_collector_distance_per_event_df.groupby('event_number')
     distance_df =   by_event_number.apply(shortest_distance)
+    # Since pandas 3, the grouping column is not passed to shortest_distance(), it is only in the index
+    if 'event_number' not in distance_df.columns:
+        distance_df.insert(2, 'event_number', distance_df.index.get_level_values('event_number'))
+    distance_df = distance_df.reset_index(drop=True)
     
     worse_d = distance_df[distance_df['weight'] != distance_df['shortest_distance']]
     print('Total entries {}, with worse direct distance: {} (fraction {})'.format(len(distance_df), len(worse_d), len(worse_d)/len(distance_df)))
 
     fn = per_event_shortest_distance_filename(exp_name)
-    distance_df.to_csv(fn, index=False)
+    write_typed_csv(distance_df, fn, PER_EVENT_SHORTEST_DISTANCE_SCHEMA, index=False)
 
     
\ No newline at end of file
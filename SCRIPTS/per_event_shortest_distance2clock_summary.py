@@ -15,10 +15,10 @@ that contains different percentile values per collector_1/collector_2 pairs, onl
 Also print some general stats.
 
 '''
-import pandas as pd
 from argparse import ArgumentParser
 
 from filenames_directories import per_event_shortest_distance_filename, per_experiment_clock_synch_filename
+from schemas import CLOCK_SCHEMA, PER_EVENT_SHORTEST_DISTANCE_SCHEMA, read_typed_csv, write_typed_csv
 
 # ./per_event_shortest_distance2clock_summary.py 20090101_30d --only_DOWN
 if __name__ == "__main__":
@@ -35,7 +35,7 @@ if __name__ == "__main__":
     exp_name = args.exp_name
 
     time_fn = per_event_shortest_distance_filename(exp_name)
-    time_df = pd.read_csv(time_fn)
+    time_df = read_typed_csv(time_fn, PER_EVENT_SHORTEST_DISTANCE_SCHEMA)
 
     time_df = time_df[time_df['shortest_distance'] < 100]
 
@@ -47,7 +47,7 @@ if __name__ == "__main__":
     elif args.only_DOWN:
         time_df = time_df[time_df['event_number']%2 == 1]
 
-    grouped = time_df.groupby(['collector_1', 'collector_2']) 
+    grouped = time_df.groupby(['collector_1', 'collector_2'], observed=True) 
     res_df = grouped.aggregate({'shortest_distance': lambda serie: serie.min()})
 
     res_df['p_50'] = grouped.aggregate({'shortest_distance': lambda serie: serie.quantile(0.5, 'lower')})
@@ -61,7 +61,7 @@ if __name__ == "__main__":
 
     
     out_fn = per_experiment_clock_synch_filename(exp_name, args.only_UP, args.only_DOWN)
-    res_df.to_csv(out_fn)
+    write_typed_csv(res_df, out_fn, CLOCK_SCHEMA)
 
     # general stats
     print('Total number of pairs {}'.format(len(res_df)))
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 
 ''' 
-Reads beacon info from "per_path_event/" and anchor info from "download/".
+Reads beacon info from "per_path_event/" and anchor info from "download/" 
+(in any of the formats of download_format.py).
 Removes entries for (beacon, prefix) with activity in
 (corresponding anchor, prefix), i.e., for the path, 
 in the same event or in the last 10 minutes of the previous event.
@@ -10,6 +11,18 @@ Also performs a simple clock_synch test: looks for activity in the
 beacon file for the last minute of the period, and prints it if it exists.
 If they exist, it removes them.
 
+Anchor activity is read once for the whole experiment into an 
+AnchorActivityIndex: a bitset per (monitor_ip, beacon prefix), with a bit 
+per event set if the anchor of the beacon had activity in the event or in 
+the last 10 minutes of the previous event. Then all the events of 
+the collector are filtered with a single mask. An event without anchor 
+file (or not in the anchor dataset) cannot be filtered: it is skipped, 
+with a warning, and no per_path_event_filtered file is written for it. The index can hold the 
+bitsets of several lookbacks (instead of 10 minutes) from a single read of 
+the anchor files (see per_path_event2threshold_sweep.py).
+With --dataset, anchor activity is read from the anchor dataset of the 
+collector (see stream2event_dataset.py).
+
 Filters prefixes as 0/0, ::/0 (these prefixes appear even if 
 pybgpstream has been configured not to download them.)
 Also excludes data from rrc16 (if downloaded)
@@ -24,85 +37,179 @@ monitor_ip,prefix,min_ts_A,max_ts_A,count_A,min_ts_W,max_ts_W,count_W,as_path_co
 '''
 
 from argparse import ArgumentParser
+from typing import Iterator, List, Optional, Tuple
+import numpy as np
 import pandas as pd
 
 
-from filenames_directories import download_filename, per_path_event_directory, per_path_event_filtered_filename
-from experiments import beacons_corresponding_to_anchor, beacon_list, events_in_experiment, event_number2timestamp_tuple 
+from filenames_directories import per_path_event_directory, per_path_event_filtered_filename
+from download_format import read_dataset_events, read_download
+from experiments import ExperimentCatalog, experiment_catalog
+from prefix_classifier import ROLE_BEACON
+from ip_keys import path_key_index
+from schemas import PER_PATH_EVENT_SCHEMA, concat_typed, read_typed_csv, write_typed_csv
+
+# Anchor updates in the last ANCHOR_LOOKBACK seconds of an event are also
+# considered activity in the next event
+ANCHOR_LOOKBACK = 600
+
+PER_PATH_EVENT_FILTERED_COLUMNS = ['monitor_ip','prefix','min_ts_A','max_ts_A','count_A','min_ts_W','max_ts_W','count_W',
+    'as_path_count_A', 
+    'different_ases_count_A',
+    'last_as_path_length_A',
+    'event_number'
+    ]
+
+
+# For each event with an anchor file: (event_number, DataFrame with the 
+# distinct (monitor_ip, prefix) with activity in the event, with age -inf, 
+# DataFrame with those with activity in the last max_lookback seconds of 
+# the event, i.e., activity in the next event, with age the seconds from 
+# its last update to the end of the event, None for the last event)
+# If dataset is set, the events are taken from the anchor dataset of the 
+# collector (see stream2event_dataset.py) instead of a file per event.
+def anchor_activity_per_event(exp_name:str, collector:str, max_lookback:int = ANCHOR_LOOKBACK, 
+        dataset:bool = False) -> Iterator[Tuple[int, pd.DataFrame, Optional[pd.DataFrame]]]:
+    catalog = experiment_catalog(exp_name)
+    if dataset:
+        event_dfs = read_dataset_events(exp_name, collector, True)
+    for event_number in range(catalog.num_events):
+        # The file may not exist (e.g., not downloaded)
+        if dataset:
+            if event_number not in event_dfs:
+                continue
+            anchor_df = event_dfs.pop(event_number)
+        else:
+            try:
+                anchor_df = read_download(exp_name, collector, True, event_number)
+            except FileNotFoundError:
+                continue
+        _, last_ts = catalog.event_timestamps(event_number)
+        lookback_df = None
+        if event_number + 1 < catalog.num_events:
+            lookback_df = anchor_df[anchor_df['timestamp'] > (last_ts - max_lookback)]
+            lookback_df = lookback_df[['monitor_ip', 'prefix']].assign(age=last_ts - lookback_df['timestamp'])
+            lookback_df = lookback_df.groupby(['monitor_ip', 'prefix'], sort=False, observed=True)['age'].min().reset_index()
+        yield event_number, anchor_df[['monitor_ip', 'prefix']].drop_duplicates().assign(age=-np.inf), lookback_df
+
+
+# One bitset per lookback and (monitor_ip, beacon prefix) (integer keys, see ip_keys.py), 
+# with a bit per event: 1 if the anchor corresponding to the beacon was active 
+# for the monitor in the event (or in the last lookback seconds of the previous one).
+# The anchor files are read once for all the lookbacks.
+class AnchorActivityIndex:
+    def __init__(self, exp_name:str, collector:str, lookbacks: List[int] = [ANCHOR_LOOKBACK], dataset:bool = False):
+        self.num_events = experiment_catalog(exp_name).num_events
+        self.lookbacks = list(lookbacks)
+        # True for the events with an anchor file
+        self.with_anchor_data = np.zeros(self.num_events, dtype=bool)
+
+        frames = []
+        for event_number, activity_df, lookback_df in anchor_activity_per_event(exp_name, collector, max(self.lookbacks), dataset):
+            self.with_anchor_data[event_number] = True
+            frames.append(activity_df.assign(event_number=event_number))
+            if lookback_df is not None:
+                frames.append(lookback_df.assign(event_number=event_number + 1))
+        if len(frames) > 0:
+            activity = pd.concat(frames, ignore_index=True)
+        else:
+            activity = pd.DataFrame({'monitor_ip': [], 'prefix': [], 'age': [], 'event_number': []})
+        activity['beacon_prefix'] = experiment_catalog(exp_name).anchors2beacons(activity['prefix'])
+        activity = activity.dropna(subset=['beacon_prefix'])
+
+        activity_keys = path_key_index(activity['monitor_ip'], activity['beacon_prefix'])
+        self.keys = activity_keys.unique()
+        key_ids = self.keys.get_indexer(activity_keys)
+        event_numbers = activity['event_number'].to_numpy(dtype=int)
+        ages = activity['age'].to_numpy(dtype=float)
+        bits = np.zeros((len(self.lookbacks), len(self.keys), self.num_events), dtype=bool)
+        for i, lookback in enumerate(self.lookbacks):
+            recent = ages < lookback
+            bits[i, key_ids[recent], event_numbers[recent]] = True
+        self.bitsets = np.packbits(bits, axis=2)
+
+    # For each event_number, True if the event had an anchor file (otherwise 
+    # the rows of the event cannot be filtered)
+    def has_anchor_data(self, event_numbers) -> np.ndarray:
+        return self.with_anchor_data[np.asarray(event_numbers, dtype=int)]
+
+    # For each (monitor_ip, beacon prefix, event_number), True if the anchor was active
+    def active(self, monitor_ips, beacon_prefixes, event_numbers, lookback:int = ANCHOR_LOOKBACK) -> np.ndarray:
+        if lookback not in self.lookbacks:
+            raise Exception('Anchor activity not computed for lookback {}'.format(lookback))
+        bitsets = self.bitsets[self.lookbacks.index(lookback)]
+        key_ids = self.keys.get_indexer(path_key_index(monitor_ips, beacon_prefixes))
+        event_numbers = np.asarray(event_numbers, dtype=int)
+        known = key_ids >= 0
+        result = np.zeros(len(key_ids), dtype=bool)
+        packed = bitsets[key_ids[known], event_numbers[known] >> 3]
+        result[known] = (packed >> (7 - (event_numbers[known] & 7))) & 1 == 1
+        return result
+
+
+# Activity of beacons in the last minute of the period, for each row of beacon_df.
+# This could be beacons arriving 'before' being sent, indicating clock synch problems
+def last_minute_activity(catalog: ExperimentCatalog, beacon_df: pd.DataFrame) -> np.ndarray:
+    last_ts = catalog.event_boundaries[1::2][beacon_df['event_number'].to_numpy()]
+    return ((beacon_df['max_ts_A'] > (last_ts-60)) | (beacon_df['max_ts_W'] > (last_ts-60))).to_numpy()
+
 
 # ./per_path_event2per_path_event_filtered.py 20181001_30d rrc00
 if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("exp_name")
     parser.add_argument("collector")
+    parser.add_argument("--dataset", help="reads the anchor dataset of the collector (from stream2event_dataset.py) instead of a file per event", action='store_true')
 
     args= parser.parse_args()
     exp_name = args.exp_name
     collector = args.collector
 
+    catalog = experiment_catalog(exp_name)
     beacon_directory = per_path_event_directory(exp_name, collector)
-    # Initialize with empty dataframe, with len == 0
-    anchor_for_next_event_df = pd.DataFrame()
+    anchor_activity = AnchorActivityIndex(exp_name, collector, dataset=args.dataset)
 
-    for event_number in range(events_in_experiment(exp_name)):
+    beacon_frames = []
+    beacon_events = []
+    for event_number in range(catalog.num_events):
         beacon_filename = beacon_directory + 'per_path_event_' + str(event_number) +'.csv'
-
-        beacon_filtered_filename = per_path_event_filtered_filename(exp_name, collector, event_number)
-
-        # Try to read corresponding anchor file. It may not exist 
-        # (this means there was no anchor activity in this period)
-        anchor_filename = download_filename(exp_name, collector, True, event_number)
-
-
         try:
-            anchor_df = pd.read_csv(anchor_filename, names=['AW', 'timestamp','monitor_ip', 'monitor_as', 'prefix', 'as_path'])
-
-            anchor_this_event_df = anchor_df
-            if len(anchor_for_next_event_df) > 0:
-                anchor_this_event_df = pd.concat([anchor_this_event_df, anchor_for_next_event_df], ignore_index=True)
-
-            anchor_this_event_df = anchor_df.drop_duplicates(['monitor_ip', 'prefix']).copy()
-
-            # replace anchor by its corresponding beacon
-            anchor_this_event_df['beacon_prefix'] = anchor_this_event_df['prefix'].map(lambda x: beacons_corresponding_to_anchor(exp_name, x))
-
             # file has column headers
-            beacon_df = pd.read_csv(beacon_filename)
-
-            # Default routes appear sometimes in pybgpstream data, 
-            # Eg. 0.0.0.0/0, 0.0.0.0/1, ::/0
-            # Ensure only prefixes configured in the experiment specification are processed
-            beacon_df = beacon_df[beacon_df['prefix'].isin(beacon_list(exp_name))]
-
-            _, last_ts = event_number2timestamp_tuple(exp_name, event_number)
-
-            # Look for activity in beacons in the last minute of the period. 
-            # This could be beacons arriving 'before' being sent, indicating clock synch problems
-            beacon_last_min_condition = (beacon_df['max_ts_A']> (last_ts-60)) | (beacon_df['max_ts_W']> (last_ts-60))
-            if len(beacon_df[beacon_last_min_condition]) > 0:
-                print('Beacon activity in last minute of period: ',beacon_filename)
-
-            # remove events with activity in the last minute
-            beacon_df = beacon_df[~beacon_last_min_condition]
-            
-
-            # Merge to remove unwanted rows
-            # second solution, https://stackoverflow.com/questions/28901683/pandas-get-rows-which-are-not-in-other-dataframe
-            df_all = beacon_df.merge(anchor_this_event_df,left_on=['monitor_ip','prefix'], right_on=['monitor_ip','beacon_prefix'], how='left', suffixes=('', '_anchor'), indicator=True)
-
-            # select
-            filtered_beacon = df_all[df_all['_merge'] == 'left_only']
-            filtered_beacon[['monitor_ip','prefix','min_ts_A','max_ts_A','count_A','min_ts_W','max_ts_W','count_W',
-            'as_path_count_A', 
-            'different_ases_count_A',
-            'last_as_path_length_A',
-            'event_number'
-            ]].to_csv(beacon_filtered_filename, index=False)
-
-
-            # Look for updates in the last 10 mins (600 secs)
-            anchor_for_next_event_df = anchor_df[anchor_df['timestamp'] > (last_ts - 600)]
-
+            beacon_frames.append(read_typed_csv(beacon_filename, PER_PATH_EVENT_SCHEMA).assign(event_number=event_number))
+            beacon_events.append(event_number)
         except IOError:
             print('Warning, could not read file {}'.format(beacon_filename))
-            
+    if len(beacon_frames) == 0:
+        exit(0)
+    beacon_df = concat_typed(beacon_frames, PER_PATH_EVENT_SCHEMA)
+
+    # Default routes appear sometimes in pybgpstream data, 
+    # Eg. 0.0.0.0/0, 0.0.0.0/1, ::/0
+    # Ensure only prefixes configured in the experiment specification are processed
+    keep = catalog.prefix_classifier.roles(beacon_df['prefix']) == ROLE_BEACON
+
+    # Look for activity in beacons in the last minute of the period. 
+    beacon_last_min_condition = last_minute_activity(catalog, beacon_df)
+    for event_number in np.unique(beacon_df['event_number'].to_numpy()[keep & beacon_last_min_condition]):
+        print('Beacon activity in last minute of period: ', beacon_directory + 'per_path_event_' + str(event_number) +'.csv')
+
+    # Events without anchor file are skipped
+    for event_number in beacon_events:
+        if not anchor_activity.with_anchor_data[event_number]:
+            print('Warning, no anchor data for event {} ; event skipped'.format(event_number))
+    beacon_events = [event_number for event_number in beacon_events if anchor_activity.with_anchor_data[event_number]]
+
+    # remove events with activity in the last minute, and paths with anchor activity
+    keep = (keep & ~beacon_last_min_condition & anchor_activity.has_anchor_data(beacon_df['event_number'])
+        & ~anchor_activity.active(beacon_df['monitor_ip'], beacon_df['prefix'], beacon_df['event_number']))
+
+    columns = list(PER_PATH_EVENT_FILTERED_COLUMNS)
+    # Generated with downloaded2per_path_event.py --initial_state
+    if 'initial_state' in beacon_df.columns:
+        columns.append('initial_state')
+    filtered_beacon = beacon_df[keep]
+    filtered_per_event = dict(list(filtered_beacon.groupby('event_number')))
+    for event_number in beacon_events:
+        beacon_filtered_filename = per_path_event_filtered_filename(exp_name, collector, event_number)
+        filtered_event_df = filtered_per_event.get(event_number, filtered_beacon.iloc[:0])
+        write_typed_csv(filtered_event_df[columns], beacon_filtered_filename, PER_PATH_EVENT_SCHEMA, index=False)
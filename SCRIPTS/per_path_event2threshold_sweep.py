@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+
+'''
+Sensitivity of the results to the thresholds of the analysis: for every
+combination of
+- the anchor lookback of per_path_event2per_path_event_filtered.py (600 s)
+- RFD_THR and ZOMBIE_THR of zombie_rfd_classifier.py (20 min, 1h30)
+- min_count of quantiles2quantiles_with_clock.py (45)
+- min_events of quantiles_with_clock2stats.py (45)
+computes the quantiles of each (monitor_ip, prefix) and the summary stats
+of quantiles_with_clock2stats.py, for IPv4 and IPv6 beacons, in a single
+run, without writing the intermediate files of each combination.
+
+The per_path_event files and the anchor files of each collector are read
+once (AnchorActivityIndex holds the activity of all the lookbacks), and
+each metric is sorted once for all the pairs (see quantile_engine.py): each
+(lookback, rfd_thr, zombie_thr) selects the rows it keeps from the sorted
+values, without sorting again. min_count and min_events only select pairs,
+so they are applied to the quantiles of each combination. The clock
+information is read from 'per_experiment_clock_synch_DOWN.csv', as in
+quantiles2quantiles_with_clock.py.
+
+Generates a single file per experiment, 'threshold_sweep.csv', with one
+row per combination and family (4 or 6):
+anchor_lookback,rfd_thr,zombie_thr,min_count,min_events,family,pairs,monitors,zombie_events,zombie_fraction,...,mean_minA_q50_UP,mean_maxA_q50_UP,mean_min_q50_DOWN,mean_maxW_q50_DOWN
+600,1200,5400,45,45,4,512,61,89,0.004,...,12.5,31.2,9.8,96.4
+
+    ./per_path_event2threshold_sweep.py 20181001_30d --rfd_thr 600 900 1200 1800 2400 --zombie_thr 3600 4500 5400 6300 7200 --anchor_lookback 300 600 900
+'''
+
+from argparse import ArgumentParser
+from itertools import product
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from experiments import collector_list, experiment_catalog
+from filenames_directories import per_path_event_directory, threshold_sweep_filename
+from ip_keys import FAMILY_IPV4, FAMILY_IPV6, families
+from per_path_event2per_path_event_filtered import ANCHOR_LOOKBACK, AnchorActivityIndex, last_minute_activity
+from per_path_event_filtered2quantiles import min_ts, quantile_label, quantiles_schema
+from prefix_classifier import ROLE_BEACON
+from quantile_engine import SortedGroups
+from quantiles2quantiles_with_clock import add_clock, min_count, select_pairs
+from schemas import PER_PATH_EVENT_SCHEMA, THRESHOLD_SWEEP_SCHEMA, concat_typed, read_typed_csv, write_typed_csv
+from zombie_rfd_classifier import RFD_THR, ZOMBIE_THR, rfd_condition, zombie_condition
+
+# as in quantiles_with_clock2stats.py
+min_events = 45
+
+QUANTILE_METRICS = ['minA_{}_UP', 'maxA_{}_UP', 'min_{}_DOWN', 'maxW_{}_DOWN']
+
+
+# All the per_path_event rows of the collector, None if there are none
+def read_per_path_event(exp_name: str, collector: str) -> Optional[pd.DataFrame]:
+    directory = per_path_event_directory(exp_name, collector)
+    frames = []
+    for event_number in range(experiment_catalog(exp_name).num_events):
+        try:
+            frames.append(read_typed_csv(directory + 'per_path_event_' + str(event_number) + '.csv', PER_PATH_EVENT_SCHEMA).assign(event_number=event_number))
+        except IOError:
+            continue
+    if len(frames) == 0:
+        return None
+    return concat_typed(frames, PER_PATH_EVENT_SCHEMA)
+
+
+# The quantiles (as per_path_event_filtered2quantiles.py) of the rows of a
+# collector for each combination of thresholds, for the per_path_event rows
+# of the collector (read_per_path_event()):
+# ((anchor_lookback, rfd_thr, zombie_thr), quantiles of the pairs with normal events)
+def sweep_quantiles(exp_name: str, collector: str, df: pd.DataFrame, lookbacks: List[int], rfd_thrs: List[int],
+        zombie_thrs: List[int], quantiles: List[float], dataset: bool = False) -> Iterator[Tuple[Tuple[int, int, int], pd.DataFrame]]:
+    catalog = experiment_catalog(exp_name)
+
+    # Rows removed by per_path_event2per_path_event_filtered.py for each lookback
+    anchor_activity = AnchorActivityIndex(exp_name, collector, lookbacks, dataset)
+    beacon = ((catalog.prefix_classifier.roles(df['prefix']) == ROLE_BEACON) & ~last_minute_activity(catalog, df)
+        & anchor_activity.has_anchor_data(df['event_number']))
+    kept = {lookback: beacon & ~anchor_activity.active(df['monitor_ip'], df['prefix'], df['event_number'], lookback)
+        for lookback in lookbacks}
+
+    grouped = df.groupby(['monitor_ip', 'prefix'], observed=True)
+    group_ids = grouped.ngroup().to_numpy()
+    ngroups = grouped.ngroups
+    pairs = grouped.size().index
+    is_UP = ((df['event_number']%2) == 0).to_numpy()
+    is_DOWN = ~is_UP
+
+    # Each metric is sorted once, for all the combinations
+    minA = SortedGroups(group_ids, df['min_ts_A'].to_numpy(), ngroups)
+    maxA = SortedGroups(group_ids, df['max_ts_A'].to_numpy(), ngroups)
+    min_DOWN = SortedGroups(group_ids, min_ts(df).to_numpy(), ngroups)
+    maxW = SortedGroups(group_ids, df['max_ts_W'].to_numpy(), ngroups)
+
+    # Sums of a column per group, for the rows of a mask (NaN are ignored, as sum())
+    columns = {column: np.nan_to_num(df[column].to_numpy(dtype='f8'))
+        for column in ['count_A', 'count_W', 'as_path_count_A', 'different_ases_count_A', 'last_as_path_length_A']}
+    def group_sum(column: str, mask: np.ndarray) -> np.ndarray:
+        return np.bincount(group_ids[mask], weights=columns[column][mask], minlength=ngroups)
+    def group_count(mask: np.ndarray) -> np.ndarray:
+        return np.bincount(group_ids[mask], minlength=ngroups)
+
+    zombies = {zombie_thr: zombie_condition(df, zombie_thr).to_numpy() for zombie_thr in zombie_thrs}
+    for (lookback, rfd_thr, zombie_thr) in product(lookbacks, rfd_thrs, zombie_thrs):
+        zombie = kept[lookback] & zombies[zombie_thr]
+        rfd = kept[lookback] & rfd_condition(df, rfd_thr, zombie_thr).to_numpy()
+        normal = kept[lookback] & ~zombie & ~rfd
+        normal_UP = normal & is_UP
+        normal_DOWN = normal & is_DOWN
+
+        qdf = pd.DataFrame(index=pairs)
+        qdf['minA_q0'] = minA.subset(normal).quantile(0)
+        minA_UP = minA.subset(normal_UP)
+        maxA_UP = maxA.subset(normal_UP)
+        for quant in quantiles:
+            qdf['minA_{}_UP'.format(quantile_label(quant))] = minA_UP.quantile(quant)
+            qdf['maxA_{}_UP'.format(quantile_label(quant))] = maxA_UP.quantile(quant)
+        qdf['count_A'] = group_sum('count_A', normal)
+        qdf['count_UP_events'] = group_count(normal_UP)
+
+        min_DOWN_normal = min_DOWN.subset(normal_DOWN)
+        maxW_DOWN = maxW.subset(normal_DOWN)
+        for quant in quantiles:
+            qdf['min_{}_DOWN'.format(quantile_label(quant))] = min_DOWN_normal.quantile(quant)
+            qdf['maxW_{}_DOWN'.format(quantile_label(quant))] = maxW_DOWN.quantile(quant)
+        qdf['count_W'] = group_sum('count_W', normal)
+        qdf['count_DOWN_events'] = group_count(normal_DOWN)
+
+        # Sums of DOWN events are empty if there are none
+        has_DOWN = qdf['count_DOWN_events'] > 0
+        qdf['as_path_count_DOWN'] = pd.Series(group_sum('as_path_count_A', normal_DOWN), index=pairs).where(has_DOWN)
+        qdf['ases_different_one_event_DOWN'] = pd.Series(group_sum('different_ases_count_A', normal_DOWN), index=pairs).where(has_DOWN)
+        qdf['last_as_path_length_DOWN'] = pd.Series(group_sum('last_as_path_length_A', normal_DOWN), index=pairs).where(has_DOWN)
+
+        qdf['zombie_count'] = group_count(zombie)
+        qdf['rfd_count_UP'] = group_count(rfd & is_UP)
+        qdf['rfd_count_DOWN'] = group_count(rfd & is_DOWN)
+
+        # Only pairs with normal events, as per_path_event_filtered2quantiles.py
+        qdf = qdf[group_count(normal) > 0]
+        qdf['collector'] = collector
+        yield (lookback, rfd_thr, zombie_thr), qdf
+
+
+def ratio(numerator: float, denominator: float) -> float:
+    return numerator / denominator if denominator != 0 else np.nan
+
+
+# The summary stats of quantiles_with_clock2stats.py print_stats() of the
+# pairs of qdf (quantiles_with_clock rows)
+def summary_stats(qdf: pd.DataFrame, quantiles: List[float]) -> Dict[str, float]:
+    rfd_count = qdf['rfd_count_UP'].sum() + qdf['rfd_count_DOWN'].sum()
+    stats = {
+        'pairs': len(qdf),
+        'monitors': qdf['monitor_ip'].nunique(),
+        'zombie_events': qdf['zombie_count'].sum(),
+        'zombie_fraction': ratio(qdf['zombie_count'].sum(), qdf['count_DOWN_events'].sum()),
+        'rfd_fraction': ratio(rfd_count, qdf['count_DOWN_events'].sum() + qdf['count_UP_events'].sum()),
+        'rfd_DOWN_fraction': ratio(qdf['rfd_count_DOWN'].sum(), rfd_count),
+        'rfd_pairs_fraction': ratio(((qdf['rfd_count_UP'] > 0) | (qdf['rfd_count_DOWN'] > 0)).sum(), len(qdf)),
+        'mean_clock_p_90': qdf['clock_p_90'].mean(),
+        'messages_UP': ratio(qdf['count_A'].sum(), qdf['count_UP_events'].sum()),
+        'messages_DOWN': ratio(qdf['count_W'].sum() + qdf['count_A'].sum(), qdf['count_DOWN_events'].sum()),
+    }
+    for column in ['as_path_count_DOWN', 'ases_different_one_event_DOWN', 'last_as_path_length_DOWN']:
+        stats[column] = ratio(qdf[column].sum(), qdf['count_DOWN_events'].sum())
+    for quant in quantiles:
+        for metric in QUANTILE_METRICS:
+            column = metric.format(quantile_label(quant))
+            stats['mean_' + column] = qdf[column].mean()
+    return stats
+
+
+# Column types, including the mean_* columns of the quantiles
+def threshold_sweep_schema(quantiles: List[float]) -> Dict[str, str]:
+    schema = dict(THRESHOLD_SWEEP_SCHEMA)
+    for quant in quantiles:
+        for metric in QUANTILE_METRICS:
+            schema['mean_' + metric.format(quantile_label(quant))] = 'float32'
+    return schema
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("exp_name")
+    parser.add_argument("--anchor_lookback", help="seconds of anchor activity before the event (default 600)", nargs='+', type=int, default=[ANCHOR_LOOKBACK])
+    parser.add_argument("--rfd_thr", help="RFD_THR values, in seconds (default 1200)", nargs='+', type=int, default=[RFD_THR])
+    parser.add_argument("--zombie_thr", help="ZOMBIE_THR values, in seconds (default 5400)", nargs='+', type=int, default=[ZOMBIE_THR])
+    parser.add_argument("--min_count", help="min_count values (default 45)", nargs='+', type=int, default=[min_count])
+    parser.add_argument("--min_events", help="min_events values (default 45)", nargs='+', type=int, default=[min_events])
+    parser.add_argument("--quantiles", help="quantiles of each metric (default 0.5)", nargs='+', type=float, default=[0.5])
+    parser.add_argument("--dataset", help="reads the anchor datasets (from stream2event_dataset.py) instead of a file per event", action='store_true')
+
+    args= parser.parse_args()
+    exp_name = args.exp_name
+    quantiles = args.quantiles
+
+    # (anchor_lookback, rfd_thr, zombie_thr) -> quantiles of each collector
+    combinations = {}  # type: Dict[Tuple[int, int, int], List[pd.DataFrame]]
+    for collector in collector_list(exp_name):
+        df = read_per_path_event(exp_name, collector)
+        if df is None:
+            print('could not read data for {}'.format(collector))
+            continue
+        for combination, qdf in sweep_quantiles(exp_name, collector, df, args.anchor_lookback, args.rfd_thr, args.zombie_thr, quantiles, args.dataset):
+            combinations.setdefault(combination, []).append(qdf.reset_index())
+
+    if len(combinations) == 0:
+        print('no data for this experiment, exiting ', exp_name)
+        exit(0)
+
+    rows = []
+    for (lookback, rfd_thr, zombie_thr), frames in combinations.items():
+        # as quantiles2quantiles_with_clock.py, without the pairs filter
+        qdf = add_clock(concat_typed(frames, quantiles_schema(quantiles)).dropna(), exp_name)
+        for selected_min_count, selected_min_events in product(args.min_count, args.min_events):
+            selected = select_pairs(qdf, selected_min_count)
+            selected = selected[(selected['count_UP_events'] > selected_min_events) & (selected['count_DOWN_events'] > selected_min_events)]
+            for family in [FAMILY_IPV4, FAMILY_IPV6]:
+                row = {'anchor_lookback': lookback, 'rfd_thr': rfd_thr, 'zombie_thr': zombie_thr,
+                    'min_count': selected_min_count, 'min_events': selected_min_events, 'family': family}
+                row.update(summary_stats(selected[families(selected['prefix']) == family], quantiles))
+                rows.append(row)
+
+    write_typed_csv(pd.DataFrame(rows), threshold_sweep_filename(exp_name), threshold_sweep_schema(quantiles), index=False)
@@ -26,14 +26,8 @@ from argparse import ArgumentParser
 import pandas as pd
 
 from filenames_directories import per_path_event_filtered_directory, per_collector_event_mins_filename
-from experiments import events_in_experiment, beacon2collector, beacon_list
-
-# replaces a beacon by its collector
-def beacon_pref2collector(expName: str, beacon_serie: pd.Series) -> pd.Series:
-    for beacon in beacon_list(expName):
-        collector = beacon2collector(expName, beacon)
-        beacon_serie = beacon_serie.str.replace(beacon, collector)
-    return beacon_serie
+from experiments import events_in_experiment, experiment_catalog
+from schemas import PER_COLLECTOR_EVENT_MINS_SCHEMA, PER_PATH_EVENT_SCHEMA, concat_typed, read_typed_csv, write_typed_csv
 
 def generateTimeDf(expName: str, this_collector:str) -> pd.DataFrame:
     directory = per_path_event_filtered_directory(exp_name, this_collector)
@@ -44,22 +38,22 @@ def generateTimeDf(expName: str, this_collector:str) -> pd.DataFrame:
     for event_number in range(events_in_experiment(exp_name)):
         filename = directory + '/per_path_event_filtered_' + str(event_number) + '.csv'
         try:
-            frames.append(pd.read_csv(filename))
+            frames.append(read_typed_csv(filename, PER_PATH_EVENT_SCHEMA))
         except Exception as e:
             print('Problem reading file {} ; continue operation'.format(filename))
 
-    # ignore_index = the dataframes read may have the SAME index
-    try:
-        df = pd.concat(frames, ignore_index = True)
-    except:
+    if len(frames) == 0:
         print('no data for {}, exiting'.format(this_collector))
         return pd.DataFrame()
+    # ignore_index = the dataframes read may have the SAME index
+    df = concat_typed(frames, PER_PATH_EVENT_SCHEMA)
     # monitor_ip              prefix AW  min_ts_A  max_ts_A  count_A   min_ts_W  max_ts_W  count_W  event_number
     # 21708  218.189.6.2      84.205.64.0/24  A        51        51        1  96.0      96.0      1.0           179 
     df['min_time'] = df[['min_ts_A','min_ts_W']].min(axis=1)
-    df['collector_src'] = beacon_pref2collector(expName, df['prefix'])
+    # replaces a beacon by its collector
+    df['collector_src'] = experiment_catalog(expName).prefix_classifier.collectors(df['prefix'])
 
-    grouped_df = df.groupby(['collector_src', 'event_number'])
+    grouped_df = df.groupby(['collector_src', 'event_number'], observed=True)
     min_df = df.loc[grouped_df['min_time'].idxmin()]
 
     # insert the name of this collector at the beginning of every row
@@ -79,4 +73,4 @@ if __name__ == "__main__":
 
     result = generateTimeDf(exp_name, collector)
     filename = per_collector_event_mins_filename(exp_name, collector)
-    result.to_csv(filename, index=False)
+    write_typed_csv(result, filename, PER_COLLECTOR_EVENT_MINS_SCHEMA, index=False)
@@ -13,6 +13,32 @@ Detects BGP zombie events, prefixes which are not withdrawn in 90 mins (or not w
 Detects rfd events, i.e., convergence longer than 20 min
 Quantiles are computed WITHOUT BGP zombie and rfd events.
 Provides counts for these events
+Zombie and rfd events are read from the labels of zombie_rfd_classifier.py
+('zombies/COLLECTOR.csv'); if they were not generated, rows are classified
+in the same way.
+
+Each metric is sorted once for all the pairs (see quantile_engine.py), with the 
+semantics of pandas quantile(q, 'lower'). With --quantiles, other quantiles 
+can be computed, e.g., --quantiles 0.5 0.9 0.99 adds minA_q99_UP, maxA_q99_UP, 
+min_q99_DOWN and maxW_q99_DOWN.
+
+With --streaming, files are read one event at a time, and each event is 
+added to a quantile sketch per (monitor_ip, prefix) and metric (see 
+quantile_sketch.py) and to running counts (see QuantileAccumulator), so 
+memory does not depend on the number of events (e.g., a year of events). 
+The columns are the same; quantiles below 128 seconds are exact, the rest 
+have a relative error of at most 1%.
+
+With --incremental, the counts and sketch buckets of the events read are 
+kept, summed per (monitor_ip, prefix), in 'quantiles_state/COLLECTOR_counts.csv' 
+and 'COLLECTOR_sketches.csv' (and the events read in 'COLLECTOR_events.csv'), 
+and each run only reads the events not in the state (e.g., the events of the 
+last day), with the same results as --streaming. With --window N, events 
+older than the last N are subtracted from the state (rolling window, e.g., 
+--window 180 for 30 days); the counts and sketches of each event of the 
+window are kept in 'quantiles_state/COLLECTOR/' for that. A state built 
+without --window cannot be used with --window. To read an event again 
+(e.g., regenerated), remove the state.
 
 
 monitor_ip,prefix,minA_q0,minA_q50_UP,maxA_q50_UP,minA_q90_UP,maxA_q90_UP,count_A,count_UP_events,min_q50_DOWN,maxW_q50_DOWN,min_q90_DOWN,maxW_q90_DOWN,count_W,count_DOWN_events,as_path_count_DOWN,ases_different_one_event_DOWN,last_as_path_length_DOWN,zombie_count,rfd_count_UP,rfd_count_DOWN,collector
@@ -23,137 +49,411 @@ monitor_ip,prefix,minA_q0,minA_q50_UP,maxA_q50_UP,minA_q90_UP,maxA_q90_UP,count_
 '''
 
 from argparse import ArgumentParser
+import numpy as np
 import pandas as pd
+import os
+from typing import Dict, List, Optional, Set, Tuple
 
-from filenames_directories import per_path_event_filtered_directory, quantile_filename, zombies_filename
+from filenames_directories import per_path_event_filtered_directory, quantile_filename, quantiles_state_event_filename, quantiles_state_filename
 from experiments import events_in_experiment
+from quantile_engine import SortedGroups
+from quantile_sketch import QuantileSketches
+from zombie_rfd_classifier import LABEL_NORMAL, LABEL_RFD, LABEL_ZOMBIE, add_labels, read_labels
+from schemas import PER_PATH_EVENT_SCHEMA, QUANTILES_SCHEMA, QUANTILES_STATE_EVENTS_SCHEMA, QUANTILES_STATE_SCHEMA, QUANTILE_SKETCH_STATE_SCHEMA, apply_schema, concat_typed, read_typed_csv, write_typed_csv
 
-RFD_THR = 20*60
-ZOMBIE_THR = 90 *60
+# first update of the DOWN event, either A or W
+def min_ts(df: pd.DataFrame) -> pd.Series:
+    return df[['min_ts_A','min_ts_W']].min(axis=1)
 
-def zombie_count(df: pd.DataFrame) -> int:
-    zombie_condition = ((df['event_number']%2) == 1) & (df['max_ts_W'].isnull() | (df['max_ts_W'] > ZOMBIE_THR))
-    return len(df[zombie_condition])
+# 0.5 -> 'q50', 0.999 -> 'q99.9'
+def quantile_label(quant: float) -> str:
+    return 'q{:g}'.format(quant * 100)
 
-def rfd_count_UP(df: pd.DataFrame) -> int:
-    zombie_condition = ((df['event_number']%2) == 1) & (df['max_ts_W'].isnull() | df['max_ts_W'] > ZOMBIE_THR)
-    alive = df[~ zombie_condition ]
-    
-    rfd_condition = ((alive['event_number']%2) == 0) & ((alive['max_ts_W'] > RFD_THR) | (alive['max_ts_A'] > RFD_THR))
-    return len(alive[rfd_condition])
+# Column types, including the columns of quantiles not in QUANTILES_SCHEMA
+def quantiles_schema(quantiles: List[float]) -> Dict[str, str]:
+    schema = dict(QUANTILES_SCHEMA)
+    for quant in quantiles:
+        for column in ['minA_{}_UP', 'maxA_{}_UP', 'min_{}_DOWN', 'maxW_{}_DOWN']:
+            schema.setdefault(column.format(quantile_label(quant)), 'float32')
+    return schema
 
-def rfd_count_DOWN(df: pd.DataFrame) -> int:
-    zombie_condition = ((df['event_number']%2) == 1) & (df['max_ts_W'].isnull() | df['max_ts_W'] > ZOMBIE_THR)
-    alive = df[~ zombie_condition ]
-    
-    rfd_condition = ((alive['event_number']%2) == 1) & ((alive['max_ts_W'] > RFD_THR) | (alive['max_ts_A'] > RFD_THR))
-    return len(alive[rfd_condition])
 
-# quantile  quant of min value for A update messages for UP events
-def minA_q_UP(df: pd.DataFrame, quant:float) -> int:
-    df = df[(df['event_number']%2) == 0]
-    return df['min_ts_A'].quantile(quant, 'lower')
+# The quantiles of all the events of df (with labels, see add_labels()),
+# one row per (monitor_ip, prefix)
+def per_path_event2quantiles(df: pd.DataFrame, quantiles: List[float]) -> pd.DataFrame:
+    # Groups by the codes of the (monitor_ip, prefix) categoricals
+    grouped_all = df.groupby(['monitor_ip', 'prefix'], observed=True)
 
-def maxA_q_UP(df: pd.DataFrame, quant:float) -> int:
-    df = df[(df['event_number']%2) == 0]
-    return df['max_ts_A'].quantile(quant, 'lower')
+    zombies = df['label'] == LABEL_ZOMBIE
+    rfd = df['label'] == LABEL_RFD
+    is_UP_all = (df['event_number']%2) == 0
+    normal = df[df['label'] == LABEL_NORMAL]
 
-def min_q_DOWN(df: pd.DataFrame, quant:float) -> int:
-    df = df[(df['event_number']%2) == 1]
-    df['min'] = df[['min_ts_A','min_ts_W']].min(axis=1)
-    return df['min'].quantile(quant, 'lower')
+    grouped = normal.groupby(['monitor_ip', 'prefix'], observed=True)
+    group_ids = grouped.ngroup().to_numpy()
+    is_UP = ((normal['event_number']%2) == 0).to_numpy()
+    is_DOWN = ~is_UP
 
-def maxW_q_DOWN(df: pd.DataFrame, quant:float) -> int:
-    df = df[(df['event_number']%2) == 1]
-    return df['max_ts_W'].quantile(quant, 'lower')
+    grouped_DOWN = normal[is_DOWN].groupby(['monitor_ip', 'prefix'], observed=True)
 
 
-# ./per_path_event_filtered2quantiles.py 20090101_30d rrc00
-if __name__ == "__main__":
-    parser = ArgumentParser()
-    parser.add_argument("exp_name")
-    parser.add_argument("collector")
-
-    args= parser.parse_args()
-    exp_name = args.exp_name
-    collector = args.collector
-
-    directory = per_path_event_filtered_directory(exp_name, collector)
-
-    frames = []
-    for event_number in range(events_in_experiment(exp_name)):
-        filename = directory + '/per_path_event_filtered_' + str(event_number) + '.csv'
-        try:
-            frames.append(pd.read_csv(filename))
-        except Exception as e:
-            # print('Problem reading file {} ; continue operation'.format(filename))
-            pass
-
-    # ignore_index = the dataframes read may have the SAME index
-    try:
-        df = pd.concat(frames, ignore_index = True)
-    except:
-        print('no data for this collector, exiting ', collector )
-        exit(0)
-
-    if len(df)==0: 
-        print('no data for this collector, exiting ', collector )
-        exit(0)
-
-    grouped_all = df.groupby(['monitor_ip', 'prefix'])
+    qdf = grouped.aggregate({'min_ts_A': 'min'})
+    qdf.rename(columns={'min_ts_A': 'minA_q0'}, inplace = True)
 
-    # zombies if it is a DOWN event (%2 ==1), 
-    # and either there is no W or W arrived later than 1h30
-    zombie_condition = ((df['event_number']%2) == 1) & (df['max_ts_W'].isnull() | (df['max_ts_W'] > ZOMBIE_THR))
-    zombies = df[zombie_condition]
+    # Each metric is sorted once, for all the groups and quantiles
+    # (same result as Series.quantile(quant, 'lower') of each group)
+    minA_UP = SortedGroups(group_ids[is_UP], normal['min_ts_A'].to_numpy()[is_UP], grouped.ngroups)
+    maxA_UP = SortedGroups(group_ids[is_UP], normal['max_ts_A'].to_numpy()[is_UP], grouped.ngroups)
+    min_DOWN = SortedGroups(group_ids[is_DOWN], min_ts(normal).to_numpy()[is_DOWN], grouped.ngroups)
+    maxW_DOWN = SortedGroups(group_ids[is_DOWN], normal['max_ts_W'].to_numpy()[is_DOWN], grouped.ngroups)
 
-    alive = df[~ zombie_condition ]
+    for quant in quantiles:
+        qdf['minA_{}_UP'.format(quantile_label(quant))] = minA_UP.quantile(quant)
+        qdf['maxA_{}_UP'.format(quantile_label(quant))] = maxA_UP.quantile(quant)
 
-    rfd_condition = (alive['max_ts_W'] > RFD_THR) | (alive['max_ts_A'] > RFD_THR)
-    rfd_df = alive[rfd_condition]
 
-    normal = alive[~rfd_condition]
-    grouped = normal.groupby(['monitor_ip', 'prefix'])
+    qdf['count_A'] = grouped['count_A'].sum()
+    qdf['count_UP_events'] = np.bincount(group_ids[is_UP], minlength=grouped.ngroups)
 
-    grouped_DOWN = normal[(normal['event_number']%2) == 1].groupby(['monitor_ip', 'prefix'])
+    for quant in quantiles:
+        qdf['min_{}_DOWN'.format(quantile_label(quant))] = min_DOWN.quantile(quant)
+        qdf['maxW_{}_DOWN'.format(quantile_label(quant))] = maxW_DOWN.quantile(quant)
 
 
-    qdf = grouped.aggregate({'min_ts_A': lambda serie: serie.min()})
-    qdf.rename(index=str, columns={'min_ts_A': 'minA_q0'}, inplace = True)
-    
+    qdf['count_W'] = grouped['count_W'].sum()
+    qdf['count_DOWN_events'] = np.bincount(group_ids[is_DOWN], minlength=grouped.ngroups)
 
-    # Use lambda to insert quantile argument
-    qdf['minA_q50_UP'] = grouped.apply(lambda x: minA_q_UP(x, 0.5))
-    qdf['maxA_q50_UP'] = grouped.apply(lambda x: maxA_q_UP(x, 0.5))
-    qdf['minA_q90_UP'] = grouped.apply(lambda x: minA_q_UP(x, 0.9))
-    qdf['maxA_q90_UP'] = grouped.apply(lambda x: maxA_q_UP(x, 0.9))
-
-
-    qdf['count_A'] = grouped.aggregate({'count_A': lambda serie: serie.sum()})
-    # To count the number of true values in the serie, just sum them
-    qdf['count_UP_events'] = grouped.aggregate({'event_number': lambda serie: sum( (serie %2)==0)})
-    
+    # the same as_path counts many times if it appears in different events
+    # Only for DOWN events, using grouped_DOWN
+    qdf['as_path_count_DOWN'] = grouped_DOWN['as_path_count_A'].sum()
+    qdf['ases_different_one_event_DOWN'] = grouped_DOWN['different_ases_count_A'].sum()
+    qdf['last_as_path_length_DOWN'] = grouped_DOWN['last_as_path_length_A'].sum()
+
+    all_group_ids = grouped_all.ngroup().to_numpy()
+    all_groups = grouped_all.size().index
+    for column, condition in [('zombie_count', zombies), ('rfd_count_UP', rfd & is_UP_all), ('rfd_count_DOWN', rfd & ~is_UP_all)]:
+        qdf[column] = pd.Series(np.bincount(all_group_ids[condition.to_numpy()], minlength=grouped_all.ngroups), index=all_groups).reindex(qdf.index)
+
+    return qdf
+
+
+# How the counts of each (monitor_ip, prefix) of the events are merged
+COUNT_AGGREGATIONS = {
+    'minA_q0': 'min',
+    'count_A': 'sum',
+    'count_UP_events': 'sum',
+    'count_W': 'sum',
+    'count_DOWN_events': 'sum',
+    'as_path_count_DOWN': 'sum',
+    'ases_different_one_event_DOWN': 'sum',
+    'last_as_path_length_DOWN': 'sum',
+    'zombie_count': 'sum',
+    'rfd_count_UP': 'sum',
+    'rfd_count_DOWN': 'sum',
+}
+
+# (sketch, column of the normal rows, UP events)
+SKETCH_METRICS = {
+    'minA_{}_UP': ('min_ts_A', True),
+    'maxA_{}_UP': ('max_ts_A', True),
+    'min_{}_DOWN': ('min_ts', False),
+    'maxW_{}_DOWN': ('max_ts_W', False),
+}
+
+
+# Counts (a row per (monitor_ip, prefix), with COUNT_AGGREGATIONS and 
+# normal_events) and sketches of the metrics of the rows of an event (with labels)
+def event2partials(df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, QuantileSketches]]:
+    zombies = df['label'] == LABEL_ZOMBIE
+    rfd = df['label'] == LABEL_RFD
+    is_UP_all = (df['event_number']%2) == 0
+    normal = df[df['label'] == LABEL_NORMAL]
+    is_UP = (normal['event_number']%2) == 0
+    is_DOWN = ~is_UP
+
+    # Rows as in per_path_event2quantiles(): counts of normal rows, and
+    # of zombie and rfd rows of all the rows
+    normal_counts = pd.DataFrame({
+        'monitor_ip': normal['monitor_ip'], 'prefix': normal['prefix'],
+        'minA_q0': normal['min_ts_A'], 'count_A': normal['count_A'], 'count_UP_events': is_UP.astype(int),
+        'count_W': normal['count_W'], 'count_DOWN_events': is_DOWN.astype(int),
+        'as_path_count_DOWN': normal['as_path_count_A'].where(is_DOWN),
+        'ases_different_one_event_DOWN': normal['different_ases_count_A'].where(is_DOWN),
+        'last_as_path_length_DOWN': normal['last_as_path_length_A'].where(is_DOWN)})
+    all_counts = pd.DataFrame({
+        'monitor_ip': df['monitor_ip'], 'prefix': df['prefix'], 'zombie_count': zombies.astype(int),
+        'rfd_count_UP': (rfd & is_UP_all).astype(int), 'rfd_count_DOWN': (rfd & ~is_UP_all).astype(int)})
+    counts = (normal_counts.groupby(['monitor_ip', 'prefix'], observed=True).agg({column: aggregation for column, aggregation in COUNT_AGGREGATIONS.items() if column in normal_counts})
+        .join(all_counts.groupby(['monitor_ip', 'prefix'], observed=True).sum(), how='outer').reset_index())
+    # Paths with only zombie or rfd rows have no counts of normal rows
+    sum_columns = [column for column, aggregation in COUNT_AGGREGATIONS.items() if aggregation == 'sum']
+    counts[sum_columns] = counts[sum_columns].fillna(0)
+    counts['normal_events'] = counts['count_UP_events'] + counts['count_DOWN_events']
+
+    values = normal.assign(min_ts=min_ts(normal))
+    sketches = {}
+    for metric, (column, UP) in SKETCH_METRICS.items():
+        sketches[metric] = QuantileSketches.from_values(values[is_UP] if UP else values[is_DOWN], column)
+    return counts, sketches
+
+
+# Computes the columns of per_path_event2quantiles() adding the events one
+# at a time: counts are added to running counts (minimum for minA_q0), and
+# the values of each metric to a QuantileSketches; memory depends on the 
+# number of (monitor_ip, prefix), not on the number of events.
+class QuantileAccumulator:
+    def __init__(self):
+        # a row per (monitor_ip, prefix), with COUNT_AGGREGATIONS and normal_events
+        self.counts = None  # type: Optional[pd.DataFrame]
+        self.sketches = {metric: QuantileSketches() for metric in SKETCH_METRICS}
+
+    def add_event(self, df: pd.DataFrame):
+        counts, sketches = event2partials(df)
+        if self.counts is not None:
+            counts = concat_typed([self.counts, counts], QUANTILES_SCHEMA).groupby(['monitor_ip', 'prefix'], observed=True).agg(
+                dict(COUNT_AGGREGATIONS, normal_events='sum')).reset_index()
+        self.counts = counts
+        for metric in SKETCH_METRICS:
+            self.sketches[metric] = self.sketches[metric].merge(sketches[metric])
+
+    # As per_path_event2quantiles(), None if there were no events
+    def quantiles(self, quantiles: List[float]) -> Optional[pd.DataFrame]:
+        if self.counts is None:
+            return None
+        counts = apply_schema(self.counts, QUANTILES_SCHEMA).set_index(['monitor_ip', 'prefix']).sort_index()
+        counts = counts[counts['normal_events'] > 0]
+        # Sums of DOWN events are empty if there are none
+        for column in ['as_path_count_DOWN', 'ases_different_one_event_DOWN', 'last_as_path_length_DOWN']:
+            counts[column] = counts[column].where(counts['count_DOWN_events'] > 0)
+        sketch_quantiles = {metric: sketches.quantiles(quantiles).reindex(counts.index) for metric, sketches in self.sketches.items()}
+
+        qdf = counts[['minA_q0']].copy()
+        for quant in quantiles:
+            for metric in ['minA_{}_UP', 'maxA_{}_UP']:
+                qdf[metric.format(quantile_label(quant))] = sketch_quantiles[metric][quant]
+        qdf['count_A'] = counts['count_A']
+        qdf['count_UP_events'] = counts['count_UP_events']
+        for quant in quantiles:
+            for metric in ['min_{}_DOWN', 'maxW_{}_DOWN']:
+                qdf[metric.format(quantile_label(quant))] = sketch_quantiles[metric][quant]
+        for column in ['count_W', 'count_DOWN_events', 'as_path_count_DOWN', 'ases_different_one_event_DOWN',
+                'last_as_path_length_DOWN', 'zombie_count', 'rfd_count_UP', 'rfd_count_DOWN']:
+            qdf[column] = counts[column]
+        return qdf
+
+
+# Metric of the sketches of QuantileState with the minA_q0 of each event,
+# a bucket per value: minA_q0 is the first bucket, also once events are removed
+MIN_A_METRIC = 'minA_q0'
+
+STATE_KEY_COLUMNS = ['monitor_ip', 'prefix']
+STATE_COUNT_COLUMNS = [column for column, aggregation in COUNT_AGGREGATIONS.items() if aggregation == 'sum'] + ['normal_events']
+STATE_SKETCH_COLUMNS = STATE_KEY_COLUMNS + ['metric', 'bucket', 'count']
+
+
+# The partials of an event (event2partials()) as rows of the state: 
+# counts (STATE_COUNT_COLUMNS) and entries of the sketches, with metric
+def partials2state(counts: pd.DataFrame, sketches: Dict[str, QuantileSketches]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    normal = counts[counts['minA_q0'].notna()]
+    min_A = normal[STATE_KEY_COLUMNS].assign(metric=MIN_A_METRIC, bucket=normal['minA_q0'].astype(int), count=1)
+    entries = [sketch.entries.assign(metric=metric) for metric, sketch in sketches.items()] + [min_A]
+    return counts[STATE_KEY_COLUMNS + STATE_COUNT_COLUMNS], concat_typed(entries, QUANTILE_SKETCH_STATE_SCHEMA)[STATE_SKETCH_COLUMNS]
+
+
+# Sums the columns of the rows with the same keys; rows that add up to 0
+# (e.g., the paths of the events removed) are left out
+def sum_rows(frames: List[pd.DataFrame], keys: List[str], columns: List[str], schema: Dict[str, str]) -> pd.DataFrame:
+    df = concat_typed(frames, schema).groupby(keys, observed=True)[columns].sum()
+    return df[(df != 0).any(axis=1)].reset_index()
+
+
+def negate(df: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+    return df.assign(**{column: -df[column] for column in columns})
+
+
+# Counts and sketch buckets of the events read, summed per (monitor_ip, prefix), 
+# kept between runs in 'quantiles_state/' (see --incremental), so that new 
+# events are added without reading the previous ones again. Sums can also 
+# be subtracted: an event is removed (retire()) with its own counts and 
+# sketches, which are only kept (in 'quantiles_state/COLLECTOR/') with 
+# --window. The files of the state do not grow with the number of events, 
+# only with the number of paths.
+class QuantileState:
+    def __init__(self, counts: Optional[pd.DataFrame] = None, entries: Optional[pd.DataFrame] = None, events: Optional[Set[int]] = None):
+        # STATE_COUNT_COLUMNS per (monitor_ip, prefix)
+        self.counts = counts
+        # STATE_SKETCH_COLUMNS, the sketches of SKETCH_METRICS and MIN_A_METRIC
+        self.entries = entries
+        self.events = set() if events is None else events
+        # counts and entries of the events added in this run, to be kept with --window
+        self.added = {}  # type: Dict[int, Tuple[pd.DataFrame, pd.DataFrame]]
+        self.retired = []  # type: List[int]
+        # counts and entries not summed yet (negated for the events removed)
+        self.pending = []  # type: List[Tuple[pd.DataFrame, pd.DataFrame]]
+
+    def event_numbers(self) -> Set[int]:
+        return set(self.events)
+
+    def add_event(self, event_number: int, df: pd.DataFrame):
+        partials = partials2state(*event2partials(df))
+        self.added[event_number] = partials
+        self.pending.append(partials)
+        self.events.add(event_number)
+
+    # Removes the events before first_event, subtracting the counts and
+    # sketches of each event, saved with --window
+    def retire(self, exp_name: str, collector: str, first_event: int):
+        for event_number in sorted(event_number for event_number in self.events if event_number < first_event):
+            counts_filename = quantiles_state_event_filename(exp_name, collector, 'counts', event_number)
+            if not os.path.isfile(counts_filename):
+                raise Exception('Cannot remove event {} from the state, it was added without --window ({} does not exist); '
+                    'remove the state to read the events again'.format(event_number, counts_filename))
+            counts = read_typed_csv(counts_filename, QUANTILES_STATE_SCHEMA)
+            entries = read_typed_csv(quantiles_state_event_filename(exp_name, collector, 'sketches', event_number), QUANTILE_SKETCH_STATE_SCHEMA)
+            self.pending.append((negate(counts, STATE_COUNT_COLUMNS), negate(entries, ['count'])))
+            self.events.remove(event_number)
+            self.retired.append(event_number)
+
+    # Sums the pending counts and entries, once for all the events of the run
+    def update(self):
+        if len(self.pending) == 0:
+            return
+        counts = ([] if self.counts is None else [self.counts]) + [counts for counts, _ in self.pending]
+        entries = ([] if self.entries is None else [self.entries]) + [entries for _, entries in self.pending]
+        self.counts = sum_rows(counts, STATE_KEY_COLUMNS, STATE_COUNT_COLUMNS, QUANTILES_STATE_SCHEMA)
+        self.entries = sum_rows(entries, STATE_KEY_COLUMNS + ['metric', 'bucket'], ['count'], QUANTILE_SKETCH_STATE_SCHEMA)
+        self.pending = []
+
+    # Accumulator with the events of the state
+    def accumulator(self) -> QuantileAccumulator:
+        self.update()
+        accumulator = QuantileAccumulator()
+        if self.counts is None or len(self.counts) == 0:
+            return accumulator
+        min_A = self.entries[self.entries['metric'] == MIN_A_METRIC].groupby(STATE_KEY_COLUMNS, observed=True)['bucket'].min().rename('minA_q0')
+        accumulator.counts = self.counts.merge(min_A.reset_index(), on=STATE_KEY_COLUMNS, how='left')
+        for metric in SKETCH_METRICS:
+            accumulator.sketches[metric] = QuantileSketches(self.entries[self.entries['metric'] == metric])
+        return accumulator
+
+    # Writes the sums, and, with keep_events, the counts and sketches of
+    # the events added (those of the events removed are deleted)
+    def save(self, exp_name: str, collector: str, keep_events: bool = False):
+        self.update()
+        if self.counts is None:
+            return
+        write_typed_csv(self.counts, quantiles_state_filename(exp_name, collector, 'counts'), QUANTILES_STATE_SCHEMA, index=False)
+        write_typed_csv(self.entries, quantiles_state_filename(exp_name, collector, 'sketches'), QUANTILE_SKETCH_STATE_SCHEMA, index=False)
+        write_typed_csv(pd.DataFrame({'event_number': sorted(self.events)}), quantiles_state_filename(exp_name, collector, 'events'),
+            QUANTILES_STATE_EVENTS_SCHEMA, index=False)
+        if keep_events:
+            for event_number, (counts, entries) in self.added.items():
+                write_typed_csv(counts, quantiles_state_event_filename(exp_name, collector, 'counts', event_number), QUANTILES_STATE_SCHEMA, index=False)
+                write_typed_csv(entries, quantiles_state_event_filename(exp_name, collector, 'sketches', event_number), QUANTILE_SKETCH_STATE_SCHEMA, index=False)
+        for event_number in self.retired:
+            for kind in ['counts', 'sketches']:
+                os.remove(quantiles_state_event_filename(exp_name, collector, kind, event_number))
+        self.added = {}
+        self.retired = []
+
+    # The state saved, empty if there was none
+    @classmethod
+    def load(cls, exp_name: str, collector: str) -> 'QuantileState':
+        counts_filename = quantiles_state_filename(exp_name, collector, 'counts')
+        if not os.path.isfile(counts_filename):
+            return cls()
+        events = read_typed_csv(quantiles_state_filename(exp_name, collector, 'events'), QUANTILES_STATE_EVENTS_SCHEMA)
+        return cls(read_typed_csv(counts_filename, QUANTILES_STATE_SCHEMA),
+            read_typed_csv(quantiles_state_filename(exp_name, collector, 'sketches'), QUANTILE_SKETCH_STATE_SCHEMA),
+            set(events['event_number'].tolist()))
 
-    qdf['min_q50_DOWN'] = grouped.apply(lambda x: min_q_DOWN(x, 0.5))
-    qdf['maxW_q50_DOWN'] = grouped.apply(lambda x: maxW_q_DOWN(x, 0.5))
 
-    qdf['min_q90_DOWN'] = grouped.apply(lambda x: min_q_DOWN(x, 0.9))
-    qdf['maxW_q90_DOWN'] = grouped.apply(lambda x: maxW_q_DOWN(x, 0.9))
+# ./per_path_event_filtered2quantiles.py 20090101_30d rrc00
+# ./per_path_event_filtered2quantiles.py 20090101_30d rrc00 --streaming --quantiles 0.5 0.9 0.99
+# ./per_path_event_filtered2quantiles.py 20090101_30d rrc00 --incremental --window 180
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("exp_name")
+    parser.add_argument("collector")
+    parser.add_argument("--quantiles", help="quantiles of each metric (default 0.5 0.9)", nargs='+', type=float, default=[0.5, 0.9])
+    parser.add_argument("--streaming", help="reads one event at a time, with quantile sketches (bounded memory)", action='store_true')
+    parser.add_argument("--incremental", help="as --streaming, but only reads the events not read in previous runs (state in quantiles_state/)", action='store_true')
+    parser.add_argument("--window", help="with --incremental, only the last WINDOW events (e.g., 180 for 30 days)", type=int)
 
+    args= parser.parse_args()
+    exp_name = args.exp_name
+    collector = args.collector
+    quantiles = args.quantiles
 
-    qdf['count_W'] = grouped.aggregate({'count_W': lambda serie: serie.sum()})
-    qdf['count_DOWN_events'] = grouped.aggregate({'event_number': lambda serie: sum( (serie %2)==1)})
+    directory = per_path_event_filtered_directory(exp_name, collector)
 
-    # the same as_path counts many times if it appears in different events
-    # Only for DOWN events, using grouped_DOWN
-    qdf['as_path_count_DOWN'] = grouped_DOWN.aggregate({'as_path_count_A': lambda serie: serie.sum()})
-    qdf['ases_different_one_event_DOWN'] = grouped_DOWN.aggregate({'different_ases_count_A': lambda serie: serie.sum()})
-    qdf['last_as_path_length_DOWN'] = grouped_DOWN.aggregate({'last_as_path_length_A': lambda serie: serie.sum()})
+    # zombie/rfd/normal label of each row (from zombie_rfd_classifier.py)
+    labels_df = read_labels(exp_name, collector)
+    event_labels = {}
+    if labels_df is not None:
+        event_labels = {event_number: event_labels_df for event_number, event_labels_df in labels_df.groupby('event_number')}
+
+    if args.incremental:
+        state = QuantileState.load(exp_name, collector)
+        known_events = state.event_numbers()
+        new_events = [event_number for event_number in range(events_in_experiment(exp_name))
+            if event_number not in known_events and os.path.isfile(directory + '/per_path_event_filtered_' + str(event_number) + '.csv')]
+        if args.window and len(known_events | set(new_events)) > 0:
+            # Events before the window are not read (nor those retired in previous runs)
+            first_event = max(known_events | set(new_events)) - args.window + 1
+            new_events = [event_number for event_number in new_events if event_number >= first_event]
+            state.retire(exp_name, collector, first_event)
+        for event_number in new_events:
+            filename = directory + '/per_path_event_filtered_' + str(event_number) + '.csv'
+            try:
+                event_df = read_typed_csv(filename, PER_PATH_EVENT_SCHEMA)
+            except FileNotFoundError:
+                continue
+            if len(event_df) > 0:
+                state.add_event(event_number, add_labels(event_df, event_labels.get(event_number)))
+        state.save(exp_name, collector, keep_events=args.window is not None)
+        qdf = state.accumulator().quantiles(quantiles)
+        if qdf is None:
+            print('no data for this collector, exiting ', collector )
+            exit(0)
+    elif args.streaming:
+        accumulator = QuantileAccumulator()
+        for event_number in range(events_in_experiment(exp_name)):
+            filename = directory + '/per_path_event_filtered_' + str(event_number) + '.csv'
+            try:
+                event_df = read_typed_csv(filename, PER_PATH_EVENT_SCHEMA)
+            except FileNotFoundError:
+                continue
+            if len(event_df) > 0:
+                accumulator.add_event(add_labels(event_df, event_labels.get(event_number)))
+        qdf = accumulator.quantiles(quantiles)
+        if qdf is None:
+            print('no data for this collector, exiting ', collector )
+            exit(0)
+    else:
+        frames = []
+        for event_number in range(events_in_experiment(exp_name)):
+            filename = directory + '/per_path_event_filtered_' + str(event_number) + '.csv'
+            try:
+                frames.append(read_typed_csv(filename, PER_PATH_EVENT_SCHEMA))
+            except FileNotFoundError:
+                # print('Problem reading file {} ; continue operation'.format(filename))
+                pass
+
+        if len(frames) == 0:
+            print('no data for this collector, exiting ', collector )
+            exit(0)
+
+        # ignore_index = the dataframes read may have the SAME index
+        df = concat_typed(frames, PER_PATH_EVENT_SCHEMA)
+
+        if len(df)==0: 
+            print('no data for this collector, exiting ', collector )
+            exit(0)
+
+        qdf = per_path_event2quantiles(add_labels(df, labels_df), quantiles)
 
-    qdf['zombie_count'] = grouped_all.apply(zombie_count)
-    qdf['rfd_count_UP'] = grouped_all.apply(rfd_count_UP)
-    qdf['rfd_count_DOWN'] = grouped_all.apply(rfd_count_DOWN)
     qdf['collector']=collector
 
     filename =  quantile_filename(exp_name, collector)
-    qdf.to_csv(filename)
+    write_typed_csv(qdf, filename, quantiles_schema(quantiles))
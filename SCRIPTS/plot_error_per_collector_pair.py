@@ -12,16 +12,16 @@ Input: 'per_experiment_clock_synch_DOWN.csv' file for each experiment.
 '''
 
 import matplotlib.pyplot as plt
-import pandas as pd
 import numpy as np
 from filenames_directories import per_experiment_clock_synch_filename
+from schemas import CLOCK_SCHEMA, read_typed_csv
 
 min_event_count=45
 
 def plot_error(exp_name, color, linestyle):
     # Down
     fn = per_experiment_clock_synch_filename(exp_name, False, True)
-    qdf = pd.read_csv(fn)
+    qdf = read_typed_csv(fn, CLOCK_SCHEMA)
 
     label = exp_name[:4] 
     few_event_pair_count = len(qdf[qdf['event_count']< min_event_count])
@@ -15,6 +15,8 @@ import pandas as pd
 import numpy as np
 from argparse import ArgumentParser
 from filenames_directories import quantiles_with_clock_filename
+from ip_keys import FAMILY_IPV4, FAMILY_IPV6, families
+from schemas import QUANTILES_WITH_CLOCK_SCHEMA, read_typed_csv
 
 from scipy.interpolate import interp1d
 
@@ -61,13 +63,13 @@ def add_clock_info(qdf: pd.DataFrame) -> pd.DataFrame:
 
 # Only v4 beacons remain
 def only_ipv4(qdf: pd.DataFrame) -> pd.DataFrame:
-    qdf = qdf[~qdf.prefix.str.contains(':')]
+    qdf = qdf[families(qdf['prefix']) == FAMILY_IPV4]
     return qdf
 
 
 # Only v6 beacons remain
 def only_ipv6(qdf: pd.DataFrame) -> pd.DataFrame:
-    qdf = qdf[qdf.prefix.str.contains(':')]
+    qdf = qdf[families(qdf['prefix']) == FAMILY_IPV6]
     return qdf
 
 
@@ -93,10 +95,10 @@ if __name__ == "__main__":
     exp_name2 = args.exp_name2
     
     fn1 = quantiles_with_clock_filename(exp_name1)
-    qdf1 = pd.read_csv(fn1)
+    qdf1 = read_typed_csv(fn1, QUANTILES_WITH_CLOCK_SCHEMA)
 
     fn2 = quantiles_with_clock_filename(exp_name2)
-    qdf2 = pd.read_csv(fn2)
+    qdf2 = read_typed_csv(fn2, QUANTILES_WITH_CLOCK_SCHEMA)
 
     min_events =  45
     
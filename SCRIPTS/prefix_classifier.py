@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+'''
+Classifies announced prefixes by longest-prefix match against the beacon
+and anchor prefixes of experiment_specs.beacons_2009.
+
+Each prefix gets a role:
+- 'beacon', 'anchor': the beacon or anchor prefix itself
+- 'beacon_more_specific', 'anchor_more_specific': a more specific prefix of
+  a beacon or anchor (e.g., 84.205.64.0/25)
+- 'default': 0.0.0.0/0, ::/0
+- 'covering': a less specific prefix containing beacons or anchors
+  (e.g., 84.205.64.0/19, 0.0.0.0/1)
+- 'unrelated': any other prefix (or a value that is not a prefix)
+and, for beacons and anchors (and their more specific prefixes), the
+collector of the beacon, in lowercase, as in collector_list().
+
+The trie is built once (one per address family); each distinct prefix of
+the data is classified once, and the result is mapped to all the rows:
+    classifier = prefix_classifier(exp_name)
+    df['collector_src'] = classifier.collectors(df['prefix'])
+    df = df[classifier.roles(df['prefix']) == ROLE_BEACON]
+
+Classifies prefixes from the command line:
+    ./prefix_classifier.py 20181001_30d 84.205.64.0/24 84.205.64.0/25 0.0.0.0/0
+'''
+
+from argparse import ArgumentParser
+from functools import lru_cache
+import ipaddress
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from experiment_specs import beacons_2009
+from ip_keys import factorize
+
+ROLE_BEACON = 'beacon'
+ROLE_ANCHOR = 'anchor'
+ROLE_BEACON_MORE_SPECIFIC = 'beacon_more_specific'
+ROLE_ANCHOR_MORE_SPECIFIC = 'anchor_more_specific'
+ROLE_DEFAULT = 'default'
+ROLE_COVERING = 'covering'
+ROLE_UNRELATED = 'unrelated'
+
+
+# Binary trie of the prefixes of an address family. Node 0 is the root;
+# children[node] = [child for bit 0, child for bit 1], -1 if there is none
+class PrefixTrie:
+    def __init__(self, max_length: int):
+        self.max_length = max_length
+        self.children = [[-1, -1]]
+        # (role, collector) of the prefix ending in the node, None if there is none
+        self.values = [None]
+        # True if some prefix ends in the node or below
+        self.has_prefix_below = [False]
+
+    def insert(self, address: int, length: int, value: Tuple[str, str]):
+        node = 0
+        self.has_prefix_below[node] = True
+        for depth in range(length):
+            bit = (address >> (self.max_length - 1 - depth)) & 1
+            child = self.children[node][bit]
+            if child < 0:
+                child = len(self.children)
+                self.children.append([-1, -1])
+                self.values.append(None)
+                self.has_prefix_below.append(False)
+                self.children[node][bit] = child
+            node = child
+            self.has_prefix_below[node] = True
+        self.values[node] = value
+
+    # Returns (role, collector)
+    def lookup(self, address: int, length: int) -> Tuple[str, Optional[str]]:
+        node = 0
+        longest_match = self.values[0]
+        for depth in range(length):
+            bit = (address >> (self.max_length - 1 - depth)) & 1
+            node = self.children[node][bit]
+            if node < 0:
+                break
+            if self.values[node] is not None:
+                longest_match = self.values[node]
+        else:
+            # The whole prefix is in the trie
+            if self.values[node] is not None:
+                return self.values[node]
+            if longest_match is None and self.has_prefix_below[node]:
+                return ROLE_COVERING, None
+
+        if longest_match is not None:
+            role, collector = longest_match
+            return role + '_more_specific', collector
+        return ROLE_UNRELATED, None
+
+
+class PrefixClassifier:
+    # beacons: as experiment_specs.beacons_2009, ((beacon, ...), anchor, collector)
+    def __init__(self, beacons=beacons_2009):
+        self.tries = {4: PrefixTrie(32), 6: PrefixTrie(128)}
+        for beacon_prefixes, anchor, collector in beacons:
+            for beacon in beacon_prefixes:
+                self.insert(beacon, (ROLE_BEACON, collector.lower()))
+            self.insert(anchor, (ROLE_ANCHOR, collector.lower()))
+        self.cache = {}  # type: dict[str, Tuple[str, Optional[str]]]
+
+    def insert(self, prefix: str, value: Tuple[str, str]):
+        network = ipaddress.ip_network(prefix)
+        self.tries[network.version].insert(int(network.network_address), network.prefixlen, value)
+
+    # Returns (role, collector) of a single prefix (collector is None if
+    # it is not related to a beacon or anchor)
+    def classify_prefix(self, prefix: str) -> Tuple[str, Optional[str]]:
+        result = self.cache.get(prefix)
+        if result is None:
+            try:
+                network = ipaddress.ip_network(prefix, strict=False)
+            except ValueError:
+                result = (ROLE_UNRELATED, None)
+            else:
+                if network.prefixlen == 0:
+                    result = (ROLE_DEFAULT, None)
+                else:
+                    result = self.tries[network.version].lookup(int(network.network_address), network.prefixlen)
+            self.cache[prefix] = result
+        return result
+
+    # Returns a DataFrame with columns role and collector, one row per prefix
+    # (with the index of prefixes if it is a Series)
+    def classify(self, prefixes) -> pd.DataFrame:
+        index = prefixes.index if isinstance(prefixes, pd.Series) else None
+        # Each distinct prefix is classified once (the categories, for categoricals)
+        codes, uniques = factorize(prefixes)
+        classified = [self.classify_prefix(prefix) for prefix in uniques]
+        roles = np.array([role for role, _ in classified] + [ROLE_UNRELATED], dtype=object)
+        collectors = np.array([collector for _, collector in classified] + [None], dtype=object)
+        # codes are -1 for NaN, taking the last (unrelated) entry
+        return pd.DataFrame({'role': roles[codes], 'collector': collectors[codes]}, index=index)
+
+    def roles(self, prefixes) -> np.ndarray:
+        return self.classify(prefixes)['role'].to_numpy()
+
+    # Collector of each beacon and anchor (and more specific) prefix, None for the rest
+    def collectors(self, prefixes) -> pd.Series:
+        return self.classify(prefixes)['collector']
+
+
+@lru_cache(maxsize=None)
+def prefix_classifier(exp_name: str) -> PrefixClassifier:
+    return PrefixClassifier(beacons_2009)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("exp_name")
+    parser.add_argument("prefixes", nargs='+')
+
+    args= parser.parse_args()
+    print(prefix_classifier(args.exp_name).classify(pd.Series(args.prefixes, index=args.prefixes)).to_string())
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+'''
+Quantiles of many groups at once: the values of all the groups are sorted
+once (a single lexsort by group and value), and then any number of quantiles
+of every group are read at computed positions, without per-group callbacks.
+
+Quantiles have the semantics of pandas Series.quantile(q, 'lower') on each
+group: NaN values are ignored, the result is the sorted value at position
+floor((n-1)*q) (with q computed as in numpy.percentile()), and NaN for
+groups without values.
+
+    sorted_groups = SortedGroups(group_ids, values, ngroups)
+    sorted_groups.quantiles([0.5, 0.9])   # ngroups x 2
+
+subset(keep) selects some of the values (e.g., for other thresholds) keeping 
+the order, without sorting again.
+'''
+
+from typing import List
+
+import numpy as np
+
+
+# Position (within its group) of the 'lower' quantile q of groups with counts values
+def lower_positions(counts: np.ndarray, q: float) -> np.ndarray:
+    # Series.quantile() calls numpy.percentile(values, q*100), which divides
+    # by 100 again: e.g., 0.9 becomes 0.9000000000000001
+    q = np.true_divide(np.asarray(q) * 100.0, 100)
+    return np.floor((counts - 1) * q).astype('i8')
+
+
+class SortedGroups:
+    # group_ids: 0..ngroups-1, the group of each value
+    def __init__(self, group_ids: np.ndarray, values: np.ndarray, ngroups: int):
+        values = np.asarray(values, dtype='f8')
+        group_ids = np.asarray(group_ids, dtype='i8')
+        valid = ~np.isnan(values)
+        group_ids = group_ids[valid]
+        values = values[valid]
+        order = np.lexsort((values, group_ids))
+        self._set_sorted(group_ids[order], values[order], np.flatnonzero(valid)[order], ngroups)
+
+    # rows: the position of each sorted value in the values of __init__()
+    def _set_sorted(self, group_ids: np.ndarray, values: np.ndarray, rows: np.ndarray, ngroups: int):
+        self.values = values
+        self.group_ids = group_ids
+        self.rows = rows
+        self.ngroups = ngroups
+        self.counts = np.bincount(self.group_ids, minlength=ngroups)
+        self.starts = np.cumsum(self.counts) - self.counts
+
+    # The values with keep (a bool per value of __init__()), already sorted
+    def subset(self, keep: np.ndarray) -> 'SortedGroups':
+        selected = np.asarray(keep, dtype=bool)[self.rows]
+        subset = SortedGroups.__new__(SortedGroups)
+        subset._set_sorted(self.group_ids[selected], self.values[selected], self.rows[selected], self.ngroups)
+        return subset
+
+    # Quantile q of each group (NaN for groups without values)
+    def quantile(self, q: float) -> np.ndarray:
+        result = np.full(self.ngroups, np.nan)
+        present = self.counts > 0
+        positions = self.starts[present] + lower_positions(self.counts[present], q)
+        result[present] = self.values[positions]
+        return result
+
+    # ngroups x len(quantiles)
+    def quantiles(self, quantiles: List[float]) -> np.ndarray:
+        return np.column_stack([self.quantile(q) for q in quantiles]) if len(quantiles) > 0 else np.zeros((self.ngroups, 0))
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+'''
+Mergeable quantile sketches, one per (monitor_ip, prefix), to compute
+quantiles of the convergence times of many events in bounded memory
+(see per_path_event_filtered2quantiles.py --streaming).
+
+A sketch is a histogram of the values (seconds since the start of the event)
+in buckets, in the way of DDSketch:
+- values below EXACT_LIMIT have a bucket per second, so integer values
+  (timestamps) below EXACT_LIMIT are exact
+- above EXACT_LIMIT, buckets grow geometrically, [L, L*GAMMA), and the value
+  of a bucket has a relative error of at most RELATIVE_ACCURACY
+- negative values are counted as 0
+The number of buckets of a sketch does not depend on the number of values
+(about 500 for a day, 128 + log(86400/128)/log(GAMMA)), and the sketch of the
+union of two sets of values is the sum of the counts of each bucket, so
+sketches of each event are merged into the sketch of the whole experiment.
+
+Sketches are stored as the rows (monitor_ip, prefix, bucket, count) of the
+buckets with values, and quantiles have the semantics of
+quantile(q, 'lower'): the value of the bucket of rank floor((n-1)*q).
+
+    sketches = QuantileSketches()
+    sketches = sketches.merge(QuantileSketches.from_values(event_df, 'max_ts_A'))
+    sketches.quantiles([0.5, 0.9])
+'''
+
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from quantile_engine import lower_positions
+from schemas import QUANTILE_SKETCH_SCHEMA, apply_schema, concat_typed
+
+EXACT_LIMIT = 128
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+
+KEY_COLUMNS = ['monitor_ip', 'prefix']
+SKETCH_COLUMNS = KEY_COLUMNS + ['bucket', 'count']
+
+
+def values2buckets(values: np.ndarray) -> np.ndarray:
+    values = np.maximum(np.asarray(values, dtype='f8'), 0)
+    exact = values < EXACT_LIMIT
+    logarithmic = EXACT_LIMIT + np.floor(np.log(np.maximum(values, EXACT_LIMIT) / EXACT_LIMIT) / np.log(GAMMA))
+    return np.where(exact, np.floor(values), logarithmic).astype('i4')
+
+
+# Value of each bucket: the start of exact buckets, the value with the
+# least relative error for the rest
+def buckets2values(buckets: np.ndarray) -> np.ndarray:
+    buckets = np.asarray(buckets, dtype='f8')
+    lower_bounds = EXACT_LIMIT * np.power(GAMMA, np.maximum(buckets - EXACT_LIMIT, 0))
+    return np.where(buckets < EXACT_LIMIT, buckets, lower_bounds * 2 * GAMMA / (1 + GAMMA))
+
+
+class QuantileSketches:
+    def __init__(self, entries: pd.DataFrame = None):
+        if entries is None:
+            entries = pd.DataFrame({column: pd.Series(dtype='float64') for column in SKETCH_COLUMNS})
+        self.entries = apply_schema(entries[SKETCH_COLUMNS].reset_index(drop=True), QUANTILE_SKETCH_SCHEMA)
+
+    # Sketches of the values of column of df (rows with KEY_COLUMNS), NaN are ignored
+    @classmethod
+    def from_values(cls, df: pd.DataFrame, column: str) -> 'QuantileSketches':
+        df = df[df[column].notna()]
+        buckets = df[KEY_COLUMNS].assign(bucket=values2buckets(df[column].to_numpy()))
+        entries = buckets.groupby(KEY_COLUMNS + ['bucket'], sort=False, observed=True).size().rename('count').reset_index()
+        return cls(entries)
+
+    def merge(self, other: 'QuantileSketches') -> 'QuantileSketches':
+        if len(self.entries) == 0:
+            return other
+        if len(other.entries) == 0:
+            return self
+        entries = concat_typed([self.entries, other.entries], QUANTILE_SKETCH_SCHEMA)
+        return QuantileSketches(entries.groupby(KEY_COLUMNS + ['bucket'], sort=False, observed=True)['count'].sum().reset_index())
+
+    # A row per (monitor_ip, prefix) with values, sorted, and a column per quantile
+    def quantiles(self, quantiles: List[float]) -> pd.DataFrame:
+        entries = self.entries.sort_values(KEY_COLUMNS + ['bucket'])
+        grouped = entries.groupby(KEY_COLUMNS, sort=True, observed=True)
+        counts = grouped['count'].sum().to_numpy()
+        cumulative = np.cumsum(entries['count'].to_numpy())
+        starts = np.cumsum(counts) - counts
+        values = buckets2values(entries['bucket'].to_numpy())
+        result = pd.DataFrame(index=grouped.size().index)
+        for quant in quantiles:
+            # first bucket whose cumulative count exceeds the rank
+            result[quant] = values[np.searchsorted(cumulative, starts + lower_positions(counts, quant), side='right')]
+        return result
@@ -19,38 +19,35 @@ Removes entries without clock information.
 
 
 import pandas as pd
-import numpy as np
 from argparse import ArgumentParser
 from typing import List
 
 from filenames_directories import per_experiment_clock_synch_filename, quantile_filename, quantiles_with_clock_filename
-from experiments import collector_list, beacon_list, beacon2collector
-
-# Returns collector corresponding to a beacon
-def beacon_pref2collector(exp_name: str, beacon_serie: pd.Series) -> pd.Series:
-    for beacon in beacon_list(exp_name):
-        collector = beacon2collector(exp_name, beacon)
-        beacon_serie = beacon_serie.str.replace(beacon, collector)
-    return beacon_serie
+from experiments import collector_list, experiment_catalog
+from schemas import CLOCK_SCHEMA, QUANTILES_SCHEMA, QUANTILES_WITH_CLOCK_SCHEMA, concat_typed, read_typed_csv, write_typed_csv
 
 min_count = 45
+
+# Select only monitor/prefix pairs with more than a number of events
+def select_pairs(qdf: pd.DataFrame, min_count: int) -> pd.DataFrame:
+    return qdf[(qdf['count_A'] > min_count) & (qdf['count_W'] > min_count)]
+
 # read quantiles and filter some info
 def read_quantiles(exp_name: str, collectors: List[str]) -> pd.DataFrame:
     q_list = []
     for collector in collectors:
         filename =  quantile_filename(exp_name, collector)
         try:
-            q_list.append(pd.read_csv(filename))
-        except:
+            q_list.append(read_typed_csv(filename, QUANTILES_SCHEMA))
+        except FileNotFoundError:
             print('could not read data for {}'.format(collector))
-    qdf = pd.concat(q_list, ignore_index=True)
+    qdf = concat_typed(q_list, QUANTILES_SCHEMA)
 
     # remove rows with Nan (e.g., there is no W)
     qdf = qdf.dropna()
 
     total_pairs = len(qdf)
-    # Select only monitor/prefix pairs with more than a number of events
-    qdf = qdf[(qdf['count_A'] > min_count) & (qdf['count_W'] > min_count)]
+    qdf = select_pairs(qdf, min_count)
 
     if (total_pairs != len(qdf)):
         print('Removed {} pairs (too few data) for {}'.format(total_pairs-len(qdf), collector))
@@ -58,6 +55,41 @@ def read_quantiles(exp_name: str, collectors: List[str]) -> pd.DataFrame:
 
     return qdf
 
+# Adds remote_collector and the clock offset error (clock_p_50, clock_p_90) of 
+# (collector, remote_collector) to each pair; pairs without clock information are removed
+def add_clock(qdf: pd.DataFrame, exp_name: str) -> pd.DataFrame:
+    # Read DOWN clock information
+    clock_synch_fn = per_experiment_clock_synch_filename(exp_name, False, True)
+    clock_df = read_typed_csv(clock_synch_fn, CLOCK_SCHEMA)
+    # collector_1,collector_2,p_0,p_50,p_90,p_100,event_count
+    # rrc00,rrc04,3.0,17.0,25.0,73.0,83
+    # rrc00,rrc05,1.0,4.0,17.0,44.0,83
+    
+    # collector corresponding to the beacon
+    qdf = qdf.assign(remote_collector=experiment_catalog(exp_name).prefix_classifier.collectors(qdf['prefix']))
+
+    # clock collectors could be switched: (collector, remote_collector) -> p_50, p_90
+    # in both orders
+    clock_pairs = pd.concat([
+        clock_df.rename(columns={'collector_1': 'collector', 'collector_2': 'remote_collector'}),
+        clock_df.rename(columns={'collector_2': 'collector', 'collector_1': 'remote_collector'})], ignore_index=True)
+    clock_pairs = clock_pairs[['collector', 'remote_collector', 'p_50', 'p_90']].rename(columns={'p_50': 'clock_p_50', 'p_90': 'clock_p_90'})
+    duplicated = clock_pairs.duplicated(['collector', 'remote_collector'], keep=False) & (clock_pairs['collector'] != clock_pairs['remote_collector'])
+    if duplicated.any():
+        first = clock_pairs[duplicated].iloc[0]
+        raise Exception('Should only be ONE clock entry, not two, for ', first['collector'], first['remote_collector'])
+    clock_pairs = clock_pairs.drop_duplicates(['collector', 'remote_collector'])
+
+    qdf = qdf.merge(clock_pairs, on=['collector', 'remote_collector'], how='left')
+    # same collector as prefix origin
+    same_collector = qdf['collector'] == qdf['remote_collector']
+    qdf.loc[same_collector, 'clock_p_50'] = 0
+    qdf.loc[same_collector, 'clock_p_90'] = 0
+        
+    # Remove collector pairs without clock measurement
+    # Note that this may reduce the number of pairs to compare
+    return qdf.dropna()
+
 if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("exp_name")
@@ -72,51 +104,7 @@ if __name__ == "__main__":
     # 195.66.224.121,84.205.64.0/24,4,34,49,65,9,55,79,550,281,40.0,95.0,121.0,581.0,40.0,95.0,121.0,581.0,81.0,0,1,rrc01
 
 
-    # Read DOWN clock information
-    clock_synch_fn = per_experiment_clock_synch_filename(exp_name, False, True)
-    clock_df = pd.read_csv(clock_synch_fn)
-    # collector_1,collector_2,p_0,p_50,p_90,p_100,event_count
-    # rrc00,rrc04,3.0,17.0,25.0,73.0,83
-    # rrc00,rrc05,1.0,4.0,17.0,44.0,83
-    
-    qdf['remote_collector'] = beacon_pref2collector(exp_name, qdf['prefix'])
-    qdf['clock_p_50'] = np.NaN
-    qdf['clock_p_90'] = np.NaN
-
-
-    for index, row in qdf.iterrows():
-        collector = row['collector']
-        remote_collector = row['remote_collector']
-
-        # same collector as prefix origin
-        if collector == remote_collector:
-            qdf.at[index, 'clock_p_50'] = 0
-            qdf.at[index, 'clock_p_90'] = 0
-        else:
-            # clock collectors could be switched
-            clock_row1 = clock_df[ (clock_df['collector_1'] == collector) & (clock_df['collector_2']== remote_collector) ]
-            clock_row2 = clock_df[ (clock_df['collector_2'] == collector) & (clock_df['collector_1']== remote_collector) ]
-            
-            if (len(clock_row1)==0) & (len(clock_row2)==0):
-                #print('Warning, Should be a clock entry for ', collector, remote_collector)
-                pass
-                
-            elif (len(clock_row1)>0) & (len(clock_row2)>0):
-                raise Exception('Should only be ONE clock entry, not two, for ', collector, remote_collector)
-            else:
-                if len(clock_row1):
-                    clock_row = clock_row1
-                else:
-                    clock_row = clock_row2
-            
-                # Modify dataframe
-                qdf.at[index, 'clock_p_50'] = clock_row['p_50']
-                qdf.at[index, 'clock_p_90'] = clock_row['p_90']
-        
-    # Remove collector pairs without clock measurement
-    # Note that this may reduce the number of pairs to compare
-    qdf = qdf.dropna()
+    qdf = add_clock(qdf, exp_name)
 
-    
     fn = quantiles_with_clock_filename(exp_name)
-    qdf.to_csv(fn, index=False)
+    write_typed_csv(qdf, fn, QUANTILES_WITH_CLOCK_SCHEMA, index=False)
@@ -11,6 +11,8 @@ import pandas as pd
 import numpy as np
 from argparse import ArgumentParser
 from filenames_directories import quantiles_with_clock_filename
+from ip_keys import FAMILY_IPV4, FAMILY_IPV6, families
+from schemas import QUANTILES_WITH_CLOCK_SCHEMA, read_typed_csv
 
 clock_error = 'clock_p_90'
 
@@ -47,12 +49,12 @@ def add_clock_info(qdf: pd.DataFrame) -> pd.DataFrame:
 
 # Only v4 beacons remain
 def only_ipv4(qdf: pd.DataFrame) -> pd.DataFrame:
-    qdf = qdf[~qdf.prefix.str.contains(':')]
+    qdf = qdf[families(qdf['prefix']) == FAMILY_IPV4]
     return qdf
 
 # Only v6 beacons remain
 def only_ipv6(qdf: pd.DataFrame) -> pd.DataFrame:
-    qdf = qdf[qdf.prefix.str.contains(':')]
+    qdf = qdf[families(qdf['prefix']) == FAMILY_IPV6]
     return qdf
 
 
@@ -105,7 +107,7 @@ if __name__ == "__main__":
     exp_name = args.exp_name
     
     fn = quantiles_with_clock_filename(exp_name)
-    qdf = pd.read_csv(fn)
+    qdf = read_typed_csv(fn, QUANTILES_WITH_CLOCK_SCHEMA)
 
     min_events =  45
     
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+
+'''
+Offline replacement for _pybgpstream.BGPStream and BGPRecord.
+
+Replays elems from local fixture files instead of the RIS archive, so that 
+download.py can be run (and profiled) without network access:
+    ./download.py 20181001_30d rrc00 0 --both --replay /data/fixtures/
+
+Fixtures are read from REPLAY_DIRECTORY/COLLECTOR/:
+- RIS update files in MRT format, 'updates.YYYYMMDD.HHMM[.gz|.bz2]', read 
+  with mrt_reader.py. Only files overlapping the interval filter are read.
+- RIS RIB dumps, 'bview.YYYYMMDD.HHMM[.gz|.bz2]', producing 'R' elems. 
+  Only dumps starting in the interval filter are read.
+  'download_updates/' (see download_updates_directory()) can be used as 
+  REPLAY_DIRECTORY.
+- files ending in .csv. Each line has the same format as the files generated by download.py:
+BGP_message_type,timestamp,monitor_IP,monitor_AS,prefix,AS_PATH
+A,1270094405,2001:610:1e08:4::5,196613,2001:7fb:fe03::/48,196613 1125 1103 12859 12654
+W,1270094409,145.125.80.5,196613,84.205.79.0/24,
+so an existing '.../download/' directory can be used as REPLAY_DIRECTORY.
+  Only files with elems in the interval filter are read: the first and 
+  last timestamp of each file are kept in COLLECTOR/replay.index (csv 
+  format, with another extension so that it is not read as a fixture), 
+  computed the first time the directory is replayed, and again only for 
+  the files added or modified since.
+
+Filters behave as in pybgpstream:
+- 'collector': only the collectors added are read.
+- 'record-type': 'updates' or 'ribs' (both if not set).
+- 'prefix': elems for the prefix or more specific prefixes.
+- interval filter: elems with init_timestamp <= time <= end_timestamp.
+Records are returned in timestamp order (files are merged), one elem per record.
+'''
+
+import calendar
+import csv
+import heapq
+import os
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from mrt_reader import BGPElem, PrefixMatcher, read_rib_files, read_update_files
+
+# Maximum duration of a RIS update file (5 min since 2003, previously 15 min)
+UPDATE_FILE_MAX_DURATION = 15*60
+
+
+class BGPRecord:
+    def __init__(self):
+        self.project = 'replay'
+        self.collector = None
+        self.type = 'update'
+        self.time = None
+        self.status = 'empty'
+        self._elems = []
+
+    def get_next_elem(self) -> Optional[BGPElem]:
+        if len(self._elems) == 0:
+            return None
+        return self._elems.pop(0)
+
+
+# 'updates.20181001.0400.gz' -> 1538366400, None if it is not an update file
+# (or a RIB dump, 'bview.20181001.0000.gz', for kind = 'bview')
+def update_filename2timestamp(filename: str, kind: str = 'updates') -> Optional[int]:
+    parts = os.path.basename(filename).split('.')
+    if len(parts) < 3 or parts[0] != kind:
+        return None
+    try:
+        return calendar.timegm(time.strptime(parts[1] + parts[2], '%Y%m%d%H%M'))
+    except ValueError:
+        return None
+
+
+# 'A,1270094405,2001:610:1e08:4::5,196613,2001:7fb:fe03::/48,196613 1125 1103'
+def csv_line2elem(line: str) -> BGPElem:
+    elem_type, timestamp, peer_address, peer_asn, prefix, as_path = line.rstrip('\n').split(',', 5)
+    fields = {'prefix': prefix}
+    if elem_type == 'A':
+        fields['as-path'] = as_path
+    return BGPElem(elem_type, int(timestamp), peer_address, int(peer_asn), fields)
+
+
+def read_csv_fixture(filename: str) -> Iterator[BGPElem]:
+    with open(filename) as f:
+        for line in f:
+            if line.strip():
+                yield csv_line2elem(line)
+
+
+CSV_INDEX_FILENAME = 'replay.index'
+CSV_INDEX_COLUMNS = ['filename', 'size', 'mtime', 'first_timestamp', 'last_timestamp']
+
+
+# (first timestamp, last timestamp) of the elems of a csv fixture, 
+# (None, None) if it has none
+def csv_fixture_interval(filename: str) -> Tuple[Optional[int], Optional[int]]:
+    first_timestamp = None
+    last_timestamp = None
+    with open(filename) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            timestamp = int(line.split(',', 2)[1])
+            if first_timestamp is None or timestamp < first_timestamp:
+                first_timestamp = timestamp
+            if last_timestamp is None or timestamp > last_timestamp:
+                last_timestamp = timestamp
+    return first_timestamp, last_timestamp
+
+
+# {filename (without directory): (first timestamp, last timestamp)} of the
+# csv fixtures of directory, from its replay.index. Files not in the index,
+# or with another size or modification time, are read and the index is 
+# written again (if the directory cannot be written, the index is not kept).
+def csv_fixture_index(directory: str) -> Dict[str, Tuple[Optional[int], Optional[int]]]:
+    index_filename = os.path.join(directory, CSV_INDEX_FILENAME)
+    entries = {}
+    if os.path.isfile(index_filename):
+        with open(index_filename) as f:
+            for entry in csv.DictReader(f):
+                entries[entry['filename']] = entry
+    result = {}
+    changed = False
+    for fn in sorted(os.listdir(directory)):
+        if not fn.endswith('.csv'):
+            continue
+        stat = os.stat(os.path.join(directory, fn))
+        entry = entries.get(fn)
+        if entry is None or int(entry['size']) != stat.st_size or int(entry['mtime']) != stat.st_mtime_ns:
+            first_timestamp, last_timestamp = csv_fixture_interval(os.path.join(directory, fn))
+            entry = {'filename': fn, 'size': stat.st_size, 'mtime': stat.st_mtime_ns,
+                'first_timestamp': '' if first_timestamp is None else first_timestamp,
+                'last_timestamp': '' if last_timestamp is None else last_timestamp}
+            entries[fn] = entry
+            changed = True
+        if entry['first_timestamp'] == '':
+            result[fn] = (None, None)
+        else:
+            result[fn] = (int(entry['first_timestamp']), int(entry['last_timestamp']))
+    if changed or len(entries) != len(result):
+        tmp_filename = index_filename + '.' + str(os.getpid()) + '.tmp'
+        try:
+            with open(tmp_filename, 'w') as f:
+                writer = csv.DictWriter(f, CSV_INDEX_COLUMNS)
+                writer.writeheader()
+                writer.writerows(entries[fn] for fn in result)
+            os.replace(tmp_filename, index_filename)
+        except OSError:
+            pass
+    return result
+
+
+class BGPStream:
+    def __init__(self, replay_directory: str):
+        self.replay_directory = replay_directory
+        self.collectors = []
+        self.prefixes = []
+        self.record_types = []
+        self.init_timestamp = None
+        self.end_timestamp = None
+        self._elems = None
+        self._is_prefix_selected = None
+
+    def add_filter(self, filter_type: str, value: str):
+        if filter_type == 'collector':
+            self.collectors.append(value)
+        elif filter_type == 'prefix':
+            self.prefixes.append(value)
+        elif filter_type == 'record-type':
+            self.record_types.append(value)
+        else:
+            raise Exception('Filter type not supported by the replay stream: ' + filter_type)
+
+    def add_interval_filter(self, init_timestamp: int, end_timestamp: int):
+        self.init_timestamp = init_timestamp
+        self.end_timestamp = end_timestamp
+
+    # csv fixtures with elems in the interval filter
+    def csv_filenames(self, collector: str) -> List[str]:
+        directory = os.path.join(self.replay_directory, collector)
+        if not os.path.isdir(directory):
+            return []
+        csv_files = []
+        for fn, (first_timestamp, last_timestamp) in sorted(csv_fixture_index(directory).items()):
+            if first_timestamp is None:
+                continue
+            if self.end_timestamp is not None and first_timestamp > self.end_timestamp:
+                continue
+            if self.init_timestamp is not None and last_timestamp < self.init_timestamp:
+                continue
+            csv_files.append(os.path.join(directory, fn))
+        return csv_files
+
+    def update_filenames(self, collector: str) -> List[str]:
+        directory = os.path.join(self.replay_directory, collector)
+        if not os.path.isdir(directory):
+            return []
+        # (timestamp, filename), sorted by time
+        update_files = []
+        for fn in os.listdir(directory):
+            timestamp = update_filename2timestamp(fn)
+            if timestamp is None:
+                continue
+            if self.end_timestamp is not None and timestamp > self.end_timestamp:
+                continue
+            if self.init_timestamp is not None and timestamp + UPDATE_FILE_MAX_DURATION <= self.init_timestamp:
+                continue
+            update_files.append((timestamp, os.path.join(directory, fn)))
+        return [fn for _, fn in sorted(update_files)]
+
+    def rib_filenames(self, collector: str) -> List[str]:
+        directory = os.path.join(self.replay_directory, collector)
+        if not os.path.isdir(directory):
+            return []
+        rib_files = []
+        for fn in os.listdir(directory):
+            timestamp = update_filename2timestamp(fn, 'bview')
+            if timestamp is None:
+                continue
+            if self.init_timestamp is not None and timestamp < self.init_timestamp:
+                continue
+            if self.end_timestamp is not None and timestamp > self.end_timestamp:
+                continue
+            rib_files.append((timestamp, os.path.join(directory, fn)))
+        return [fn for _, fn in sorted(rib_files)]
+
+    def collector_elems(self, collector: str) -> Iterator[BGPElem]:
+        readers = []
+        if len(self.record_types) == 0 or 'updates' in self.record_types:
+            readers += [read_csv_fixture(fn) for fn in self.csv_filenames(collector)]
+            update_filenames = self.update_filenames(collector)
+            if len(update_filenames) > 0:
+                # Prefix and interval filters are applied while decoding
+                readers.append(read_update_files(update_filenames, self.prefixes, self.init_timestamp, self.end_timestamp))
+        if len(self.record_types) == 0 or 'ribs' in self.record_types:
+            rib_filenames = self.rib_filenames(collector)
+            if len(rib_filenames) > 0:
+                readers.append(read_rib_files(rib_filenames, self.prefixes))
+        return heapq.merge(*readers, key=lambda elem: elem.time)
+
+    def is_prefix_selected(self, prefix: str) -> bool:
+        return self._is_prefix_selected(prefix)
+
+    def is_elem_selected(self, elem: BGPElem) -> bool:
+        # RIB dumps are selected by the time of the dump (the file)
+        if elem.type == 'R':
+            return self.is_prefix_selected(elem.fields['prefix'])
+        if self.init_timestamp is not None and elem.time < self.init_timestamp:
+            return False
+        if self.end_timestamp is not None and elem.time > self.end_timestamp:
+            return False
+        return self.is_prefix_selected(elem.fields['prefix'])
+
+    def start(self):
+        self._is_prefix_selected = PrefixMatcher(self.prefixes)
+        if len(self.collectors) > 0:
+            collectors = self.collectors
+        else:
+            collectors = sorted(os.listdir(self.replay_directory))
+        streams = [self._tag_collector(collector) for collector in collectors]
+        self._elems = heapq.merge(*streams, key=lambda pair: pair[1].time)
+
+    def _tag_collector(self, collector: str):
+        for elem in self.collector_elems(collector):
+            if self.is_elem_selected(elem):
+                yield collector, elem
+
+    def get_next_record(self, rec: BGPRecord) -> bool:
+        if self._elems is None:
+            raise Exception('get_next_record() called before start()')
+        try:
+            collector, elem = next(self._elems)
+        except StopIteration:
+            return False
+        rec.collector = collector
+        rec.time = elem.time
+        rec.status = 'valid'
+        rec._elems = [elem]
+        return True
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+'''
+For each event, reads the last RIB dump of the collector started before the 
+event (RIS dumps RIBs every 8 hours, at 00:00, 08:00 and 16:00) and records 
+which monitors had a route for each beacon and anchor prefix, i.e., the 
+state of the path when the event started.
+Only the beacon and anchor prefixes are requested (and decoded), 
+each RIB dump is read once for all the events that use it.
+
+Uses pybgpstream (or the fixtures of replay_stream.py with --replay, or 
+the RIS RIB dumps 'bview.YYYYMMDD.HHMM.gz' in 'download_updates/COLLECTOR/' 
+with --local_updates).
+
+Generates a single file per collector, in 'initial_state/' directory, 
+with one line per (monitor_ip, prefix) present in the RIB before the event:
+
+monitor_ip,prefix,event_number
+12.0.1.63,84.205.64.0/24,0
+12.0.1.63,84.205.65.0/24,0
+
+Used by downloaded2per_path_event.py --initial_state.
+'''
+
+from argparse import ArgumentParser
+import pandas as pd
+from typing import List, Optional, Set, Tuple
+
+from download import new_stream
+from experiments import anchor_list, beacon_list, events_in_experiment, event_number2rib_timestamp
+from filenames_directories import download_updates_basedir, initial_state_filename
+
+INITIAL_STATE_COLUMNS = ['monitor_ip', 'prefix', 'event_number']
+
+
+# Returns the (monitor_ip, prefix) pairs of the RIB dump of the collector 
+# started at rib_timestamp, for the prefixes indicated
+def read_rib(collector:str, rib_timestamp:int, prefixes: List[str], replay_directory: Optional[str] = None) -> Set[Tuple[str, str]]:
+    stream, rec = new_stream(replay_directory)
+    stream.add_filter('collector', collector)
+    stream.add_filter('record-type', 'ribs')
+    for prefix in prefixes:
+        stream.add_filter('prefix', prefix)
+    stream.add_interval_filter(rib_timestamp, rib_timestamp)
+    stream.start()
+
+    # pybgpstream also returns more specific prefixes
+    selected = set(prefixes)
+    pairs = set()
+    while(stream.get_next_record(rec)):
+        if rec is None or rec.status != "valid":
+            continue
+        elem = rec.get_next_elem()
+        while(elem):
+            if elem.type == 'R' and elem.fields['prefix'] in selected:
+                pairs.add((elem.peer_address, elem.fields['prefix']))
+            elem = rec.get_next_elem()
+    return pairs
+
+
+# ./rib2initial_state.py 20181001_30d rrc00
+# ./rib2initial_state.py 20181001_30d rrc00 --local_updates
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("exp_name")
+    parser.add_argument("collector")
+    parser.add_argument("--replay", help="reads RIB dumps from fixtures in REPLAY/COLLECTOR/ instead of pybgpstream")
+    parser.add_argument("--local_updates", help="reads the RIS RIB dumps in download_updates/COLLECTOR/", action='store_true')
+
+    args= parser.parse_args()
+    exp_name = args.exp_name
+    collector = args.collector
+
+    replay_directory = args.replay
+    if args.local_updates:
+        replay_directory = download_updates_basedir(exp_name)
+
+    prefixes = beacon_list(exp_name) + anchor_list(exp_name)
+
+    # rib_timestamp -> events starting after that dump (and before the next one)
+    events_per_rib = {}
+    for event_number in range(events_in_experiment(exp_name)):
+        events_per_rib.setdefault(event_number2rib_timestamp(exp_name, event_number), []).append(event_number)
+
+    rows = []
+    for rib_timestamp, event_numbers in sorted(events_per_rib.items()):
+        pairs = read_rib(collector, rib_timestamp, prefixes, replay_directory)
+        if len(pairs) == 0:
+            print('No RIB data for {} at {}'.format(collector, rib_timestamp))
+        for event_number in event_numbers:
+            rows.extend((monitor_ip, prefix, event_number) for monitor_ip, prefix in sorted(pairs))
+
+    pd.DataFrame(rows, columns=INITIAL_STATE_COLUMNS).to_csv(initial_state_filename(exp_name, collector), index=False)
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+
+'''
+Column types of the files of each processing step, used by all the
+readers and writers (read_csv() would otherwise infer them:
+strings as objects, counts as float64 once there is a NaN).
+
+- IPs, prefixes, collectors and AW are categoricals. Categories are sorted,
+  so that groupby() and sort_index() produce the same order as with strings.
+  Group with observed=True, otherwise groupby() on several categorical
+  columns returns all the combinations of categories.
+- Counts, event numbers and timestamps that are always present (e.g.,
+  min_ts_A, relative to the start of the event, 0..7200) are narrow
+  integers. Columns that may be empty (e.g., min_ts_W of a path without
+  withdrawals) are float32: NaN keeps the comparison semantics of the
+  processing steps (NaN > x is False), which nullable integers would
+  turn into NA. Float columns with only integer values are written as
+  integers ('100', not '100.0'), as they were before having a schema.
+- Columns not in the schema (e.g., as_path) keep the type inferred.
+
+    df = read_typed_csv(filename, PER_PATH_EVENT_SCHEMA)
+    df = concat_typed(frames, PER_PATH_EVENT_SCHEMA)
+    write_typed_csv(df, filename, PER_PATH_EVENT_SCHEMA, index=False)
+'''
+
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+CATEGORY = 'category'
+
+# download/COLLECTOR/beacon_EVENT_NUMBER.csv (absolute timestamps)
+DOWNLOAD_SCHEMA = {
+    'AW': CATEGORY,
+    'timestamp': 'int64',
+    'monitor_ip': CATEGORY,
+    'monitor_as': 'uint32',
+    'prefix': CATEGORY,
+}
+
+# download/COLLECTOR/beacon_dataset.npy.gz
+DATASET_SCHEMA = dict(DOWNLOAD_SCHEMA, event_number='int16')
+
+# per_path_event/ and per_path_event_filtered/
+PER_PATH_EVENT_SCHEMA = {
+    'monitor_ip': CATEGORY,
+    'prefix': CATEGORY,
+    'min_ts_A': 'int32',
+    'max_ts_A': 'int32',
+    'count_A': 'int32',
+    'min_ts_W': 'float32',
+    'max_ts_W': 'float32',
+    'count_W': 'float32',
+    'as_path_count_A': 'int32',
+    'different_ases_count_A': 'int32',
+    'last_as_path_length_A': 'int32',
+    'event_number': 'int16',
+    'initial_state': 'int8',
+}
+
+# initial_state/COLLECTOR.csv
+INITIAL_STATE_SCHEMA = {
+    'monitor_ip': CATEGORY,
+    'prefix': CATEGORY,
+    'event_number': 'int16',
+}
+
+# path_exploration/ (and the keys of path_sequence_index/)
+PATH_EXPLORATION_SCHEMA = {
+    'monitor_ip': CATEGORY,
+    'prefix': CATEGORY,
+    'event_number': 'int16',
+    'announcements': 'int32',
+    'withdrawals': 'int32',
+    'path_hunting_length': 'int32',
+    'distinct_paths': 'int32',
+    'oscillations': 'int32',
+    'first_arrival': 'int32',
+    'last_arrival': 'int32',
+    'time_to_final_path': 'int32',
+    'final_withdrawn': 'int8',
+}
+
+# distinct_counts_*.csv (and the keys of the sketches of distinct_sketches/)
+DISTINCT_COUNTS_SCHEMA = {
+    'monitor_ip': CATEGORY,
+    'prefix': CATEGORY,
+    'distinct_paths': 'float32',
+    'distinct_ases': 'float32',
+}
+
+# zombies/ (see zombie_rfd_classifier.py)
+ZOMBIE_LABELS_SCHEMA = {
+    'monitor_ip': CATEGORY,
+    'prefix': CATEGORY,
+    'event_number': 'int16',
+    'label': CATEGORY,
+}
+
+# quantiles/
+QUANTILES_SCHEMA = {
+    'monitor_ip': CATEGORY,
+    'prefix': CATEGORY,
+    'minA_q0': 'float32',
+    'minA_q50_UP': 'float32',
+    'maxA_q50_UP': 'float32',
+    'minA_q90_UP': 'float32',
+    'maxA_q90_UP': 'float32',
+    'count_A': 'int32',
+    'count_UP_events': 'int16',
+    'min_q50_DOWN': 'float32',
+    'maxW_q50_DOWN': 'float32',
+    'min_q90_DOWN': 'float32',
+    'maxW_q90_DOWN': 'float32',
+    'count_W': 'float32',
+    'count_DOWN_events': 'int16',
+    'as_path_count_DOWN': 'float32',
+    'ases_different_one_event_DOWN': 'float32',
+    'last_as_path_length_DOWN': 'float32',
+    'zombie_count': 'int16',
+    'rfd_count_UP': 'int16',
+    'rfd_count_DOWN': 'int16',
+    'collector': CATEGORY,
+}
+
+# Buckets of the quantile sketches (see quantile_sketch.py)
+QUANTILE_SKETCH_SCHEMA = {
+    'monitor_ip': CATEGORY,
+    'prefix': CATEGORY,
+    'bucket': 'int16',
+    'count': 'int32',
+}
+
+# quantiles_state/ (counts and sketches per (monitor_ip, prefix), and
+# events of the state, see QuantileState)
+QUANTILES_STATE_SCHEMA = dict(QUANTILES_SCHEMA, normal_events='int16')
+QUANTILE_SKETCH_STATE_SCHEMA = dict(QUANTILE_SKETCH_SCHEMA, metric=CATEGORY)
+QUANTILES_STATE_EVENTS_SCHEMA = {
+    'event_number': 'int16',
+}
+
+# quantiles_with_clock.csv
+QUANTILES_WITH_CLOCK_SCHEMA = dict(QUANTILES_SCHEMA,
+    remote_collector=CATEGORY, clock_p_50='float32', clock_p_90='float32')
+
+# threshold_sweep.csv (one row per combination of thresholds and family,
+# plus a mean_* column per quantile column of quantiles/)
+THRESHOLD_SWEEP_SCHEMA = {
+    'anchor_lookback': 'int32',
+    'rfd_thr': 'int32',
+    'zombie_thr': 'int32',
+    'min_count': 'int32',
+    'min_events': 'int32',
+    'family': 'int8',
+    'pairs': 'int32',
+    'monitors': 'int32',
+    'zombie_events': 'int32',
+    'zombie_fraction': 'float32',
+    'rfd_fraction': 'float32',
+    'rfd_DOWN_fraction': 'float32',
+    'rfd_pairs_fraction': 'float32',
+    'mean_clock_p_90': 'float32',
+    'messages_UP': 'float32',
+    'messages_DOWN': 'float32',
+    'as_path_count_DOWN': 'float32',
+    'ases_different_one_event_DOWN': 'float32',
+    'last_as_path_length_DOWN': 'float32',
+}
+
+# per_collector_event_mins/
+PER_COLLECTOR_EVENT_MINS_SCHEMA = {
+    'collector_src': CATEGORY,
+    'collector_dst': CATEGORY,
+    'event_number': 'int16',
+    'min_time': 'float32',
+}
+
+# per_event_shortest_distance.csv
+PER_EVENT_SHORTEST_DISTANCE_SCHEMA = {
+    'collector_1': CATEGORY,
+    'collector_2': CATEGORY,
+    'event_number': 'int16',
+    'min_time_1': 'float32',
+    'min_time_2': 'float32',
+    'weight': 'float32',
+    'shortest_distance': 'float32',
+}
+
+# per_experiment_clock_synch_*.csv
+CLOCK_SCHEMA = {
+    'collector_1': CATEGORY,
+    'collector_2': CATEGORY,
+    'p_0': 'float32',
+    'p_50': 'float32',
+    'p_90': 'float32',
+    'p_100': 'float32',
+    'event_count': 'int16',
+}
+
+
+def categorical_columns(schema: Dict[str, str]) -> List[str]:
+    return [column for column, dtype in schema.items() if dtype == CATEGORY]
+
+
+# Converts the columns (and index levels) of df in the schema.
+# Categories are sorted.
+def apply_schema(df: pd.DataFrame, schema: Dict[str, str]) -> pd.DataFrame:
+    dtypes = {column: dtype for column, dtype in schema.items() if column in df.columns and df[column].dtype != dtype}
+    if len(dtypes) > 0:
+        df = df.astype(dtypes)
+    for column in categorical_columns(schema):
+        if column in df.columns and not df[column].cat.ordered and not df[column].cat.categories.is_monotonic_increasing:
+            df[column] = df[column].cat.reorder_categories(sorted(df[column].cat.categories))
+    # The index is converted only if all its levels are named and are not
+    # also columns (e.g., the index of groupby().apply() is left as it is)
+    index_names = list(df.index.names)
+    if any(name in schema for name in index_names) and all(name is not None and name not in df.columns for name in index_names):
+        df = apply_schema(df.reset_index(), schema).set_index(index_names)
+    return df
+
+
+# Strings are read as categories directly; numeric columns are converted
+# afterwards, so that files written before with floats (e.g., '12.0')
+# can be read as integers
+def read_typed_csv(filename: str, schema: Dict[str, str], **kwargs) -> pd.DataFrame:
+    dtype = {column: CATEGORY for column in categorical_columns(schema)}
+    return apply_schema(pd.read_csv(filename, dtype=dtype, **kwargs), schema)
+
+
+# pd.concat() of frames with categoricals with different categories
+# would return objects: categories are unified before. Frames without rows
+# (e.g., a per_path_event_filtered file with only the header) are left out:
+# their categories may have another dtype (object instead of str)
+def concat_typed(frames: List[pd.DataFrame], schema: Dict[str, str]) -> pd.DataFrame:
+    frames = [apply_schema(frame, schema) for frame in frames]
+    if any(len(frame) > 0 for frame in frames):
+        frames = [frame for frame in frames if len(frame) > 0]
+    for column in categorical_columns(schema):
+        if all(column in frame.columns for frame in frames) and len(frames) > 0:
+            categories = union_categoricals([frame[column] for frame in frames], sort_categories=True).categories
+            frames = [frame.assign(**{column: frame[column].cat.set_categories(categories)}) for frame in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+# Float columns whose values (but NaN) are all integers, as nullable integers
+def integral_floats(df: pd.DataFrame) -> pd.DataFrame:
+    integral = {}
+    for column in df.columns:
+        if df[column].dtype.kind != 'f':
+            continue
+        values = df[column].to_numpy()
+        values = values[~np.isnan(values)]
+        if np.isfinite(values).all() and (values == np.floor(values)).all():
+            integral[column] = 'Int64'
+    return df.astype(integral) if len(integral) > 0 else df
+
+
+def write_typed_csv(df: pd.DataFrame, filename: str, schema: Dict[str, str], **kwargs):
+    integral_floats(apply_schema(df, schema)).to_csv(filename, **kwargs)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+'''
+Reads a contiguous multi-day update stream of a collector (events
+first_event..last_event, by default the whole experiment) and generates
+a single dataset per collector and beacon/anchor, instead of a file per event.
+Each update is assigned to its event with a vectorized search over the
+sorted event boundaries (see timestamps2event_numbers() in experiments.py);
+updates between events (e.g., 08:00 to 12:00) are discarded.
+
+Uses pybgpstream, or local files with --replay / --local_updates (as download.py).
+
+The resulting files (see download_format.py) go to '../download/':
+.../download/COLLECTOR/beacon_dataset.npy.gz
+                      /anchor_dataset.npy.gz
+with the columns of the download files plus event_number.
+Subsequent stages read the dataset with --dataset (downloaded2per_path_event.py,
+downloaded2path_sequence_index.py, per_path_event2per_path_event_filtered.py),
+see read_dataset_events() in download_format.py.
+'''
+
+from argparse import ArgumentParser
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from experiments import experiment_catalog, timestamps2event_numbers, events_in_experiment
+from filenames_directories import download_dataset_filename, download_updates_basedir
+from download import new_event_stream, stream_elems
+from download_format import BATCH_SIZE, DATASET_COLUMNS, DatasetWriter
+
+
+# Accumulates the elems of the stream, and writes them to the beacon and
+# anchor datasets every BATCH_SIZE elems
+class DatasetBatcher:
+    def __init__(self, exp_name:str, first_event:int, last_event:int, writers):
+        self.exp_name = exp_name
+        self.first_event = first_event
+        self.last_event = last_event
+        # writers[anchor]
+        self.writers = writers
+        self.catalog = experiment_catalog(exp_name)
+        self.rows = []
+
+    def add_elem(self, elem):
+        if elem.type == 'A':
+            as_path = elem.fields['as-path']
+        elif elem.type == 'W':
+            as_path = ''
+        else:
+            return
+        self.rows.append((elem.type, elem.time, elem.peer_address, elem.peer_asn, elem.fields['prefix'], as_path))
+        if len(self.rows) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if len(self.rows) == 0:
+            return
+        columns = dict(zip(DATASET_COLUMNS, [np.array(values) for values in zip(*self.rows)]))
+        self.rows = []
+        columns['timestamp'] = columns['timestamp'].astype('i8')
+        columns['monitor_as'] = columns['monitor_as'].astype('i8')
+        columns['event_number'] = timestamps2event_numbers(self.exp_name, columns['timestamp'], self.first_event, self.last_event)
+        in_event = columns['event_number'] >= 0
+        is_anchor = self.catalog.is_anchor(pd.Series(columns['prefix'])).to_numpy()
+        for anchor, writer in self.writers.items():
+            selected = in_event & (is_anchor == anchor)
+            writer.write_batch({column: values[selected] for column, values in columns.items()})
+
+
+# Reads the stream of events first_event..last_event of a collector once,
+# and writes the datasets of the kinds in anchor_kinds (False: beacons, True: anchors).
+# Returns the number of records written.
+def stream2event_dataset(exp_name:str, collector:str, first_event:int, last_event:int, anchor_kinds,
+        replay_directory: Optional[str] = None, download_format:str = 'gz') -> int:
+    stream, rec = new_event_stream(exp_name, collector, first_event, last_event, anchor_kinds, replay_directory)
+
+    writers = {anchor: DatasetWriter(download_dataset_filename(exp_name, collector, anchor, download_format), download_format)
+        for anchor in anchor_kinds}
+    batcher = DatasetBatcher(exp_name, first_event, last_event, writers)
+    try:
+        for elem in stream_elems(stream, rec, collector):
+            batcher.add_elem(elem)
+        batcher.flush()
+    except:
+        # Do not leave partial files
+        for writer in writers.values():
+            writer.abort()
+        raise
+
+    for writer in writers.values():
+        writer.close()
+    return sum([writer.records for writer in writers.values()])
+
+
+# ./stream2event_dataset.py 20181001_30d rrc00
+# ./stream2event_dataset.py 20181001_30d rrc00 --first_event 0 --last_event 29 --format zst
+# ./stream2event_dataset.py 20181001_30d rrc00 --local_updates
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("exp_name")
+    parser.add_argument("collector")
+    parser.add_argument("--first_event", type=int, default=0)
+    parser.add_argument("--last_event", help="by default, the last event of the experiment", type=int)
+    parser.add_argument("--anchors", help="if set, only anchors, otherwise beacons and anchors", action='store_true')
+    parser.add_argument("--beacons", help="if set, only beacons, otherwise beacons and anchors", action='store_true')
+    parser.add_argument("--replay", help="reads elems from fixtures in REPLAY/COLLECTOR/ instead of pybgpstream")
+    parser.add_argument("--local_updates", help="reads elems from the RIS update files in download_updates/COLLECTOR/", action='store_true')
+    parser.add_argument("--format", help="format of the dataset (see download_format.py)", choices=['gz', 'zst'], default='gz')
+
+    args= parser.parse_args()
+    exp_name = args.exp_name
+    collector = args.collector
+
+    last_event = args.last_event
+    if last_event is None:
+        last_event = events_in_experiment(exp_name) - 1
+
+    if args.anchors:
+        anchor_kinds = [True]
+    elif args.beacons:
+        anchor_kinds = [False]
+    else:
+        anchor_kinds = [False, True]
+
+    replay_directory = args.replay
+    if args.local_updates:
+        replay_directory = download_updates_basedir(exp_name)
+
+    records = stream2event_dataset(exp_name, collector, args.first_event, last_event, anchor_kinds, replay_directory, args.format)
+    print('{} {}: {} records for events {}..{}'.format(exp_name, collector, records, args.first_event, last_event))
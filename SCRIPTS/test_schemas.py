@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+
+import io
+
+from schemas import PER_PATH_EVENT_SCHEMA, concat_typed, read_typed_csv
+
+HEADER = 'monitor_ip,prefix,min_ts_A,event_number\n'
+
+
+# A file with only the header (an event without rows after the filter)
+# has categories of another dtype than a file with rows
+def test_concat_typed_with_empty_frame():
+    empty = read_typed_csv(io.StringIO(HEADER), PER_PATH_EVENT_SCHEMA)
+    rows = read_typed_csv(io.StringIO(HEADER + '10.0.0.1,84.205.64.0/24,3,1\n10.0.0.2,84.205.65.0/24,5,1\n'), PER_PATH_EVENT_SCHEMA)
+    more_rows = read_typed_csv(io.StringIO(HEADER + '10.0.0.1,84.205.66.0/24,7,2\n'), PER_PATH_EVENT_SCHEMA)
+
+    df = concat_typed([empty, rows, empty, more_rows], PER_PATH_EVENT_SCHEMA)
+
+    assert len(df) == 3
+    assert list(df['prefix'].cat.categories) == ['84.205.64.0/24', '84.205.65.0/24', '84.205.66.0/24']
+    assert list(df['monitor_ip']) == ['10.0.0.1', '10.0.0.2', '10.0.0.1']
+    assert df['min_ts_A'].dtype == 'int32'
+
+
+def test_concat_typed_only_empty_frames():
+    empty = read_typed_csv(io.StringIO(HEADER), PER_PATH_EVENT_SCHEMA)
+
+    df = concat_typed([empty, empty], PER_PATH_EVENT_SCHEMA)
+
+    assert len(df) == 0
+    assert list(df.columns) == ['monitor_ip', 'prefix', 'min_ts_A', 'event_number']
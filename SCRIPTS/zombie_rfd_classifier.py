@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+'''
+Labels each (monitor_ip, prefix, event) of the per_path_event_filtered files
+of a collector as:
+- 'zombie': a DOWN event (event_number %2 == 1) in which the prefix was not
+  withdrawn, or the last withdrawal arrived after ZOMBIE_THR (1h30)
+- 'rfd': not a zombie, and the last advertisement or withdrawal arrived
+  after RFD_THR (20 min), i.e., convergence delayed (e.g., by route flap damping)
+- 'normal': the rest
+
+Generates a single file per collector, in 'zombies/':
+monitor_ip,prefix,event_number,label
+12.0.1.63,84.205.64.0/24,1,normal
+12.0.1.63,84.205.64.0/24,3,zombie
+
+per_path_event_filtered2quantiles.py reads the labels (add_labels()) to
+count zombie and rfd events and to compute the quantiles of normal events;
+if there is no file for the collector, rows are labelled with classify().
+
+    ./zombie_rfd_classifier.py 20181001_30d rrc00
+'''
+
+from argparse import ArgumentParser
+import os
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from experiments import events_in_experiment
+from filenames_directories import per_path_event_filtered_filename, zombies_filename
+from schemas import PER_PATH_EVENT_SCHEMA, ZOMBIE_LABELS_SCHEMA, concat_typed, read_typed_csv, write_typed_csv
+
+RFD_THR = 20*60
+ZOMBIE_THR = 90 *60
+
+LABEL_NORMAL = 'normal'
+LABEL_ZOMBIE = 'zombie'
+LABEL_RFD = 'rfd'
+LABELS = [LABEL_NORMAL, LABEL_RFD, LABEL_ZOMBIE]
+
+LABEL_COLUMNS = ['monitor_ip', 'prefix', 'event_number', 'label']
+
+
+# zombies if it is a DOWN event (%2 ==1),
+# and either there is no W or W arrived later than 1h30
+def zombie_condition(df: pd.DataFrame, zombie_thr: float = ZOMBIE_THR) -> pd.Series:
+    return ((df['event_number']%2) == 1) & (df['max_ts_W'].isnull() | (df['max_ts_W'] > zombie_thr))
+
+
+# rfd if it is not a zombie, and convergence is longer than 20 min
+def rfd_condition(df: pd.DataFrame, rfd_thr: float = RFD_THR, zombie_thr: float = ZOMBIE_THR) -> pd.Series:
+    return ~ zombie_condition(df, zombie_thr) & ((df['max_ts_W'] > rfd_thr) | (df['max_ts_A'] > rfd_thr))
+
+
+# Label of each row of df (per_path_event_filtered rows), as a categorical
+def classify(df: pd.DataFrame, rfd_thr: float = RFD_THR, zombie_thr: float = ZOMBIE_THR) -> pd.Series:
+    labels = np.select([zombie_condition(df, zombie_thr).to_numpy(), rfd_condition(df, rfd_thr, zombie_thr).to_numpy()],
+        [LABEL_ZOMBIE, LABEL_RFD], LABEL_NORMAL)
+    return pd.Series(pd.Categorical(labels, categories=LABELS), index=df.index, name='label')
+
+
+# The rows of df with a 'label' column, from labels_df (as written by this
+# script) if it is not None; only the rows without a label in labels_df 
+# are classified
+def add_labels(df: pd.DataFrame, labels_df: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    if labels_df is None or len(labels_df) == 0:
+        return df.assign(label=classify(df))
+    keys = ['monitor_ip', 'prefix', 'event_number']
+    merged = df[keys].merge(labels_df[keys + ['label']], on=keys, how='left')
+    labels = pd.Series(pd.Categorical(merged['label'].to_numpy(), categories=LABELS), index=df.index, name='label')
+    missing = labels.isna().to_numpy()
+    if missing.any():
+        labels[missing] = classify(df[missing]).to_numpy()
+    return df.assign(label=labels)
+
+
+# The labels of the collector, None if they were not generated
+def read_labels(exp_name:str, collector:str) -> Optional[pd.DataFrame]:
+    filename = zombies_filename(exp_name, collector)
+    if not os.path.isfile(filename):
+        return None
+    return read_typed_csv(filename, ZOMBIE_LABELS_SCHEMA)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("exp_name")
+    parser.add_argument("collector")
+
+    args= parser.parse_args()
+    exp_name = args.exp_name
+    collector = args.collector
+
+    frames = []
+    for event_number in range(events_in_experiment(exp_name)):
+        try:
+            event_df = read_typed_csv(per_path_event_filtered_filename(exp_name, collector, event_number), PER_PATH_EVENT_SCHEMA)
+        except Exception:
+            continue
+        frames.append(event_df.assign(label=classify(event_df))[LABEL_COLUMNS])
+
+    if len(frames) == 0:
+        print('no data for this collector, exiting ', collector )
+        exit(0)
+
+    write_typed_csv(concat_typed(frames, ZOMBIE_LABELS_SCHEMA), zombies_filename(exp_name, collector), ZOMBIE_LABELS_SCHEMA, index=False)